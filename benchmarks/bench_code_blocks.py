@@ -0,0 +1,85 @@
+"""
+Compares the code block treeprocessor with the regex postprocessor it replaced on documents with many large code blocks.
+
+Run from the root of the repository with ``python -m benchmarks.bench_code_blocks``.
+"""
+
+import argparse
+import re
+import time
+import markdown
+from markdown.extensions import Extension
+from markdown.postprocessors import Postprocessor
+from src.confluence_markdown_extension import ConfluenceExtension
+
+class LegacyCodeBlockPostprocessor(Postprocessor):
+    """
+    The regex based code block postprocessor that the treeprocessor replaced, kept as a reference.
+    """
+    def run(self, text: str) -> str:
+        processed_text = re.sub(
+            r'<pre><code class="language-(\w+)">(.*?)\n?</code></pre>',
+            r'<ac:structured-macro ac:name="code"><ac:parameter ac:name="language">\1</ac:parameter><ac:plain-text-body><![CDATA[\2]]></ac:plain-text-body></ac:structured-macro>',
+            text,
+            flags=re.DOTALL
+        )
+        if processed_text != text:
+            processed_text = re.sub(
+                r'<ac:parameter ac:name="language">bash</ac:parameter>',
+                r'<ac:parameter ac:name="language">shell</ac:parameter>',
+                processed_text,
+                flags=re.DOTALL
+            )
+        return processed_text
+
+class LegacyConfluenceExtension(Extension):
+    def extendMarkdown(self, md):
+        md.registerExtension(self)
+        md.postprocessors.register(LegacyCodeBlockPostprocessor(md), 'confluence_code_block', 0)
+
+def make_document(blocks: int, lines_per_block: int) -> str:
+    """
+    Builds a markdown document of paragraphs separated by bash code blocks.
+    """
+    code = "\n".join(f'echo "line {line} <tag> & more" | grep -v "{line}"' for line in range(lines_per_block))
+    return "\n\n".join(f"## Section {block}\n\nSome text about section {block}.\n\n```bash\n{code}\n```" for block in range(blocks))
+
+def time_conversion(md_text: str, extension_class, repeat: int) -> tuple[float, float]:
+    """
+    Converts the document several times and returns the best total time and the best time spent in the code block processor.
+    """
+    best_total = best_processor = float("inf")
+    for _ in range(repeat):
+        md = markdown.Markdown(extensions=['tables', 'fenced_code', extension_class()])
+        registry = md.treeprocessors if 'confluence_code_block' in md.treeprocessors else md.postprocessors
+        processor = registry['confluence_code_block']
+        processor_time = 0.0
+        run = processor.run
+        def timed_run(*args):
+            nonlocal processor_time
+            start = time.perf_counter()
+            result = run(*args)
+            processor_time += time.perf_counter() - start
+            return result
+        processor.run = timed_run
+        start = time.perf_counter()
+        md.convert(md_text)
+        best_total = min(best_total, time.perf_counter() - start)
+        best_processor = min(best_processor, processor_time)
+    return best_total, best_processor
+
+def run(sizes: list[int], lines_per_block: int, repeat: int) -> None:
+    print(f"{'blocks':>8} {'regex total ms':>15} {'tree total ms':>14} {'regex stage ms':>15} {'tree stage ms':>14}")
+    for blocks in sizes:
+        md_text = make_document(blocks, lines_per_block)
+        legacy_total, legacy_stage = time_conversion(md_text, LegacyConfluenceExtension, repeat)
+        tree_total, tree_stage = time_conversion(md_text, ConfluenceExtension, repeat)
+        print(f"{blocks:>8} {legacy_total * 1000:>15.1f} {tree_total * 1000:>14.1f} {legacy_stage * 1000:>15.2f} {tree_stage * 1000:>14.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500], help="numbers of code blocks to benchmark")
+    parser.add_argument("--lines", type=int, default=50, help="lines per code block")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size, the best is reported")
+    args = parser.parse_args()
+    run(args.sizes, args.lines, args.repeat)
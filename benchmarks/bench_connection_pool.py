@@ -0,0 +1,51 @@
+"""
+Compares syncing pages with a new connection per request against the pooled sessions of :class:`ConfluenceClient`.
+
+Run from the root of the repository with ``python -m benchmarks.bench_connection_pool``.
+"""
+
+import argparse
+import json
+import time
+from requests.auth import HTTPBasicAuth
+from src.api import ApiCommand, ConfluenceClient, GetPageCommand, GetPageCommandInput, EditPageCommand, EditPageCommandInput
+from benchmarks.fake_confluence import FakeConfluence
+
+auth = HTTPBasicAuth("username", "token")
+
+def get_and_edit(send, domain: str, page_id: str) -> None:
+    """
+    Sends the GET followed by the PUT that one page sync performs.
+    """
+    page = json.loads(send(GetPageCommand(GetPageCommandInput(domain, page_id))).text)
+    body = page["body"]["storage"]["value"]
+    send(EditPageCommand(EditPageCommandInput(domain, page_id, page["status"], page["title"], body, page["version"]["number"]))).raise_for_status()
+
+def run(pages: int, latency: float) -> None:
+    with FakeConfluence(latency) as server:
+        for page_id in range(pages):
+            server.add_page(str(page_id), "<p>start</p><p>end</p>")
+
+        def unpooled_send(command: ApiCommand):
+            return command.execute(auth)
+
+        results = {}
+        for name in ["unpooled", "pooled"]:
+            server.connections = 0
+            start = time.perf_counter()
+            with ConfluenceClient(auth) as client:
+                send = unpooled_send if name == "unpooled" else client.send
+                for page_id in range(pages):
+                    get_and_edit(send, server.domain, str(page_id))
+            results[name] = (time.perf_counter() - start, server.connections)
+
+    for name, (elapsed, connections) in results.items():
+        print(f"{name:>8}: {elapsed * 1000:8.1f} ms total, {elapsed * 1000 / (pages * 2):6.2f} ms/request, {connections} connections")
+    print(f"   saved: {(results['unpooled'][0] - results['pooled'][0]) * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=50, help="number of pages to sync")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds of simulated server latency per request")
+    args = parser.parse_args()
+    run(args.pages, args.latency)
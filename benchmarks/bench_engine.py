@@ -0,0 +1,58 @@
+"""
+Compares converting many small documents with a new markdown pipeline per document, as ``markdown.markdown`` does,
+against the conversion engine that builds the pipeline once per thread and resets it between documents.
+
+Run from the root of the repository with ``python -m benchmarks.bench_engine``.
+"""
+
+import argparse
+import time
+import markdown
+from src.converter import ConversionEngine, markdown_extensions
+
+def make_documents(count: int, sections: int) -> list[str]:
+    """
+    Builds small markdown documents of headings, paragraphs, section links and code blocks, like the sections of a README.
+    """
+    return [
+        "".join(
+            f"## Section {document}.{section}\n\n"
+            f"Some *text* about [the previous section](##section-{document}{section - 1}) and `code`.\n\n"
+            "```bash\necho hello\n```\n\n"
+            for section in range(sections)
+        )
+        for document in range(count)
+    ]
+
+def best_time(function, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run(count: int, sections: int, repeat: int) -> None:
+    md_texts = make_documents(count, sections)
+    engine = ConversionEngine()
+    expected = [markdown.markdown(md_text, extensions=markdown_extensions()) for md_text in md_texts]
+    if engine.convert_many(md_texts) != expected:
+        raise AssertionError("The engine converted differently from a new pipeline per document")
+
+    timings = {
+        "markdown.markdown": best_time(lambda: [markdown.markdown(md_text, extensions=markdown_extensions()) for md_text in md_texts], repeat),
+        "engine.convert": best_time(lambda: [engine.convert(md_text) for md_text in md_texts], repeat),
+        "engine.convert_many": best_time(lambda: engine.convert_many(md_texts), repeat),
+    }
+    baseline = timings["markdown.markdown"]
+    print(f"{count} documents of {sections} sections, best of {repeat}")
+    for name, seconds in timings.items():
+        print(f"{name:>20}: {seconds * 1000:9.2f} ms total, {seconds / count * 1_000_000:9.1f} us per document, {baseline / seconds:5.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=500, help="number of documents converted per run")
+    parser.add_argument("--sections", type=int, default=2, help="number of sections of each document")
+    parser.add_argument("--repeat", type=int, default=5, help="number of runs to take the best time of")
+    args = parser.parse_args()
+    run(args.documents, args.sections, args.repeat)
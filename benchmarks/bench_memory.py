@@ -0,0 +1,120 @@
+"""
+Measures the peak memory of syncing a README to pages of increasing size with tracemalloc: fetching the page, splicing the
+converted markdown into its body and sending the edit. Requests are answered in memory by a stand-in session, which
+prepares every request like requests does and reads its body the way urllib3 sends it, so the copies made on the way to
+the socket are counted without any network traffic.
+
+Results are compared against the baselines stored in ``benchmarks/baselines/memory.json`` and the run fails if the peak
+memory of a page size grew by more than the tolerance.
+
+Run from the root of the repository with ``python -m benchmarks.bench_memory``.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+import requests
+from requests.auth import HTTPBasicAuth
+from urllib3.util.request import body_to_chunks
+from src.api import ConfluenceClient
+from src.sync import SyncMapping, sync_sections
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines", "memory.json")
+PAGE_ID = "1"
+# a paragraph with a few characters that JSON escapes
+PARAGRAPH = '<p>Text of the page, with "quotes", a tab\tand ünïcödé.</p>'
+
+class InMemorySession:
+    """
+    Answers the requests of a sync from memory: the page for a GET, and a success after reading the body of a PUT.
+    """
+
+    def __init__(self, page_body: str):
+        self.page = {"id": PAGE_ID, "status": "current", "title": "Page", "spaceId": "1", "body": {"storage": {"representation": "storage", "value": page_body}}, "version": {"number": 1}}
+        self.sent_bytes = 0
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        prepared = requests.Request(method, url, data=kwargs.get("data"), headers=kwargs.get("headers"), params=kwargs.get("params")).prepare()
+        if prepared.body is not None:
+            for chunk in body_to_chunks(prepared.body, method, 16384).chunks:
+                self.sent_bytes += len(chunk)
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["Content-Type"] = "application/json"
+        # set from the content type by the adapter of a real session
+        response.encoding = "utf-8"
+        # the response of a GET is read into memory in full by requests, so it is created here to be counted
+        response._content = json.dumps(self.page).encode() if method == "GET" else b"{}"
+        response.request = prepared
+        return response
+
+
+def measure(page_size: int, directory: str) -> dict:
+    """
+    Syncs a README to a page whose body is about ``page_size`` bytes.
+
+    :return: The peak memory allocated during the sync, in MB and as a multiple of the page size.
+    """
+    filler = PARAGRAPH * (page_size // 2 // len(PARAGRAPH.encode()))
+    page_body = f"{filler}<p>start</p><p>old</p><p>end</p>{filler}"
+    filepath = os.path.join(directory, "README.md")
+    with open(filepath, 'w') as f:
+        f.write("# Memory\n\nSynced by the memory benchmark.\n")
+    session = InMemorySession(page_body)
+    client = ConfluenceClient(HTTPBasicAuth("username", "token"))
+    client.session = lambda domain: session
+    mapping = SyncMapping(filepath, f"https://example.com/wiki/spaces/BENCH/pages/{PAGE_ID}/Page", "<p>start</p>", "<p>end</p>")
+    # the page held by the stand-in for Confluence is not part of the sync
+    body_size = len(page_body.encode())
+    del filler, page_body
+
+    tracemalloc.start()
+    try:
+        sync_sections(client, [mapping])
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    if session.sent_bytes < body_size:
+        raise AssertionError("The edit did not send the whole page body")
+    return {"peak_mb": round(peak / 2 ** 20, 2), "peak_per_page_size": round(peak / body_size, 2)}
+
+
+def run(page_sizes: list[int], tolerance: float, update_baselines: bool) -> int:
+    results: dict[str, dict] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for page_size in page_sizes:
+            name = f"{page_size // 2 ** 20}mb"
+            results[name] = measure(page_size, directory)
+            print(f"{name:>6}: {results[name]['peak_mb']:9.2f} MB peak, {results[name]['peak_per_page_size']:5.2f}x the page size")
+
+    baselines: dict[str, dict] = {}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH, 'r') as f:
+            baselines = json.load(f)
+    if update_baselines:
+        os.makedirs(os.path.dirname(BASELINES_PATH), exist_ok=True)
+        with open(BASELINES_PATH, 'w') as f:
+            json.dump({**baselines, **results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Updated the baselines in {BASELINES_PATH}")
+        return 0
+
+    regressions = [
+        f"{name}: peak {result['peak_mb']} MB, baseline {baselines[name]['peak_mb']} MB"
+        for name, result in results.items()
+        if name in baselines and result["peak_mb"] > baselines[name]["peak_mb"] * (1 + tolerance)
+    ]
+    for regression in regressions:
+        print(f"Regression in {regression}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[1, 4, 16], metavar="MB", help="sizes of the page bodies to sync, in MB")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="fraction by which a peak may exceed its baseline")
+    parser.add_argument("--update-baselines", action="store_true", help="store the results as the new baselines instead of comparing against them")
+    args = parser.parse_args()
+    sys.exit(run([size * 2 ** 20 for size in args.page_sizes], args.tolerance, args.update_baselines))
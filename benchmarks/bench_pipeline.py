@@ -0,0 +1,162 @@
+"""
+Measures the end-to-end latency and throughput of the action's pipeline, from reading the inputs to editing the page,
+against a local stand-in for the Confluence v2 pages API, across README sizes, code block counts, page counts and throttling.
+
+Results are compared against the baselines stored in ``benchmarks/baselines/pipeline.json`` and the run fails if the median
+latency of a scenario regressed by more than the tolerance. Baselines depend on the machine, so record them again with
+``--update-baselines`` on the machine that checks for regressions.
+
+Run from the root of the repository with ``python -m benchmarks.bench_pipeline``.
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+from benchmarks.fake_confluence import FakeConfluence
+from main import main
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines", "pipeline.json")
+
+START_TEXT = "<p>start</p>"
+END_TEXT = "<p>end</p>"
+
+# each scenario changes one dimension from a single 10KB README without code blocks synced to one page
+SCENARIOS: dict[str, dict] = {
+    "readme-10kb": {},
+    "readme-100kb": {"size": 100_000},
+    "readme-500kb": {"size": 500_000},
+    "code-blocks-10": {"code_blocks": 10},
+    "code-blocks-100": {"code_blocks": 100},
+    "code-blocks-500": {"code_blocks": 500},
+    "pages-10": {"pages": 10},
+    "pages-50": {"pages": 50},
+    "throttled-pages-10": {"pages": 10, "throttle_every": 5},
+}
+
+def generate_readme(size: int = 10_000, code_blocks: int = 0) -> str:
+    """
+    Generates a README of headings, paragraphs, lists and links of about the given size, with code blocks spread through it.
+    """
+    sections: list[str] = []
+    length = 0
+    while length < size or len(sections) < 1:
+        index = len(sections)
+        section = (
+            f"## Section {index}\n\n"
+            f"A paragraph with *emphasis*, **bold** text, `inline code` and a [link](##section-{max(index - 1, 0)}) to the previous section. "
+            "It is long enough to wrap in an editor, like the prose that most READMEs are made of.\n\n"
+            "- a list item\n- another list item with `code`\n- a [link](https://example.com)\n\n"
+        )
+        sections.append(section)
+        length += len(section)
+    code_block = "```python\n" + "".join(f"value_{line} = compute({line}, '<tag>' & ']]>')\n" for line in range(10)) + "```\n\n"
+    for block in range(code_blocks):
+        sections[block * len(sections) // code_blocks] += code_block
+    return "".join(sections)
+
+def page_body(size: int) -> str:
+    """
+    Builds a page body of about the given size with the markers of the synced section in the middle of it.
+    """
+    filler = "<p>Content of the page that is not synced from the README.</p>" * (size // 120 + 1)
+    return filler + START_TEXT + END_TEXT + filler
+
+def run_scenario(server: FakeConfluence, directory: str, repeats: int, page_size: int, size: int = 10_000, code_blocks: int = 0, pages: int = 1, throttle_every: int = 0) -> dict:
+    """
+    Runs :func:`main.main` on the scenario's pages, editing the README before every run so every page is edited.
+
+    :return: The median and 95th percentile latency of a run in milliseconds, and the number of pages synced per second.
+    """
+    readme = generate_readme(size, code_blocks)
+    first_page_id = len(server.pages) + 1
+    entries: list[dict] = []
+    for page_id in range(first_page_id, first_page_id + pages):
+        server.add_page(str(page_id), page_body(page_size))
+        entries.append({"filepath": os.path.join(directory, f"{page_id}.md"), "url": f"https://{server.domain}/wiki/spaces/BENCH/pages/{page_id}/Page"})
+
+    environment = {"INPUT_USERNAME": "username", "INPUT_TOKEN": "token"}
+    if pages == 1:
+        environment.update(INPUT_FILEPATH=entries[0]["filepath"], INPUT_URL=entries[0]["url"], INPUT_INSERT_START_TEXT=START_TEXT, INPUT_INSERT_END_TEXT=END_TEXT)
+    else:
+        manifest = os.path.join(directory, f"manifest-{first_page_id}.json")
+        with open(manifest, 'w') as f:
+            json.dump({"defaults": {"insert_start_text": START_TEXT, "insert_end_text": END_TEXT}, "pages": entries}, f)
+        environment.update(INPUT_MANIFEST=manifest)
+
+    server.throttle_every = throttle_every
+    latencies: list[float] = []
+    with patch.dict(os.environ, environment):
+        for repeat in range(repeats):
+            for entry in entries:
+                with open(entry["filepath"], 'w') as f:
+                    f.write(f"{readme}Synced by run {repeat}.\n")
+            start = time.perf_counter()
+            main()
+            latencies.append(time.perf_counter() - start)
+    server.throttle_every = 0
+
+    latencies.sort()
+    return {
+        "median_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[min(len(latencies) - 1, round(len(latencies) * 0.95))] * 1000, 2),
+        "pages_per_second": round(pages * repeats / sum(latencies), 2)
+    }
+
+def find_regressions(results: dict[str, dict], baselines: dict[str, dict], tolerance: float) -> list[str]:
+    """
+    :return: A description of every scenario whose median latency is more than the tolerance slower than its baseline.
+    """
+    regressions: list[str] = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline and result["median_ms"] > baseline["median_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: median {result['median_ms']} ms, baseline {baseline['median_ms']} ms")
+    return regressions
+
+def run(scenarios: list[str], repeats: int, latency: float, page_size: int, tolerance: float, update_baselines: bool) -> int:
+    results: dict[str, dict] = {}
+    with tempfile.TemporaryDirectory() as directory, FakeConfluence(latency, retry_after=0) as server:
+        for name in scenarios:
+            results[name] = run_scenario(server, directory, repeats, page_size, **SCENARIOS[name])
+            result = results[name]
+            print(f"{name:>20}: {result['median_ms']:9.2f} ms median, {result['p95_ms']:9.2f} ms p95, {result['pages_per_second']:8.2f} pages/s")
+        print(f"{server.requests} requests, {server.throttled} throttled, {server.connections} connections")
+
+    baselines: dict[str, dict] = {}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH, 'r') as f:
+            baselines = json.load(f)
+    if update_baselines:
+        os.makedirs(os.path.dirname(BASELINES_PATH), exist_ok=True)
+        with open(BASELINES_PATH, 'w') as f:
+            json.dump({**baselines, **results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Updated the baselines in {BASELINES_PATH}")
+        return 0
+
+    regressions = find_regressions(results, baselines, tolerance)
+    for regression in regressions:
+        print(f"Regression in {regression}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run, all by default: {', '.join(SCENARIOS)}")
+    parser.add_argument("--repeats", type=int, default=5, help="number of times each scenario is synced")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds of simulated server latency per request")
+    parser.add_argument("--page-size", type=int, default=50_000, help="approximate size in bytes of the page bodies outside the synced section")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="fraction by which a median latency may exceed its baseline")
+    parser.add_argument("--update-baselines", action="store_true", help="store the results as the new baselines instead of comparing against them")
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    # the pipeline logs every step of every sync at the info level
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(run(args.scenarios or list(SCENARIOS), args.repeats, args.latency, args.page_size, args.tolerance, args.update_baselines))
@@ -0,0 +1,45 @@
+"""
+Measures resolving the section links of converted documents with thousands of headings and a link to each of them,
+to check that the time per heading stays the same as the documents grow.
+
+Run from the root of the repository with ``python -m benchmarks.bench_section_links``.
+"""
+
+import argparse
+import time
+from src.converter import render_markdown
+from src.section_links import link_sections
+
+def make_document(headings: int) -> str:
+    """
+    Builds a markdown document of sections that each link to another section of the document.
+    """
+    return "".join(
+        f"## Section {index}: *Setup*\n\nSee [the other section](##section-{headings - 1 - index}-setup) and `code`.\n\n"
+        for index in range(headings)
+    )
+
+def best_time(function, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run(sizes: list[int], repeat: int) -> None:
+    print(f"Best of {repeat}")
+    for headings in sizes:
+        html = render_markdown(make_document(headings))
+        linked = link_sections(html)
+        if linked.count('href="#Section-') != headings:
+            raise AssertionError("Every section link should be resolved")
+        seconds = best_time(lambda: link_sections(html), repeat)
+        print(f"{headings:>7} headings: {seconds * 1000:9.2f} ms total, {seconds / headings * 1_000_000:7.2f} us per heading")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--headings", type=int, nargs="+", default=[1000, 4000, 16000], help="numbers of headings of the documents")
+    parser.add_argument("--repeat", type=int, default=5, help="number of runs to take the best time of")
+    args = parser.parse_args()
+    run(args.headings, args.repeat)
@@ -0,0 +1,145 @@
+"""
+Measures how long the action takes to start, by running ``main.py`` in a new interpreter for each repeat:
+importing the entry point, failing on missing inputs, skipping a page whose files did not change, and the time until
+the first request reaches a local stand-in for the Confluence v2 pages API.
+
+Results are compared against the baselines stored in ``benchmarks/baselines/startup.json`` and the run fails if the median
+time of a scenario regressed by more than the tolerance, like ``bench_pipeline``. Use ``--importtime`` to list the modules
+that took the longest to import on the way to the first request.
+
+Run from the root of the repository with ``python -m benchmarks.bench_startup``.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.bench_pipeline import find_regressions
+from benchmarks.fake_confluence import FakeConfluence
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines", "startup.json")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ["import", "invalid-inputs", "unchanged-files", "first-request"]
+
+def run_main(inputs: dict[str, str], arguments: list[str] | None = None, importtime: bool = False) -> subprocess.CompletedProcess:
+    """
+    Runs the action in a new interpreter with the given inputs and none of the inputs of the calling environment.
+    """
+    environment = {name: value for name, value in os.environ.items() if not name.startswith(("INPUT_", "GITHUB_"))}
+    environment.update({f"INPUT_{name.upper()}": value for name, value in inputs.items()})
+    command = [sys.executable, *(["-X", "importtime"] if importtime else []), *(arguments or ["main.py"])]
+    return subprocess.run(command, cwd=ROOT, env=environment, capture_output=True, text=True)
+
+def slowest_imports(stderr: str, count: int) -> list[tuple[int, str]]:
+    """
+    :return: The cumulative microseconds and name of the modules that took the longest to import, from ``-X importtime`` output.
+    """
+    imports: list[tuple[int, str]] = []
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and not line.endswith("imported package"):
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                imports.append((int(cumulative), name.rstrip()))
+    return sorted(imports, reverse=True)[:count]
+
+def sync_inputs(server: FakeConfluence, directory: str) -> dict[str, str]:
+    """
+    Adds a page to the server and writes a README to sync to it.
+
+    :return: The inputs of the action that sync the README to the page.
+    """
+    filepath = os.path.join(directory, "README.md")
+    with open(filepath, 'w') as f:
+        f.write("# Startup\n\nSynced by the startup benchmark.\n")
+    page_id = str(len(server.pages) + 1)
+    server.add_page(page_id, "<p>start</p><p>end</p>")
+    return {
+        "filepath": filepath,
+        "url": f"https://{server.domain}/wiki/spaces/BENCH/pages/{page_id}/Page",
+        "username": "username",
+        "token": "token",
+        "insert_start_text": "<p>start</p>",
+        "insert_end_text": "<p>end</p>",
+    }
+
+def time_scenario(name: str, server: FakeConfluence, directory: str, repeats: int) -> list[float]:
+    """
+    Runs a scenario several times.
+
+    :return: The seconds from starting the interpreter to the end of the scenario, for each repeat.
+    """
+    inputs = sync_inputs(server, directory)
+    if name == "unchanged-files":
+        inputs.update(state_file=os.path.join(directory, f"state-{len(server.pages)}.json"), skip_unchanged_files="true")
+        # the first sync records the files, so the timed runs have nothing to sync
+        run_main(inputs).check_returncode()
+
+    timings: list[float] = []
+    for _ in range(repeats):
+        server.first_request_at = None
+        start = time.monotonic()
+        if name == "import":
+            run_main({}, ["-c", "import main"]).check_returncode()
+        elif name == "invalid-inputs":
+            if run_main({}).returncode == 0:
+                raise AssertionError("The action should fail without inputs")
+        else:
+            run_main(inputs).check_returncode()
+        if name == "first-request":
+            if server.first_request_at is None:
+                raise AssertionError("The action did not send any request")
+            timings.append(server.first_request_at - start)
+        else:
+            timings.append(time.monotonic() - start)
+    return timings
+
+def run(scenarios: list[str], repeats: int, tolerance: float, update_baselines: bool, importtime: int) -> int:
+    results: dict[str, dict] = {}
+    with tempfile.TemporaryDirectory() as directory, FakeConfluence() as server:
+        for name in scenarios:
+            timings = sorted(time_scenario(name, server, directory, repeats))
+            results[name] = {
+                "median_ms": round(statistics.median(timings) * 1000, 2),
+                "p95_ms": round(timings[min(len(timings) - 1, round(len(timings) * 0.95))] * 1000, 2),
+            }
+            print(f"{name:>16}: {results[name]['median_ms']:9.2f} ms median, {results[name]['p95_ms']:9.2f} ms p95")
+        if importtime:
+            process = run_main(sync_inputs(server, directory), importtime=True)
+            print("Slowest imports of a sync:")
+            for cumulative, module in slowest_imports(process.stderr, importtime):
+                print(f"{cumulative / 1000:9.2f} ms {module}")
+
+    baselines: dict[str, dict] = {}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH, 'r') as f:
+            baselines = json.load(f)
+    if update_baselines:
+        os.makedirs(os.path.dirname(BASELINES_PATH), exist_ok=True)
+        with open(BASELINES_PATH, 'w') as f:
+            json.dump({**baselines, **results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Updated the baselines in {BASELINES_PATH}")
+        return 0
+
+    regressions = find_regressions(results, baselines, tolerance)
+    for regression in regressions:
+        print(f"Regression in {regression}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run, all by default: {', '.join(SCENARIOS)}")
+    parser.add_argument("--repeats", type=int, default=10, help="number of times each scenario is run")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="fraction by which a median time may exceed its baseline")
+    parser.add_argument("--importtime", type=int, default=0, metavar="COUNT", help="list this many of the slowest imports of a sync")
+    parser.add_argument("--update-baselines", action="store_true", help="store the results as the new baselines instead of comparing against them")
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    sys.exit(run(args.scenarios or SCENARIOS, args.repeats, args.tolerance, args.update_baselines, args.importtime))
@@ -0,0 +1,200 @@
+"""
+A local stand-in for the Confluence v2 pages API, served over HTTPS with a throwaway self-signed certificate.
+"""
+
+import json
+import os
+import re
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+PAGE_PATH = re.compile(r'^/wiki/api/v2/pages/(\d+)(?:\?|$)')
+CHILDREN_PATH = re.compile(r'^/wiki/api/v2/pages/(\d+)/children(?:\?|$)')
+PAGES_PATH = re.compile(r'^/wiki/api/v2/pages(?:\?|$)')
+
+class FakeConfluenceHandler(BaseHTTPRequestHandler):
+    """
+    Serves GET and PUT requests for the pages stored on the :class:`FakeConfluence` server.
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: "FakeConfluence"
+
+    def setup(self):
+        super().setup()
+        # every call to setup is a new TCP (and TLS) connection
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body: dict, headers: dict[str, str] | None = None) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def throttle(self) -> bool:
+        """
+        Counts the request and rejects it with a 429 if it is one of the requests the server throttles.
+
+        :return: Whether the request was rejected.
+        """
+        with self.server.lock:
+            self.server.requests += 1
+            if self.server.first_request_at is None:
+                self.server.first_request_at = time.monotonic()
+            throttled = bool(self.server.throttle_every) and self.server.requests % self.server.throttle_every == 0
+            if throttled:
+                self.server.throttled += 1
+        if throttled:
+            self.send_json(429, {"errors": [{"title": "Too many requests"}]}, {"Retry-After": str(self.server.retry_after)})
+        return throttled
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        if self.throttle():
+            return
+        children_match = CHILDREN_PATH.match(self.path)
+        if children_match:
+            with self.server.lock:
+                children = [{"id": page["id"], "title": page["title"], "status": page["status"]} for page in self.server.pages.values() if page["parentId"] == children_match.group(1)]
+            return self.send_json(200, {"results": children, "_links": {}})
+        if PAGES_PATH.match(self.path):
+            return self.list_pages()
+        match = PAGE_PATH.match(self.path)
+        page = match and self.server.pages.get(match.group(1))
+        if not page:
+            return self.send_json(404, {"errors": [{"title": "Page not found"}]})
+        self.send_json(200, page)
+
+    def list_pages(self):
+        """
+        Lists the pages filtered by a comma separated list of IDs, with an offset as the cursor of the next results.
+        """
+        query = {name: values[0] for name, values in parse_qs(urlparse(self.path).query).items()}
+        page_ids = query.get("id", "").split(",") if query.get("id") else list(self.server.pages)
+        offset = int(query.get("cursor", 0))
+        limit = int(query.get("limit", 25))
+        with self.server.lock:
+            pages = [self.server.pages[page_id] for page_id in page_ids if page_id in self.server.pages]
+            results = [page if "body-format" in query else {name: value for name, value in page.items() if name != "body"} for page in pages[offset:offset + limit]]
+        links = {"next": f"/wiki/api/v2/pages?{urlencode({**query, 'cursor': offset + limit})}"} if offset + limit < len(pages) else {}
+        self.send_json(200, {"results": results, "_links": links})
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.throttle():
+            return
+        if not PAGES_PATH.match(self.path):
+            return self.send_json(404, {"errors": [{"title": "Not found"}]})
+        with self.server.lock:
+            if any(page["title"] == payload["title"] for page in self.server.pages.values()):
+                return self.send_json(400, {"errors": [{"title": "A page with this title already exists"}]})
+            page_id = str(max((int(page_id) for page_id in self.server.pages), default=0) + 1)
+            self.server.add_page(page_id, payload["body"]["value"], payload["title"], parent_id=payload["parentId"])
+            page = self.server.pages[page_id]
+        self.send_json(200, page)
+
+    def do_PUT(self):
+        time.sleep(self.server.latency)
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.throttle():
+            return
+        match = PAGE_PATH.match(self.path)
+        with self.server.lock:
+            page = match and self.server.pages.get(match.group(1))
+            if not page:
+                return self.send_json(404, {"errors": [{"title": "Page not found"}]})
+            if payload["version"]["number"] != page["version"]["number"] + 1:
+                return self.send_json(409, {"errors": [{"title": "Version conflict"}]})
+            page.update(status=payload["status"], title=payload["title"], body={"storage": payload["body"]}, version={"number": payload["version"]["number"]})
+        self.send_json(200, page)
+
+
+class FakeConfluence(ThreadingHTTPServer):
+    """
+    An HTTPS server on localhost that behaves like the subset of the Confluence v2 API used by the action.
+    Use it as a context manager; while it runs, requests trusts its certificate through ``REQUESTS_CA_BUNDLE``.
+    """
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, throttle_every: int = 0, retry_after: int = 0):
+        """
+        Initialize the server on a free port.
+
+        :param latency: The number of seconds each request is delayed by, to simulate a remote site.
+        :param throttle_every: Rejects every nth request with a 429, or 0 to never throttle.
+        :param retry_after: The number of seconds in the Retry-After header of throttled requests.
+        """
+        super().__init__(("localhost", 0), FakeConfluenceHandler)
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.pages: dict[str, dict] = {}
+        self.connections = 0
+        self.requests = 0
+        self.throttled = 0
+        # the monotonic time the first request arrived at, reset to None to time the next one
+        self.first_request_at: float | None = None
+        self.lock = threading.Lock()
+        self._certificate_dir = tempfile.TemporaryDirectory()
+        certificate = os.path.join(self._certificate_dir.name, "cert.pem")
+        key = os.path.join(self._certificate_dir.name, "key.pem")
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+             "-addext", "subjectAltName=DNS:localhost", "-keyout", key, "-out", certificate],
+            check=True,
+            capture_output=True
+        )
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(certificate, key)
+        self.socket = context.wrap_socket(self.socket, server_side=True)
+        self.certificate = certificate
+
+    @property
+    def domain(self) -> str:
+        """
+        The domain to pass to the API commands, including the port.
+        """
+        return f"localhost:{self.server_address[1]}"
+
+    def add_page(self, page_id: str, body: str, title: str = "Page", version: int = 1, parent_id: str | None = None) -> None:
+        """
+        Adds a page to the server.
+        """
+        self.pages[page_id] = {
+            "id": page_id,
+            "status": "current",
+            "title": title,
+            "spaceId": "1",
+            "parentId": parent_id,
+            "body": {"storage": {"representation": "storage", "value": body}},
+            "version": {"number": version}
+        }
+
+    def __enter__(self) -> "FakeConfluence":
+        self._previous_ca_bundle = os.environ.get("REQUESTS_CA_BUNDLE")
+        os.environ["REQUESTS_CA_BUNDLE"] = self.certificate
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._previous_ca_bundle is None:
+            os.environ.pop("REQUESTS_CA_BUNDLE", None)
+        else:
+            os.environ["REQUESTS_CA_BUNDLE"] = self._previous_ca_bundle
+        self._certificate_dir.cleanup()
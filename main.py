@@ -1,78 +1,277 @@
-import json
+import os
 from os import environ
-from typing import Dict
-from src.utils import extract_domain_and_page_id
-from src.api import ConfluenceClient, GetPageCommand, GetPageCommandInput, EditPageCommand, EditPageCommandInput
-from requests.auth import HTTPBasicAuth
-from dotenv import load_dotenv
-import markdown
-from src.confluence_markdown_extension import ConfluenceExtension
+from typing import TYPE_CHECKING, Dict
+from src.metrics import Metrics
+from src.state import SyncState
+from src.utils import set_output, write_step_summary
 import logging
-from src.errors import InvalidParameterError, ConfluenceApiError, SubstringNotFoundError
+from src.errors import InvalidParameterError, BatchSyncError
 
-load_dotenv()
+# the client, the sync pipeline and markdown are imported by the modes that use them once their inputs are verified,
+# so a run that fails validation or has nothing to sync does not pay for importing them
+if TYPE_CHECKING:
+    from src.api import ConfluenceClient
+    from src.cache import ConversionCache
+    from src.converter import MarkdownConverter
+    from src.profiling import ConversionProfiler
+    from src.sync import SyncResult
 
-def main() -> None:
-    # set up logging module to report info logs
-    logging.basicConfig(level=logging.INFO)
+def get_inputs(keys: list[str]) -> Dict[str, str]:
+    """
+    Retrieves and verifies the action inputs passed as environment variables.
 
-    logging.info("Starting README sync...")
-    # retrieve and verify env variables
+    :param keys: The names of the inputs to retrieve.
+    :return: A dictionary of input names to their values.
+    """
     vars: Dict[str, str] = {}
-    for key in ["filepath", "url", "username", "token", "insert_start_text", "insert_end_text"]:
+    for key in keys:
         value = environ.get(f"INPUT_{key.upper()}")
         if not value:
             raise InvalidParameterError(f"Error: Missing value for {key}")
         vars[key] = value
+    return vars
+
+def load_state() -> SyncState | None:
+    """
+    Loads the record of previous syncs from the file in the state_file input, if one is given.
+
+    :return: The loaded state, or None if no state file is used.
+    """
+    state_file = environ.get("INPUT_STATE_FILE")
+    return SyncState.load(state_file) if state_file else None
+
+def get_skip_unchanged_files(state: SyncState | None) -> bool:
+    """
+    Retrieves the skip_unchanged_files input, which needs a state file to compare the files with.
+
+    :param state: The record of previous syncs.
+    :return: Whether to skip the pages whose files did not change since their last recorded sync.
+    """
+    skip_unchanged_files = environ.get("INPUT_SKIP_UNCHANGED_FILES", "").lower() == "true"
+    if skip_unchanged_files and not state:
+        raise InvalidParameterError("Error: skip_unchanged_files requires a state_file to record the synced files in")
+    return skip_unchanged_files
+
+def get_positive_int_input(key: str, default: int) -> int:
+    """
+    Retrieves and verifies an optional action input that must be a positive integer.
+
+    :param key: The name of the input.
+    :param default: The value to use if the input is not given.
+    :return: The value of the input.
+    """
+    value = environ.get(f"INPUT_{key.upper()}") or str(default)
+    if not value.isdigit() or int(value) < 1:
+        raise InvalidParameterError(f"Error: {key} must be a positive integer, got {value}")
+    return int(value)
+
+def get_split_size() -> int | None:
+    """
+    :return: The split_size input, above which converted markdown is split into child pages, or None if it is not given.
+    """
+    return get_positive_int_input("split_size", 1) if environ.get("INPUT_SPLIT_SIZE") else None
+
+def create_client(vars: Dict[str, str], metrics: Metrics, pool_size: int = 10) -> "ConfluenceClient":
+    """
+    Sets up the client authenticated with the username and token inputs.
+
+    :param vars: The verified inputs, including the username and token.
+    :param metrics: The metrics to record every request in.
+    :param pool_size: The maximum number of connections kept open to each domain.
+    :return: The client.
+    """
+    from requests.auth import HTTPBasicAuth
+    from src.api import ConfluenceClient
+    return ConfluenceClient(HTTPBasicAuth(vars["username"], vars["token"]), pool_size=pool_size, metrics=metrics)
+
+def load_converter(metrics: Metrics | None = None) -> "MarkdownConverter":
+    """
+    Sets up the markdown converter with the cache in the cache_dir input, if one is given, the number of processes in the
+    conversion_workers input, whether to convert incrementally from the incremental input and a profiler if the
+    profile_file input is given.
+
+    :param metrics: The metrics to record the time spent in each markdown processor in.
+    :return: The markdown converter.
+    """
+    from src.cache import ConversionCache
+    from src.converter import MarkdownConverter
+    from src.profiling import ConversionProfiler
+    cache_dir = environ.get("INPUT_CACHE_DIR")
+    cache = ConversionCache(cache_dir) if cache_dir else None
+    incremental = environ.get("INPUT_INCREMENTAL", "").lower() == "true"
+    if incremental and not cache:
+        raise InvalidParameterError("Error: incremental requires a cache_dir to store the converted sections in")
+    profiler = ConversionProfiler() if environ.get("INPUT_PROFILE_FILE") else None
+    return MarkdownConverter(cache, get_positive_int_input("conversion_workers", 1), incremental, metrics, profiler)
+
+def log_cache_stats(cache: "ConversionCache | None") -> None:
+    if cache:
+        stats = cache.stats()
+        logging.info(f"Conversion cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions.")
+
+def report_client_stats(client: "ConfluenceClient") -> None:
+    if client.conflicts:
+        logging.info(f"Retried {client.conflicts} edits after the page was edited by someone else.")
+    if client.throttles:
+        logging.info(f"Retried {client.retries} requests after Confluence throttled {client.throttles} requests.")
+    set_output("conflicts", str(client.conflicts))
+    set_output("throttles", str(client.throttles))
+    set_output("retries", str(client.retries))
+
+def save_profile(profiler: "ConversionProfiler | None") -> None:
+    """
+    Writes the conversion profile to the file in the profile_file input and adds the time of each processor to the step summary.
+    """
+    if profiler:
+        profile_file = environ["INPUT_PROFILE_FILE"]
+        profiler.save(profile_file)
+        logging.info(f"Profiled {profiler.conversions} conversions, saved the profile to {profile_file}.")
+        write_step_summary(profiler.to_markdown())
 
-    domain, page_id = extract_domain_and_page_id(vars["url"])
-
-    # set up client
-    auth = HTTPBasicAuth(vars["username"], vars["token"])
-    client = ConfluenceClient(auth)
-
-    # create get page command
-    input = GetPageCommandInput(domain, page_id)
-    command = GetPageCommand(input)
-
-    logging.info("Getting confluence page content.")
-    response = client.send(command)
-    json_response_body = json.loads(response.text)
-
-    # process get page results
-    page_status: str = json_response_body["status"]
-    page_title: str = json_response_body["title"]
-    page_body: str = json_response_body["body"]["storage"]["value"]
-    page_version_number: int = json_response_body["version"]["number"]
-    if not (page_status and page_title and page_body and page_version_number): raise ConfluenceApiError("Values were not correctly received from Confluence page")
-    
-    # read markdown file
-    logging.info("Reading markdown file.")
-    md_text: str
-    with open(vars["filepath"], 'r') as f:
-        md_text = f.read()
-
-    # convert markdown file to html
-    logging.info("Converting markdown file.")
-    converted_html = markdown.markdown(md_text, extensions=['tables', 'fenced_code', ConfluenceExtension()])
-
-    # insert markdown between insert_start_text and insert_end_text
-    start_substring: str = vars["insert_start_text"]
-    end_substring: str = vars["insert_end_text"]
-    start_index = page_body.find(start_substring)
-    end_index = page_body.find(end_substring)
-    if start_index == -1 or end_index == -1 or start_index > end_index: raise SubstringNotFoundError("Insert after string was not found in the body of the Confluence page")
-    page_body = page_body[:start_index + len(start_substring)] + converted_html + page_body[end_index:end_index + len(end_substring)] + page_body[end_index + len(end_substring):]
-
-    # create edit page command
-    input = EditPageCommandInput(domain, page_id, page_status, page_title, page_body, page_version_number)
-    command = EditPageCommand(input)
-
-    logging.info("Updating confluence page.")
-    response = client.send(command)
-    response.raise_for_status()
+def report_metrics(metrics: Metrics, client: "ConfluenceClient") -> None:
+    """
+    Sets the timing of every phase of the sync and the client's request counters as the metrics output, and adds them to the step summary.
+    """
+    for name in ("conflicts", "throttles", "retries"):
+        metrics.increment(name, getattr(client, name))
+    set_output("metrics", metrics.to_json())
+    write_step_summary(metrics.to_markdown())
+
+def main() -> None:
+    from dotenv import load_dotenv
+    load_dotenv()
+    # set up logging module to report info logs
+    logging.basicConfig(level=logging.INFO)
+
+    logging.info("Starting README sync...")
+    manifest = environ.get("INPUT_MANIFEST")
+    # keep syncing the files as they change until stopped
+    if environ.get("INPUT_WATCH", "").lower() == "true":
+        main_watch(manifest)
+        return
+    # sync every page listed in the manifest if one is given
+    if manifest:
+        main_batch(manifest)
+        return
+    # mirror a directory to the pages under the page in the url if one is given
+    directory = environ.get("INPUT_DIRECTORY")
+    if directory:
+        main_tree(directory)
+        return
+
+    metrics = Metrics()
+    # retrieve and verify env variables
+    with metrics.span("inputs"):
+        vars = get_inputs(["filepath", "url", "username", "token", "insert_start_text", "insert_end_text"])
+        from src.sync import SyncMapping, sync_page
+
+        mapping = SyncMapping(vars["filepath"], vars["url"], vars["insert_start_text"], vars["insert_end_text"], get_split_size())
+        state = load_state()
+        skip_unchanged_files = get_skip_unchanged_files(state)
+        converter = load_converter(metrics)
+    with create_client(vars, metrics) as client:
+        status = sync_page(client, mapping, state, converter, skip_unchanged_files)
+    if state:
+        with metrics.span("save_state"):
+            state.save()
+    log_cache_stats(converter.cache)
+    save_profile(converter.profiler)
+    report_client_stats(client)
+    report_metrics(metrics, client)
+    set_output("status", status)
     logging.info("Sync successful!")
     return
 
+def main_batch(manifest: str) -> None:
+    metrics = Metrics()
+    with metrics.span("inputs"):
+        vars = get_inputs(["username", "token"])
+        max_workers = get_positive_int_input("max_workers", 4)
+        from src.batch import load_manifest, run_batch
+
+        mappings = load_manifest(manifest, get_split_size())
+        state = load_state()
+        skip_unchanged_files = get_skip_unchanged_files(state)
+        converter = load_converter(metrics)
+
+    logging.info(f"Syncing {len(mappings)} pages from {manifest}.")
+    # share one pooled client between the workers so connections to the same domain are reused
+    with create_client(vars, metrics, max_workers) as client:
+        results = run_batch(client, mappings, max_workers, state, converter, skip_unchanged_files)
+    # failed pages are not recorded, so the pages that did sync are still skipped on the next run
+    if state:
+        with metrics.span("save_state"):
+            state.save()
+    log_cache_stats(converter.cache)
+    save_profile(converter.profiler)
+    report_client_stats(client)
+    report_metrics(metrics, client)
+    report_results(results)
+
+def main_tree(directory: str) -> None:
+    metrics = Metrics()
+    with metrics.span("inputs"):
+        vars = get_inputs(["url", "username", "token"])
+        max_workers = get_positive_int_input("max_workers", 4)
+        if not os.path.isdir(directory):
+            raise InvalidParameterError(f"Error: directory {directory} does not exist")
+        from src.tree import sync_tree
+        converter = load_converter(metrics)
+
+    logging.info(f"Mirroring {directory} to the pages under {vars['url']}.")
+    with create_client(vars, metrics, max_workers) as client:
+        results = sync_tree(client, directory, vars["url"], converter, max_workers)
+    log_cache_stats(converter.cache)
+    save_profile(converter.profiler)
+    report_client_stats(client)
+    report_metrics(metrics, client)
+    report_results(results)
+
+def main_watch(manifest: str | None) -> None:
+    metrics = Metrics()
+    with metrics.span("inputs"):
+        vars = get_inputs(["username", "token"])
+        max_workers = get_positive_int_input("max_workers", 4)
+        debounce = get_positive_int_input("watch_debounce_ms", 2000) / 1000
+        from src.batch import load_manifest
+        from src.sync import SyncMapping
+        from src.watch import Watcher
+        if manifest:
+            mappings = load_manifest(manifest, get_split_size())
+        else:
+            mapping_vars = get_inputs(["filepath", "url", "insert_start_text", "insert_end_text"])
+            mappings = [SyncMapping(mapping_vars["filepath"], mapping_vars["url"], mapping_vars["insert_start_text"], mapping_vars["insert_end_text"], get_split_size())]
+        state = load_state()
+        converter = load_converter(metrics)
+
+    import signal
+    import threading
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    # the client, its connections and the converter are kept warm between syncs
+    with create_client(vars, metrics, max_workers) as client:
+        try:
+            Watcher(client, mappings, state, converter, debounce=debounce, max_workers=max_workers).run(stop)
+        except KeyboardInterrupt:
+            pass
+    logging.info("Stopped watching.")
+    log_cache_stats(converter.cache)
+    save_profile(converter.profiler)
+    report_client_stats(client)
+    report_metrics(metrics, client)
+
+def report_results(results: list["SyncResult"]) -> None:
+    """
+    Sets the results and status outputs of a run that synced several pages, and fails the run if any page failed to sync.
+    """
+    from src.batch import summarize_results
+    from src.sync import CREATED, UPDATED, UNCHANGED
+    set_output("results", summarize_results(results))
+    set_output("status", UPDATED if any(result.status in (CREATED, UPDATED) for result in results) else UNCHANGED)
+    failed = [result for result in results if not result.success]
+    if failed:
+        raise BatchSyncError(f"{len(failed)} of {len(results)} pages failed to sync")
+    logging.info("Sync successful!")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,8 +1,27 @@
 from abc import ABC, abstractmethod
 import json
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable
 import requests
-from requests import Response
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from src.metrics import Metrics
+from src.rate_limiter import AdaptiveRateLimiter
+from src.splice import Span, span_chunks
+from src.utils import next_cursor
+
+# responses with these status codes were rejected because the API is receiving too many requests, and are retried
+THROTTLE_STATUS_CODES = (429, 503)
+# the maximum number of page IDs the API filters by in a single request, which is also the maximum number of results per request
+BULK_PAGE_LIMIT = 250
+# the number of characters of a page body that are escaped and encoded at a time while an edit is sent
+BODY_CHUNK_SIZE = 65536
+# stands in for the page body in the JSON of an edit, which is streamed in its place
+STREAMED_VALUE = "\x00streamed-value\x00"
 
 class CommandInput(ABC):
     """
@@ -40,7 +59,7 @@ class EditPageCommandInput(CommandInput):
     Concrete implementation of CommandInput for the :class:`EditPageCommand` class.
     """
     
-    def __init__(self, domain: str, page_id: str, page_status: str, page_title: str, page_body: str, version_number: int):
+    def __init__(self, domain: str, page_id: str, page_status: str, page_title: str, page_body: str | list[Span], version_number: int):
         """
         Initialize the command input with domain, page ID, page status, page title, page body, and version number.
 
@@ -48,16 +67,126 @@ class EditPageCommandInput(CommandInput):
         :param page_id: The ID of the page to edit.
         :param page_status: The status of the page to set.
         :param page_title: The title of the page to set.
-        :param page_body: The body content of the page to set.
+        :param page_body: The body content of the page to set, or the spans it is made of, see :func:`src.splice.splice_spans`,
+            which are sent without joining them.
         :param version_number: The current version number of the page.
         """
         super().__init__(domain)
         self.id = page_id
         self.status = page_status
         self.title = page_title
-        self.body = page_body
+        self.spans = [(page_body, 0, len(page_body))] if isinstance(page_body, str) else page_body
         self.version = version_number + 1
 
+    @property
+    def body(self) -> str:
+        """
+        The body content of the page to set, joined from its spans.
+        """
+        return ''.join(text[start:end] for text, start, end in self.spans)
+
+
+class GetChildPagesCommandInput(CommandInput):
+    """
+    Concrete implementation of CommandInput for the :class:`GetChildPagesCommand` class.
+    """
+
+    def __init__(self, domain: str, page_id: str, cursor: str | None = None):
+        """
+        Initialize the command input with a domain, a page ID and the cursor of the page of results to get.
+
+        :param domain: The domain of the API to interact with.
+        :param page_id: The ID of the page whose children to list.
+        :param cursor: The cursor from the next link of the previous results, or None to get the first results.
+        """
+        super().__init__(domain)
+        self.id = page_id
+        self.cursor = cursor
+
+
+class CreatePageCommandInput(CommandInput):
+    """
+    Concrete implementation of CommandInput for the :class:`CreatePageCommand` class.
+    """
+
+    def __init__(self, domain: str, space_id: str, parent_id: str, page_title: str, page_body: str):
+        """
+        Initialize the command input with a domain, the space and parent of the page, and its title and body.
+
+        :param domain: The domain of the API to interact with.
+        :param space_id: The ID of the space to create the page in.
+        :param parent_id: The ID of the page to create the page under.
+        :param page_title: The title of the page, which must be unique in the space.
+        :param page_body: The body content of the page.
+        """
+        super().__init__(domain)
+        self.space_id = space_id
+        self.parent_id = parent_id
+        self.title = page_title
+        self.body = page_body
+
+
+class GetAttachmentsCommandInput(CommandInput):
+    """
+    Concrete implementation of CommandInput for the :class:`GetAttachmentsCommand` class.
+    """
+
+    def __init__(self, domain: str, page_id: str, cursor: str | None = None):
+        """
+        Initialize the command input with a domain, a page ID and the cursor of the page of results to get.
+
+        :param domain: The domain of the API to interact with.
+        :param page_id: The ID of the page whose attachments to list.
+        :param cursor: The cursor from the next link of the previous results, or None to get the first results.
+        """
+        super().__init__(domain)
+        self.id = page_id
+        self.cursor = cursor
+
+
+class UploadAttachmentCommandInput(CommandInput):
+    """
+    Concrete implementation of CommandInput for the :class:`UploadAttachmentCommand` class.
+    """
+
+    def __init__(self, domain: str, page_id: str, filename: str, content: bytes, media_type: str, comment: str):
+        """
+        Initialize the command input with a domain, a page ID and the file to attach.
+
+        :param domain: The domain of the API to interact with.
+        :param page_id: The ID of the page to attach the file to.
+        :param filename: The name of the attachment, which replaces an existing attachment with the same name.
+        :param content: The content of the file.
+        :param media_type: The media type of the file, eg. image/png.
+        :param comment: The comment of the attachment.
+        """
+        super().__init__(domain)
+        self.id = page_id
+        self.filename = filename
+        self.content = content
+        self.media_type = media_type
+        self.comment = comment
+
+
+class BulkGetPagesCommandInput(CommandInput):
+    """
+    Concrete implementation of CommandInput for the :class:`BulkGetPagesCommand` class.
+    """
+
+    def __init__(self, domain: str, page_ids: list[str], include_body: bool = True, cursor: str | None = None):
+        """
+        Initialize the command input with a domain, the page IDs to get and the cursor of the page of results to get.
+
+        :param domain: The domain of the API to interact with.
+        :param page_ids: The IDs of the pages to get, at most :data:`BULK_PAGE_LIMIT`.
+        :param include_body: Whether to get the storage format body of the pages, or only their metadata and version.
+        :param cursor: The cursor from the next link of the previous results, or None to get the first results.
+        """
+        super().__init__(domain)
+        self.ids = page_ids
+        self.include_body = include_body
+        self.cursor = cursor
+
 
 class ApiCommand(ABC):
     """
@@ -75,11 +204,12 @@ class ApiCommand(ABC):
         self.input = input
     
     @abstractmethod
-    def execute(self, auth: HTTPBasicAuth) -> Response:
+    def execute(self, auth: HTTPBasicAuth, session: Session | None = None) -> Response:
         """
         Abstract method for executing the command, to be implemented in subclasses.
 
         :param auth: The HTTPBasicAuth to use for authentication.
+        :param session: The session to send the request with, or None to open a new connection.
         :return: The response from the API.
         """
 
@@ -99,11 +229,12 @@ class GetPageCommand(ApiCommand):
         super().__init__(input)
         self.input = input
     
-    def execute(self, auth: HTTPBasicAuth) -> Response:
+    def execute(self, auth: HTTPBasicAuth, session: Session | None = None) -> Response:
         """
         Execute the command by sending a GET request to the API.
 
         :param auth: The HTTPBasicAuth to use for authentication.
+        :param session: The session to send the request with, or None to open a new connection.
         :return: The response from the API.
         """
         url = f"https://{self.input.domain}/wiki/api/v2/pages/{self.input.id}"
@@ -113,7 +244,7 @@ class GetPageCommand(ApiCommand):
         query = {
             "body-format": "storage"
         }
-        return requests.request(
+        return (session or requests).request(
             "GET",
             url,
             headers=headers,
@@ -122,6 +253,41 @@ class GetPageCommand(ApiCommand):
         )
 
 
+class GetPageVersionCommand(ApiCommand):
+    """
+    Concrete implementation of ApiCommand for getting the metadata of a page, including its version, without its body.
+    This class plays the role of a Concrete Command in the Command pattern.
+    """
+    
+    def __init__(self, input: GetPageCommandInput):
+        """
+        Initialize the command with a GetPageCommandInput.
+
+        :param input: The command input to use.
+        """
+        super().__init__(input)
+        self.input = input
+    
+    def execute(self, auth: HTTPBasicAuth, session: Session | None = None) -> Response:
+        """
+        Execute the command by sending a GET request to the API without requesting a body format, so the body is not downloaded.
+
+        :param auth: The HTTPBasicAuth to use for authentication.
+        :param session: The session to send the request with, or None to open a new connection.
+        :return: The response from the API.
+        """
+        url = f"https://{self.input.domain}/wiki/api/v2/pages/{self.input.id}"
+        headers = {
+        "Accept": "application/json"
+        }
+        return (session or requests).request(
+            "GET",
+            url,
+            headers=headers,
+            auth=auth
+        )
+
+
 class EditPageCommand(ApiCommand):
     """
     Concrete implementation of ApiCommand for editing a page.
@@ -137,11 +303,12 @@ class EditPageCommand(ApiCommand):
         super().__init__(input)
         self.input = input
     
-    def execute(self, auth: HTTPBasicAuth) -> Response:
+    def execute(self, auth: HTTPBasicAuth, session: Session | None = None) -> Response:
         """
         Execute the command by sending a PUT request to the API.
 
         :param auth: The HTTPBasicAuth to use for authentication.
+        :param session: The session to send the request with, or None to open a new connection.
         :return: The response from the API.
         """
         page = self.input
@@ -153,21 +320,21 @@ class EditPageCommand(ApiCommand):
         "Content-Type": "application/json"
         }
 
-        payload = json.dumps( {
+        payload = StreamedJsonBody( {
         "id": page.id,
         "status": page.status,
         "title": page.title,
         "body": {
             "representation": "storage",
-            "value": page.body
+            "value": STREAMED_VALUE
         },
         "version": {
             "number": page.version,
             "message": "Page updated automatically by confluence-readme-sync GitHub action"
         }
-        })
+        }, page.spans)
 
-        return requests.request(
+        return (session or requests).request(
             "PUT",
             url,
             data=payload,
@@ -176,25 +343,510 @@ class EditPageCommand(ApiCommand):
         )
 
 
+class GetChildPagesCommand(ApiCommand):
+    """
+    Concrete implementation of ApiCommand for listing the child pages of a page, without their bodies.
+    This class plays the role of a Concrete Command in the Command pattern.
+    """
+
+    def __init__(self, input: GetChildPagesCommandInput):
+        """
+        Initialize the command with a GetChildPagesCommandInput.
+
+        :param input: The command input to use.
+        """
+        super().__init__(input)
+        self.input = input
+
+    def execute(self, auth: HTTPBasicAuth, session: Session | None = None) -> Response:
+        """
+        Execute the command by sending a GET request to the API for up to 250 child pages.
+
+        :param auth: The HTTPBasicAuth to use for authentication.
+        :param session: The session to send the request with, or None to open a new connection.
+        :return: The response from the API.
+        """
+        url = f"https://{self.input.domain}/wiki/api/v2/pages/{self.input.id}/children"
+        headers = {
+        "Accept": "application/json"
+        }
+        query = {
+            "limit": 250
+        }
+        if self.input.cursor:
+            query["cursor"] = self.input.cursor
+        return (session or requests).request(
+            "GET",
+            url,
+            headers=headers,
+            auth=auth,
+            params=query
+        )
+
+
+class CreatePageCommand(ApiCommand):
+    """
+    Concrete implementation of ApiCommand for creating a page.
+    This class plays the role of a Concrete Command in the Command pattern.
+    """
+
+    def __init__(self, input: CreatePageCommandInput):
+        """
+        Initialize the command with a CreatePageCommandInput.
+
+        :param input: The command input to use.
+        """
+        super().__init__(input)
+        self.input = input
+
+    def execute(self, auth: HTTPBasicAuth, session: Session | None = None) -> Response:
+        """
+        Execute the command by sending a POST request to the API.
+
+        :param auth: The HTTPBasicAuth to use for authentication.
+        :param session: The session to send the request with, or None to open a new connection.
+        :return: The response from the API.
+        """
+        page = self.input
+
+        url = f"https://{self.input.domain}/wiki/api/v2/pages"
+
+        headers = {
+        "Accept": "application/json",
+        "Content-Type": "application/json"
+        }
+
+        payload = json.dumps( {
+        "spaceId": page.space_id,
+        "status": "current",
+        "title": page.title,
+        "parentId": page.parent_id,
+        "body": {
+            "representation": "storage",
+            "value": page.body
+        }
+        })
+
+        return (session or requests).request(
+            "POST",
+            url,
+            data=payload,
+            headers=headers,
+            auth=auth
+        )
+
+
+class GetAttachmentsCommand(ApiCommand):
+    """
+    Concrete implementation of ApiCommand for listing the attachments of a page.
+    This class plays the role of a Concrete Command in the Command pattern.
+    """
+
+    def __init__(self, input: GetAttachmentsCommandInput):
+        """
+        Initialize the command with a GetAttachmentsCommandInput.
+
+        :param input: The command input to use.
+        """
+        super().__init__(input)
+        self.input = input
+
+    def execute(self, auth: HTTPBasicAuth, session: Session | None = None) -> Response:
+        """
+        Execute the command by sending a GET request to the API for up to 250 attachments.
+
+        :param auth: The HTTPBasicAuth to use for authentication.
+        :param session: The session to send the request with, or None to open a new connection.
+        :return: The response from the API.
+        """
+        url = f"https://{self.input.domain}/wiki/api/v2/pages/{self.input.id}/attachments"
+        headers = {
+        "Accept": "application/json"
+        }
+        query = {
+            "limit": 250
+        }
+        if self.input.cursor:
+            query["cursor"] = self.input.cursor
+        return (session or requests).request(
+            "GET",
+            url,
+            headers=headers,
+            auth=auth,
+            params=query
+        )
+
+
+class UploadAttachmentCommand(ApiCommand):
+    """
+    Concrete implementation of ApiCommand for attaching a file to a page, or updating the attachment with the same name.
+    This class plays the role of a Concrete Command in the Command pattern.
+    """
+
+    def __init__(self, input: UploadAttachmentCommandInput):
+        """
+        Initialize the command with an UploadAttachmentCommandInput.
+
+        :param input: The command input to use.
+        """
+        super().__init__(input)
+        self.input = input
+
+    def execute(self, auth: HTTPBasicAuth, session: Session | None = None) -> Response:
+        """
+        Execute the command by sending a multipart PUT request to the v1 API, as the v2 API can not upload attachments.
+
+        :param auth: The HTTPBasicAuth to use for authentication.
+        :param session: The session to send the request with, or None to open a new connection.
+        :return: The response from the API.
+        """
+        attachment = self.input
+
+        url = f"https://{self.input.domain}/wiki/rest/api/content/{self.input.id}/child/attachment"
+
+        headers = {
+        "Accept": "application/json",
+        "X-Atlassian-Token": "no-check"
+        }
+
+        return (session or requests).request(
+            "PUT",
+            url,
+            files={"file": (attachment.filename, attachment.content, attachment.media_type)},
+            data={"comment": attachment.comment, "minorEdit": "true"},
+            headers=headers,
+            auth=auth
+        )
+
+
+class BulkGetPagesCommand(ApiCommand):
+    """
+    Concrete implementation of ApiCommand for getting many pages by their IDs in a single request.
+    This class plays the role of a Concrete Command in the Command pattern.
+    """
+
+    def __init__(self, input: BulkGetPagesCommandInput):
+        """
+        Initialize the command with a BulkGetPagesCommandInput.
+
+        :param input: The command input to use.
+        """
+        super().__init__(input)
+        self.input = input
+
+    def execute(self, auth: HTTPBasicAuth, session: Session | None = None) -> Response:
+        """
+        Execute the command by sending a GET request to the API for up to 250 of the pages.
+
+        :param auth: The HTTPBasicAuth to use for authentication.
+        :param session: The session to send the request with, or None to open a new connection.
+        :return: The response from the API.
+        """
+        url = f"https://{self.input.domain}/wiki/api/v2/pages"
+        headers = {
+        "Accept": "application/json"
+        }
+        query = {
+            "id": ",".join(self.input.ids),
+            "limit": BULK_PAGE_LIMIT
+        }
+        if self.input.include_body:
+            query["body-format"] = "storage"
+        if self.input.cursor:
+            query["cursor"] = self.input.cursor
+        return (session or requests).request(
+            "GET",
+            url,
+            headers=headers,
+            auth=auth,
+            params=query
+        )
+
+
+class StreamedJsonBody:
+    """
+    A JSON request body whose largest string is escaped and encoded a chunk at a time while the request is sent, instead of
+    being joined, dumped and encoded into full copies of the string first. The chunks are the same bytes as ``json.dumps``
+    gives once encoded, and the body can be sent again, eg. when a throttled request is retried.
+    """
+
+    def __init__(self, document: dict, spans: list[Span]):
+        """
+        Initialize the body.
+
+        :param document: The JSON document, with :data:`STREAMED_VALUE` in place of the streamed string.
+        :param spans: The spans the streamed string is made of.
+        """
+        self.prefix, self.suffix = (part.encode() for part in json.dumps(document).split(json.dumps(STREAMED_VALUE)))
+        self.spans = spans
+        self._length: int | None = None
+
+    def __iter__(self):
+        yield self.prefix + b'"'
+        for chunk in span_chunks(self.spans, BODY_CHUNK_SIZE):
+            # escaping is done one character at a time, so escaping each chunk gives the same result as escaping the whole string
+            yield json.dumps(chunk)[1:-1].encode()
+        yield b'"' + self.suffix
+
+    def __len__(self) -> int:
+        """
+        The number of bytes of the body, which requests sends as the Content-Length of the request.
+        """
+        if self._length is None:
+            self._length = sum(len(chunk) for chunk in self)
+        return self._length
+
+    def __bytes__(self) -> bytes:
+        return b''.join(self)
+
+
+class Page:
+    """
+    The fields of a page that a sync reads, parsed from a response of the pages API.
+    """
+
+    def __init__(self, page_id: str, status: str, title: str, body: str | None, version: int, space_id: str | None = None):
+        """
+        Initialize the page.
+
+        :param page_id: The ID of the page.
+        :param status: The status of the page, eg. current.
+        :param title: The title of the page.
+        :param body: The storage format body of the page, or None if it was not requested.
+        :param version: The version number of the page.
+        :param space_id: The ID of the space of the page, or None if it is not known.
+        """
+        self.id = page_id
+        self.status = status
+        self.title = title
+        self.body = body
+        self.version = version
+        self.space_id = space_id
+
+    @classmethod
+    def from_json(cls, page: dict) -> "Page":
+        """
+        Parses a page from the JSON of a page returned by the API.
+        """
+        body = page.get("body", {}).get("storage", {}).get("value")
+        space_id = page.get("spaceId")
+        return cls(str(page["id"]), page["status"], page["title"], body, page["version"]["number"], str(space_id) if space_id is not None else None)
+
+
+class ConfluenceSession(Session):
+    """
+    A keep-alive session with a bounded connection pool and a default timeout for every request.
+    """
+
+    def __init__(self, pool_size: int = 10, timeout: float | tuple[float, float] = (10, 60)):
+        """
+        Initialize the session and mount a connection pool for HTTPS requests.
+
+        :param pool_size: The maximum number of connections kept open to the domain.
+        :param timeout: The default connect and read timeout in seconds, used when a request does not set one.
+        """
+        super().__init__()
+        self.timeout = timeout
+        self.headers["Connection"] = "keep-alive"
+        self.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+    def request(self, method: str, url: str, **kwargs) -> Response:
+        """
+        Send a request, applying the default timeout if none was given.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
 class ConfluenceClient:
     """
     Client class for interacting with the API. 
     This class plays the role of the Invoker in the Command pattern.
     """
     
-    def __init__(self, auth: HTTPBasicAuth):
+    def __init__(self, auth: HTTPBasicAuth, pool_size: int = 10, timeout: float | tuple[float, float] = (10, 60), max_conflict_retries: int = 3, conflict_backoff: float = 0.5, max_throttle_retries: int = 5, throttle_backoff: float = 1.0, metrics: Metrics | None = None):
         """
         Initialize the client with an HTTPBasicAuth object.
+        A pooled session is opened for each domain the client sends commands to, so connections are reused between commands.
 
         :param auth: The HTTPBasicAuth to use for authentication.
+        :param pool_size: The maximum number of connections kept open to each domain.
+        :param timeout: The default connect and read timeout in seconds for every request.
+        :param max_conflict_retries: The maximum number of times an edit is retried after a version conflict.
+        :param conflict_backoff: The base number of seconds to wait before retrying an edit, doubled for every retry.
+        :param max_throttle_retries: The maximum number of times a throttled request is retried.
+        :param throttle_backoff: The base number of seconds to wait before retrying a throttled request without a Retry-After header, doubled for every retry.
+        :param metrics: The metrics to record the time and size of every request in.
         """
         self.auth = auth
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_conflict_retries = max_conflict_retries
+        self.conflict_backoff = conflict_backoff
+        self.max_throttle_retries = max_throttle_retries
+        self.throttle_backoff = throttle_backoff
+        self.rate_limiter = AdaptiveRateLimiter(pool_size)
+        self.metrics = metrics or Metrics()
+        self.conflicts = 0
+        self.throttles = 0
+        self.retries = 0
+        self.sessions: dict[str, ConfluenceSession] = {}
+        self._sessions_lock = threading.Lock()
+        self._conflicts_lock = threading.Lock()
+        self._throttles_lock = threading.Lock()
+
+    def session(self, domain: str) -> ConfluenceSession:
+        """
+        Get the pooled session for a domain, opening it if it does not exist yet.
+
+        :param domain: The domain of the API to interact with.
+        :return: The session for the domain.
+        """
+        with self._sessions_lock:
+            if domain not in self.sessions:
+                self.sessions[domain] = ConfluenceSession(self.pool_size, self.timeout)
+            return self.sessions[domain]
     
     def send(self, command: ApiCommand):
         """
         Send a command to the API and return the response.
+        The number of commands in flight is limited by the client's rate limiter, and commands that are throttled by the API
+        are retried after the delay in the Retry-After header, or a jittered exponential backoff if it is missing.
 
         :param command: The command to execute.
         :return: The response from the API.
         """
-        return command.execute(self.auth)
\ No newline at end of file
+        session = self.session(command.input.domain)
+        for attempt in range(self.max_throttle_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                with self.metrics.span(f"request.{type(command).__name__}"):
+                    response = command.execute(self.auth, session)
+            except BaseException:
+                self.rate_limiter.release()
+                raise
+            self.record_sizes(response)
+            if response.status_code not in THROTTLE_STATUS_CODES or attempt == self.max_throttle_retries:
+                self.rate_limiter.release()
+                return response
+
+            delay = retry_after(response)
+            if delay is None:
+                delay = random.uniform(0.5, 1.5) * self.throttle_backoff * 2 ** attempt
+            with self._throttles_lock:
+                self.throttles += 1
+                self.retries += 1
+            self.rate_limiter.release(throttled=True, delay=delay)
+        return response
+
+    def record_sizes(self, response: Response) -> None:
+        """
+        Counts the request and the number of bytes sent and received for it in the client's metrics.
+        """
+        self.metrics.increment("requests")
+        request_body = getattr(getattr(response, "request", None), "body", None)
+        if isinstance(request_body, str):
+            request_body = request_body.encode()
+        if isinstance(request_body, (bytes, StreamedJsonBody)):
+            self.metrics.increment("request.bytes", len(request_body))
+        response_body = getattr(response, "content", None)
+        if isinstance(response_body, bytes):
+            self.metrics.increment("response.bytes", len(response_body))
+
+    def send_edit(self, command: EditPageCommand, rebase: Callable[[str], str | list[Span]]) -> Response:
+        """
+        Send an edit page command, retrying it if the page was edited by someone else since it was fetched.
+        On a version conflict the latest version of the page is fetched, the edit is re-applied to its body with the
+        rebase function and the command is sent again with the new version number, after a jittered exponential backoff.
+        The command's input is replaced by the input of the last attempt.
+
+        :param command: The command to execute.
+        :param rebase: A function that applies the edit to the latest body of the page and returns the new body.
+        :return: The response from the API to the last attempt.
+        """
+        response = self.send(command)
+        for attempt in range(self.max_conflict_retries):
+            if response.status_code != 409:
+                break
+            with self._conflicts_lock:
+                self.conflicts += 1
+            time.sleep(random.uniform(0, self.conflict_backoff * 2 ** attempt))
+
+            input = command.input
+            page = self.get_page(input.domain, input.id)
+            command.input = EditPageCommandInput(input.domain, input.id, page.status, page.title, rebase(page.body), page.version)
+            response = self.send(command)
+        return response
+
+    def get_page(self, domain: str, page_id: str) -> Page:
+        """
+        Gets a page with its body. The response is released once the page is parsed, so only the body is kept.
+
+        :param domain: The domain of the Confluence site.
+        :param page_id: The ID of the page.
+        :return: The page.
+        """
+        response = self.send(GetPageCommand(GetPageCommandInput(domain, page_id)))
+        response.raise_for_status()
+        return Page.from_json(json.loads(response.text))
+
+    def get_pages(self, domain: str, page_ids: list[str], include_body: bool = True) -> dict[str, Page]:
+        """
+        Gets many pages of a site with as few requests as possible, :data:`BULK_PAGE_LIMIT` pages at a time,
+        following the cursor of each page of results.
+        Pages that do not exist or can not be viewed are missing from the result.
+
+        :param domain: The domain of the Confluence site.
+        :param page_ids: The IDs of the pages to get.
+        :param include_body: Whether to get the storage format body of the pages, or only their metadata and version.
+        :return: Each page that was found by its ID.
+        """
+        page_ids = list(dict.fromkeys(page_ids))
+        pages: dict[str, Page] = {}
+        for start in range(0, len(page_ids), BULK_PAGE_LIMIT):
+            cursor = None
+            while True:
+                response = self.send(BulkGetPagesCommand(BulkGetPagesCommandInput(domain, page_ids[start:start + BULK_PAGE_LIMIT], include_body, cursor)))
+                response.raise_for_status()
+                body = json.loads(response.text)
+                # the response is not kept while the next results are fetched
+                response = None
+                for page in body.get("results", []):
+                    pages[str(page["id"])] = Page.from_json(page)
+                cursor = next_cursor(body)
+                if not cursor:
+                    break
+        return pages
+
+    def close(self) -> None:
+        """
+        Close every pooled session and the connections they hold.
+        """
+        with self._sessions_lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+
+    def __enter__(self) -> "ConfluenceClient":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def retry_after(response: Response) -> float | None:
+    """
+    Reads the number of seconds to wait before retrying a request from the Retry-After header of its response.
+
+    :param response: The response to a throttled request.
+    :return: The number of seconds to wait, or None if the header is missing or invalid.
+    """
+    value = response.headers.get("Retry-After") if response.headers else None
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
\ No newline at end of file
@@ -0,0 +1,209 @@
+"""
+Batch mode that syncs many markdown files to many Confluence pages from a single manifest.
+"""
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from requests import RequestException
+from src.api import ConfluenceClient, Page
+from src.errors import InvalidParameterError
+from src.converter import MarkdownConverter
+from src.metrics import Metrics
+from src.state import SyncState
+from src.sync import SyncMapping, SyncResult, UNCHANGED, sync_sections, unchanged_since_sync
+from src.utils import extract_domain_and_page_id
+
+MAPPING_KEYS = ["filepath", "url", "insert_start_text", "insert_end_text"]
+
+def load_manifest(path: str, split_size: int | None = None) -> list[SyncMapping]:
+    """
+    Loads the mappings listed in a JSON or YAML manifest file.
+
+    The manifest is either a list of mappings or an object with a ``pages`` list and optional ``defaults``
+    that are applied to every mapping, eg. to share the same ``insert_start_text`` across pages.
+    A mapping may also set the ``split_size`` of its markdown, see :class:`SyncMapping`.
+
+    :param str path: The file path of the manifest. Files ending in .yml or .yaml are read as YAML.
+    :param int split_size: The split size of the mappings that do not set their own, or None to not split them
+    :return list[SyncMapping]: The mappings in the order they appear in the manifest
+    """
+    with open(path, 'r') as f:
+        text = f.read()
+
+    if path.endswith((".yml", ".yaml")):
+        import yaml
+        manifest = yaml.safe_load(text)
+    else:
+        manifest = json.loads(text)
+
+    defaults: dict = {}
+    if isinstance(manifest, dict):
+        defaults = manifest.get("defaults") or {}
+        manifest = manifest.get("pages")
+    if not isinstance(manifest, list) or not manifest:
+        raise InvalidParameterError(f"Error: Manifest {path} does not list any pages")
+
+    mappings: list[SyncMapping] = []
+    for index, entry in enumerate(manifest):
+        values = {**defaults, **entry}
+        for key in MAPPING_KEYS:
+            if not values.get(key):
+                raise InvalidParameterError(f"Error: Missing value for {key} in manifest entry {index}")
+        mapping_split_size = values.get("split_size", split_size)
+        if mapping_split_size is not None and (not isinstance(mapping_split_size, int) or isinstance(mapping_split_size, bool) or mapping_split_size < 1):
+            raise InvalidParameterError(f"Error: split_size must be a positive integer in manifest entry {index}, got {mapping_split_size}")
+        mappings.append(SyncMapping(*(values[key] for key in MAPPING_KEYS), split_size=mapping_split_size))
+    return mappings
+
+
+def group_by_page(mappings: list[SyncMapping]) -> list[list[SyncMapping]]:
+    """
+    Groups the mappings that sync to sections of the same page, so each page is fetched and edited once.
+
+    :param mappings: The mappings to group.
+    :return: The groups, in the order their first mapping appears in.
+    """
+    groups: dict[tuple[str, str] | int, list[SyncMapping]] = {}
+    for index, mapping in enumerate(mappings):
+        try:
+            key = extract_domain_and_page_id(mapping.url)
+        except ValueError:
+            # the invalid url is reported by the sync of the mapping
+            key = index
+        groups.setdefault(key, []).append(mapping)
+    return list(groups.values())
+
+
+def prefetch_pages(client: ConfluenceClient, groups: list[list[SyncMapping]], state: SyncState | None = None) -> dict[tuple[str, str], Page]:
+    """
+    Gets the page of every group with as few requests as possible, see :meth:`ConfluenceClient.get_pages`.
+    The pages whose sections all have a record in the state are fetched without their body, as their sync usually only needs
+    the page version; the sync fetches the body of such a page itself if its markdown changed.
+    If the bulk requests fail, every page is left to be fetched by its own sync.
+
+    :param client: The client to send the API commands with.
+    :param groups: The mappings of each page, see :func:`group_by_page`.
+    :param state: The record of previous syncs.
+    :return: Each page that was found by its domain and ID.
+    """
+    pages: dict[tuple[str, str], Page] = {}
+    for (domain, include_body), ids in _prefetched_ids(groups, state).items():
+        try:
+            with client.metrics.span("sync.get_pages"):
+                found = client.get_pages(domain, ids, include_body)
+        except (RequestException, ValueError, KeyError) as e:
+            logging.warning(f"Failed to get the pages of {domain} in bulk, getting each page separately: {e}")
+            continue
+        for page_id, page in found.items():
+            pages[(domain, page_id)] = page
+    return pages
+
+
+def _prefetched_ids(groups: list[list[SyncMapping]], state: SyncState | None) -> dict[tuple[str, bool], list[str]]:
+    """
+    Lists the page IDs to get in bulk by their domain and whether their body is needed, see :func:`prefetch_pages`.
+    """
+    page_ids: dict[tuple[str, bool], list[str]] = {}
+    for group in groups:
+        try:
+            domain, page_id = extract_domain_and_page_id(group[0].url)
+        except ValueError:
+            continue
+        include_body = not (state and all(state.get(mapping.key) for mapping in group))
+        page_ids.setdefault((domain, include_body), []).append(page_id)
+    return page_ids
+
+
+def _sync_group(client: ConfluenceClient, mappings: list[SyncMapping], state: SyncState | None, converter: MarkdownConverter | None, page: Page | None = None) -> list[SyncResult]:
+    """
+    Syncs the manifest entries of a single page, capturing any error in the results instead of raising it.
+    """
+    try:
+        status = sync_sections(client, mappings, state, converter, page)
+    except Exception as e:
+        return [SyncResult(mapping, error=e) for mapping in mappings]
+    return [SyncResult(mapping, status) for mapping in mappings]
+
+
+def run_batch(client: ConfluenceClient, mappings: list[SyncMapping], max_workers: int = 4, state: SyncState | None = None, converter: MarkdownConverter | None = None, skip_unchanged_files: bool = False) -> list[SyncResult]:
+    """
+    Syncs every mapping concurrently with a bounded pool of worker threads.
+    Mappings to sections of the same page are synced together with one edit of the page, and the pages of every mapping
+    are fetched up front with a few bulk requests instead of a GET per page, see :func:`prefetch_pages`.
+    A failing page does not stop the others from being synced.
+
+    :param client: The client to send the API commands with.
+    :param mappings: The mappings to sync.
+    :param max_workers: The maximum number of pages synced at the same time.
+    :param state: The record of previous syncs, shared by every mapping.
+    :param converter: The converter to convert the markdown with, shared by every mapping.
+    :param skip_unchanged_files: Whether to skip the pages whose files did not change since their last recorded sync
+        without any request, see :func:`src.sync.unchanged_since_sync`.
+    :return: The result of each mapping, in the same order as the mappings.
+    """
+    groups, skipped_results = _skip_unchanged_groups(client.metrics, mappings, state, skip_unchanged_files)
+    pages = prefetch_pages(client, groups, state)
+
+    def sync_group(group: list[SyncMapping]) -> list[SyncResult]:
+        return _sync_group(client, group, state, converter, _prefetched_page(pages, group))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        group_results = list(executor.map(sync_group, groups))
+    return _collect_results(mappings, group_results + [skipped_results])
+
+
+def _skip_unchanged_groups(metrics: Metrics, mappings: list[SyncMapping], state: SyncState | None, skip_unchanged_files: bool) -> tuple[list[list[SyncMapping]], list[SyncResult]]:
+    """
+    Groups the mappings by page and splits off the pages whose files did not change, if they are skipped.
+
+    :return: The groups to sync, and the results of the mappings of the skipped pages.
+    """
+    groups: list[list[SyncMapping]] = []
+    skipped_groups: list[list[SyncMapping]] = []
+    for group in group_by_page(mappings):
+        (skipped_groups if skip_unchanged_files and unchanged_since_sync(group, state) else groups).append(group)
+    if skipped_groups:
+        logging.info(f"Skipping {len(skipped_groups)} pages whose markdown files are unchanged since the last sync.")
+        metrics.increment("pages.skipped", len(skipped_groups))
+    return groups, [SyncResult(mapping, UNCHANGED) for group in skipped_groups for mapping in group]
+
+
+def _prefetched_page(pages: dict[tuple[str, str], Page], group: list[SyncMapping]) -> Page | None:
+    try:
+        return pages.get(extract_domain_and_page_id(group[0].url))
+    except ValueError:
+        return None
+
+
+def _collect_results(mappings: list[SyncMapping], group_results: list[list[SyncResult]]) -> list[SyncResult]:
+    """
+    Orders the results of every group like the mappings and logs them.
+    """
+    results_by_mapping = {id(result.mapping): result for results in group_results for result in results}
+    results = [results_by_mapping[id(mapping)] for mapping in mappings]
+
+    for result in results:
+        if result.success:
+            logging.info(f"Synced {result.mapping.filepath} to {result.mapping.url}: {result.status}")
+        else:
+            logging.error(f"Failed to sync {result.mapping.filepath} to {result.mapping.url}: {result.error}")
+    return results
+
+
+def summarize_results(results: list[SyncResult]) -> str:
+    """
+    Serializes the status of each result so it can be set as an action output.
+
+    :param results: The results of a batch sync.
+    :return: A single line JSON list of the file path, url, status and error of each result.
+    """
+    return json.dumps([
+        {
+            "filepath": result.mapping.filepath,
+            "url": result.mapping.url,
+            "status": result.status,
+            "error": str(result.error) if result.error else None
+        }
+        for result in results
+    ])
@@ -0,0 +1,123 @@
+"""
+A size bounded on-disk cache of converted markdown.
+"""
+
+import os
+import threading
+
+class ConversionCache:
+    """
+    Stores converted HTML in a directory, one file per key, and evicts the least recently used entries when the
+    directory grows larger than its maximum size. Entries are marked as used by updating their modification time,
+    so the recency survives between runs.
+
+    The size of every entry is tracked in memory after the directory is scanned once, so caching an entry does not scan
+    the directory. Eviction scans it to sort the entries by recency, and removes entries until the cache is well below its
+    maximum size so that it is not scanned again by the next entries.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 100 * 1024 * 1024):
+        """
+        Initialize the cache, creating its directory if it does not exist.
+
+        :param directory: The directory to store the entries in.
+        :param max_bytes: The maximum total size of the entries.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # the size of every entry by its path, scanned from the directory on the first put
+        self._sizes: dict[str, int] | None = None
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.html")
+
+    def get(self, key: str) -> str | None:
+        """
+        Gets a cached entry and marks it as recently used.
+
+        :param key: The key of the entry.
+        :return: The cached text, or None if it is not cached.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        """
+        Caches an entry, evicting the least recently used entries if the cache is too large.
+
+        :param key: The key of the entry.
+        :param text: The text to cache.
+        """
+        path = self._path(key)
+        # write to a temporary file first so a concurrent reader never sees a partial entry
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temporary_path, path)
+        size = len(text.encode('utf-8'))
+        with self._lock:
+            if self._sizes is None:
+                self._scan()
+            self._total_bytes += size - self._sizes.get(path, 0)
+            self._sizes[path] = size
+            full = self._total_bytes > self.max_bytes
+        if full:
+            self.evict()
+
+    def _scan(self) -> list[tuple[float, int, str]]:
+        """
+        Reads the size of every entry from the directory. Must be called with the lock held.
+
+        :return: The modification time, size and path of every entry.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".html"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        self._sizes = {path: size for _, size, path in entries}
+        self._total_bytes = sum(self._sizes.values())
+        return entries
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used entries until the cache fits in 90% of its maximum size, if it is larger than its maximum size.
+        """
+        with self._lock:
+            entries = self._scan()
+            if self._total_bytes <= self.max_bytes:
+                return
+            for _, size, path in sorted(entries):
+                if self._total_bytes <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                else:
+                    self.evictions += 1
+                self._total_bytes -= size
+                del self._sizes[path]
+
+    def stats(self) -> dict[str, int]:
+        """
+        Gets the number of hits, misses and evictions since the cache was opened.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
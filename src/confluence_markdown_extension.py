@@ -3,64 +3,117 @@ An extension for the `python-markdown <https://pypi.org/project/Markdown/>`_ pac
 pages in a nicer way than pure markdown.
 """
 
-import re
-from markdown.postprocessors import Postprocessor
-from markdown.preprocessors import Preprocessor
+import xml.etree.ElementTree as etree
+from html import escape, unescape
+from markdown.treeprocessors import Treeprocessor
 from markdown.extensions import Extension
 from markdown import Markdown
 
-class SectionLinkPreprocessor(Preprocessor):
+# maps markdown code block languages to the name of the language in the Confluence code snippet macro
+LANGUAGE_ALIASES: dict[str, str] = {
+    "bash": "shell",
+    "sh": "shell",
+    "zsh": "shell",
+    "console": "shell",
+    "js": "javascript",
+    "ts": "typescript",
+    "py": "python",
+    "rb": "ruby",
+    "yml": "yaml",
+    "html": "xml",
+    "ps1": "powershell",
+    "c++": "cpp",
+    "cs": "c#",
+    "csharp": "c#",
+}
+
+class CodeBlockTreeprocessor(Treeprocessor):
     """
-    A preprocessor that removes extra hashtags before section links.
+    A treeprocessor that reformats code blocks to Confluence code snippet macros.
     """
-    def run(self, lines: list[str]) -> list[str]:
+    def __init__(self, md: Markdown | None = None, language_aliases: dict[str, str] | None = None):
+        super().__init__(md)
+        self.language_aliases = LANGUAGE_ALIASES if language_aliases is None else language_aliases
+
+    def run(self, root: etree.Element) -> None:
         """
-        Removes extra hashtags before section links such that they have only one hashtag.
+        Replaces code blocks with Confluence code snippet macros, both the indented code blocks in the element tree and
+        the fenced code blocks that the fenced_code extension stashed as raw HTML.
         """
-        modified_lines: list[str] = []
-        for line in lines:
-            # replace links to sections on the page with one hashtag instead of multiple to work in confluence urls
-            modified_lines.append(re.sub(r'\]\(#+', r'](#', line, flags=re.DOTALL))
-        return modified_lines
+        stash = self.md.htmlStash
+        for index, block in enumerate(stash.rawHtmlBlocks):
+            if isinstance(block, str) and block.startswith('<pre'):
+                try:
+                    pre = etree.fromstring(block)
+                except etree.ParseError:
+                    continue
+                if self.is_code_block(pre):
+                    stash.rawHtmlBlocks[index] = self.to_macro(pre, escaped=False)
 
-class CodeBlockPostprocessor(Postprocessor):
-    """
-    A postprocessor that reformats HTML code blocks to Confluence code snippet macros.
-    """
-    def run(self, text: str) -> str:
+        for parent in root.iter():
+            for index, child in enumerate(parent):
+                if self.is_code_block(child):
+                    # storage format needs CDATA, which the serializer can not write, so the macro is stashed as raw HTML
+                    placeholder = etree.Element('p')
+                    placeholder.text = stash.store(self.to_macro(child, escaped=True))
+                    placeholder.tail = child.tail
+                    parent[index] = placeholder
+
+    @staticmethod
+    def is_code_block(element: etree.Element) -> bool:
         """
-        Replaces HTML code blocks with Confluence code snippet macros with language support.
+        Checks whether an element is a ``<pre><code>`` code block.
         """
-        # replace code blocks with confluence code blocks using the code snippets macro format
-        #TODO: add if statement to check for the language tag and if it doesnt exist set language to none
-        processed_text = re.sub(
-            r'<pre><code class="language-(\w+)">(.*?)\n?</code></pre>', 
-            r'<ac:structured-macro ac:name="code"><ac:parameter ac:name="language">\1</ac:parameter><ac:plain-text-body><![CDATA[\2]]></ac:plain-text-body></ac:structured-macro>', 
-            text,
-            flags=re.DOTALL
-        )
-        #map certain languages to supported confluence languages
-        if processed_text != text: #text was changed
-            #<ac:parameter ac:name="language">\1</ac:parameter>
-            processed_text = re.sub(
-                r'<ac:parameter ac:name="language">bash</ac:parameter>', 
-                r'<ac:parameter ac:name="language">shell</ac:parameter>', 
-                processed_text,
-                flags=re.DOTALL
-            )
-        return processed_text
+        return element.tag == 'pre' and len(element) == 1 and element[0].tag == 'code'
+
+    def to_macro(self, pre: etree.Element, escaped: bool) -> str:
+        """
+        Builds the Confluence code snippet macro for a code block, mapping its language to a language supported by Confluence.
+        Code blocks without a language get a macro without a language parameter.
+
+        :param pre: The ``<pre>`` element of the code block.
+        :param escaped: Whether the code text is still HTML escaped, as it is for indented code blocks in the element tree.
+        """
+        code = pre[0]
+        language = None
+        for css_class in code.get('class', '').split():
+            if css_class.startswith('language-'):
+                language = css_class[len('language-'):]
+                break
+        # CDATA is not parsed as HTML, so the code must be written exactly as it is in the markdown
+        text = code.text or ''
+        if escaped:
+            text = unescape(text)
+        if text.endswith('\n'):
+            text = text[:-1]
+        parts = ['<ac:structured-macro ac:name="code">']
+        if language:
+            language = self.language_aliases.get(language.lower(), language)
+            parts.append(f'<ac:parameter ac:name="language">{escape(language)}</ac:parameter>')
+        # a CDATA section can not contain its own terminator, so it is split across two sections
+        parts.append(f'<ac:plain-text-body><![CDATA[{text.replace("]]>", "]]]]><![CDATA[>")}]]></ac:plain-text-body></ac:structured-macro>')
+        return ''.join(parts)
 
 class ConfluenceExtension(Extension):
     """
     The extension to be included in the `extensions` argument of the :ref:`Markdown.markdown` function.
     """
+    def __init__(self, **kwargs):
+        self.config = {
+            'language_aliases': [dict(LANGUAGE_ALIASES), 'Maps markdown code block languages to Confluence code macro languages']
+        }
+        super().__init__(**kwargs)
+
     def extendMarkdown(self, md: Markdown):
         """
         Adds the processors to the extension.
         """
         md.registerExtension(self)
-        md.preprocessors.register(SectionLinkPreprocessor(md), 'confluence_section_links', 0)
-        md.postprocessors.register(CodeBlockPostprocessor(md), 'confluence_code_block', 0)
+        # runs after prettify so code blocks have their final whitespace
+        md.treeprocessors.register(CodeBlockTreeprocessor(md, self.getConfig('language_aliases')), 'confluence_code_block', 5)
+        # lets the raw HTML postprocessor replace the whole placeholder paragraph with the macro
+        if 'ac:structured-macro' not in md.block_level_elements:
+            md.block_level_elements.append('ac:structured-macro')
 
 def makeExtension(*args, **kwargs):
     """
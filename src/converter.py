@@ -0,0 +1,406 @@
+"""
+Converts markdown to Confluence storage format HTML.
+"""
+
+import functools
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from types import CodeType
+from typing import TYPE_CHECKING, Iterable
+from src.cache import ConversionCache
+from src.metrics import Metrics
+from src.section_links import link_sections
+from src.utils import content_hash
+
+# markdown and the extension are imported by the first conversion, so runs that convert nothing do not pay for importing them
+if TYPE_CHECKING:
+    import markdown
+    from src.profiling import ConversionProfiler
+
+EXTENSION_NAMES = ['tables', 'fenced_code']
+
+# documents smaller than this are converted serially even when parallel conversion is enabled, as starting processes costs more
+PARALLEL_MIN_SIZE = 256 * 1024
+
+HEADING_PATTERN = re.compile(r'^#{1,6}(?:[ \t]|$)')
+FENCE_OPEN_PATTERN = re.compile(r'^(?P<fence>`{3,}|~{3,})[ ]*(?:\{[^\n]*\}|\.?[\w#.+-]*[ ]*(?:hl_lines=(["\']).*?\2[ ]*)?)$')
+HTML_OPEN_PATTERN = re.compile(r'^[ ]{0,3}<(!--|[a-zA-Z][\w:-]*)')
+REFERENCE_PATTERN = re.compile(r'^[ ]{0,3}\[[^\[\]]*\]:[ ]*(?P<link>\S*)')
+# a reference definition that may be inside a blockquote, a list item or an indented block, which is not collected with the top-level ones
+# the title of a reference definition may be on the line after its link
+REFERENCE_TITLE_PATTERN = re.compile(r'^[ ]*(?:"[^"]*"|\'[^\']*\'|\([^)]*\))[ ]*$')
+NESTED_REFERENCE_PATTERN = re.compile(r'^[ \t>]*(?:(?:[-*+]|\d+[.)])[ \t]+)?[ \t>]*\[[^\[\]]*\]:')
+
+# a paragraph appended to every chunk but the last, so the whitespace that the last element of the chunk is followed by is not stripped
+CHUNK_END_MARKER = "confluencereadmesyncchunkend"
+CHUNK_END_HTML = f"<p>{CHUNK_END_MARKER}</p>"
+
+_fingerprint: str | None = None
+
+def markdown_extensions() -> list:
+    """
+    Creates the list of extensions used to convert markdown.
+
+    :return list: The built-in extension names followed by a new :class:`ConfluenceExtension`
+    """
+    from src.confluence_markdown_extension import ConfluenceExtension
+    return [*EXTENSION_NAMES, ConfluenceExtension()]
+
+class ConversionEngine:
+    """
+    Converts markdown with a pipeline of extensions and processors that is built once per thread and reused between
+    documents, as building it costs more than converting a small document. Markdown instances are not thread safe,
+    so every thread that converts with the engine gets its own instance, which is reset before every document.
+    """
+
+    def __init__(self, metrics: Metrics | None = None):
+        """
+        Initialize the engine without building any pipeline yet.
+
+        :param metrics: The metrics to record the time spent in every registered processor and in resolving the section
+            links of converted documents in, or None to not time them.
+        """
+        self.metrics = metrics
+        self._local = threading.local()
+        # section links are resolved outside the pipeline, so they are timed under a span of their own
+        self.link_sections = link_sections if metrics is None else _timed(link_sections, "convert.section_links", metrics)
+
+    def markdown(self) -> "markdown.Markdown":
+        """
+        Gets the markdown instance of the current thread, building it on the first conversion of the thread.
+
+        :return: The instance, reset so no state of its previous conversion is left.
+        """
+        md = getattr(self._local, "md", None)
+        if md is None:
+            import markdown
+            md = self._local.md = markdown.Markdown(extensions=markdown_extensions())
+            if self.metrics is not None:
+                instrument_processors(md, self.metrics)
+        return md.reset()
+
+    def convert(self, md_text: str) -> str:
+        """
+        Converts a markdown document to HTML.
+
+        :param md_text: The markdown to convert.
+        :return: The converted HTML.
+        """
+        return self.markdown().convert(md_text)
+
+    def convert_many(self, md_texts: Iterable[str]) -> list[str]:
+        """
+        Converts several markdown documents one after the other with the instance of the current thread.
+
+        :param md_texts: The markdown documents to convert.
+        :return: The converted HTML of each document, in the same order.
+        """
+        md = self.markdown()
+        return [md.reset().convert(md_text) for md_text in md_texts]
+
+
+# the engine of conversions that are not timed, shared by every converter without metrics
+DEFAULT_ENGINE = ConversionEngine()
+
+def render_markdown(md_text: str, metrics: Metrics | None = None) -> str:
+    """
+    Converts markdown to HTML in the current process.
+
+    :param str md_text: The markdown to convert
+    :param Metrics metrics: The metrics to record the time spent in every registered processor of the conversion in, if given
+    :return str: The converted HTML
+    """
+    return (DEFAULT_ENGINE if metrics is None else ConversionEngine(metrics)).convert(md_text)
+
+def instrument_processors(md: "markdown.Markdown", metrics: Metrics) -> None:
+    """
+    Times every registered preprocessor, treeprocessor and postprocessor of a markdown instance, and its block parser,
+    as a span named after the stage and the name the processor was registered with, eg. ``convert.treeprocessor.confluence_code_block``.
+    Inline patterns are run by the ``inline`` treeprocessor, so their time is included in its span.
+
+    :param markdown.Markdown md: The markdown instance to instrument
+    :param Metrics metrics: The metrics to record the spans in
+    """
+    for stage, registry in (("preprocessor", md.preprocessors), ("treeprocessor", md.treeprocessors), ("postprocessor", md.postprocessors)):
+        for index, processor in enumerate(registry):
+            # the registry does not expose the names of its items other than by their sorted index
+            name = registry._priority[index].name
+            processor.run = _timed(processor.run, f"convert.{stage}.{name}", metrics)
+    md.parser.parseDocument = _timed(md.parser.parseDocument, "convert.block_parser", metrics)
+
+def _timed(function, name: str, metrics: Metrics):
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            metrics.record(name, time.perf_counter() - start)
+    # profilers name functions after their code, so the wrapper is named after the span to attribute time to the processor by name
+    timed.__code__ = _named_code(timed.__code__, name)
+    return timed
+
+@functools.cache
+def _named_code(code: CodeType, name: str) -> CodeType:
+    # profile entries with the same name would overwrite each other, so every wrapper of a processor shares one code object
+    return code.replace(co_name=name, co_qualname=name)
+
+def conversion_fingerprint() -> str:
+    """
+    Identifies everything other than the markdown source that changes the converted HTML:
+    the markdown library version, the extension list and config, and the code of the Confluence extension and of the section links.
+
+    :return str: A hash that changes whenever the same markdown could convert differently
+    """
+    global _fingerprint
+    if _fingerprint is None:
+        import markdown
+        import src.confluence_markdown_extension
+        import src.section_links
+        from src.confluence_markdown_extension import ConfluenceExtension
+        sources = []
+        for module in (src.confluence_markdown_extension, src.section_links):
+            with open(module.__file__, 'r') as f:
+                sources.append(f.read())
+        config = repr(sorted(ConfluenceExtension().getConfigs().items()))
+        _fingerprint = content_hash("\0".join([markdown.__version__, *EXTENSION_NAMES, config, *sources]))
+    return _fingerprint
+
+def convert_markdown(md_text: str, cache: ConversionCache | None = None, workers: int = 1, incremental: bool = False, engine: ConversionEngine | None = None) -> str:
+    """
+    Converts markdown to HTML, reusing a previous conversion of the same markdown from the cache if one is given.
+    The section links of the document are resolved once it is converted in full, see :func:`src.section_links.link_sections`,
+    so links between the sections of a document that is converted in chunks are resolved too.
+
+    :param str md_text: The markdown to convert
+    :param ConversionCache cache: The cache of previous conversions
+    :param int workers: The number of processes large documents are converted with, see :func:`convert_markdown_parallel`
+    :param bool incremental: Whether to reuse the unchanged sections of a changed document from the cache, see :func:`convert_markdown_incremental`
+    :param ConversionEngine engine: The engine of serial conversions, or None for the :data:`DEFAULT_ENGINE`
+    :return str: The converted HTML
+    """
+    if cache is None:
+        return _convert(md_text, workers, engine=engine)
+    key = content_hash(conversion_fingerprint() + md_text)
+    converted_html = cache.get(key)
+    if converted_html is None:
+        converted_html = _convert(md_text, workers, cache, incremental, engine)
+        cache.put(key, converted_html)
+    return converted_html
+
+def _convert(md_text: str, workers: int, cache: ConversionCache | None = None, incremental: bool = False, engine: ConversionEngine | None = None) -> str:
+    if incremental and cache is not None:
+        html = convert_markdown_incremental(md_text, cache, workers if len(md_text) >= PARALLEL_MIN_SIZE else 1)
+    elif workers > 1 and len(md_text) >= PARALLEL_MIN_SIZE:
+        html = convert_markdown_parallel(md_text, workers)
+    else:
+        html = (engine or DEFAULT_ENGINE).convert(md_text)
+    return (engine or DEFAULT_ENGINE).link_sections(html)
+
+def split_sections(md_text: str) -> tuple[list[str], list[str]] | None:
+    """
+    Splits markdown at the top-level headings that can not be part of a fenced code block, raw HTML block or paragraph,
+    so that converting each section separately gives the same HTML as converting the whole document.
+
+    :param str md_text: The markdown to split
+    :return tuple[list[str], list[str]] | None: The sections and the reference link definitions of the whole document,
+        or None if the document can not be split safely, eg. because a reference definition is not at the top level
+    """
+    lines = md_text.split("\n")
+    sections: list[str] = []
+    definitions: list[str] = []
+    section_start = 0
+    fence: str | None = None
+    html_tag: str | None = None
+    html_depth = 0
+    previous_blank = True
+    for index, line in enumerate(lines):
+        if fence:
+            if line.rstrip(' ') == fence:
+                fence = None
+        elif html_tag:
+            if html_tag == '!--':
+                if '-->' in line:
+                    html_tag = None
+            else:
+                html_depth += len(re.findall(f'<{html_tag}[\\s>/]', line)) - line.count(f'</{html_tag}>')
+                if html_depth <= 0:
+                    html_tag = None
+        elif match := FENCE_OPEN_PATTERN.match(line):
+            fence = match.group('fence')
+        elif previous_blank and (match := HTML_OPEN_PATTERN.match(line)):
+            html_tag = match.group(1)
+            if html_tag == '!--':
+                if '-->' in line:
+                    html_tag = None
+            else:
+                html_depth = len(re.findall(f'<{html_tag}[\\s>/]', line)) - line.count(f'</{html_tag}>')
+                if html_depth <= 0 or line.rstrip().endswith('/>'):
+                    html_tag = None
+        elif match := REFERENCE_PATTERN.match(line):
+            # definitions whose link is on the next line can not be collected line by line
+            if not match.group('link'):
+                return None
+            if index + 1 < len(lines) and REFERENCE_TITLE_PATTERN.match(lines[index + 1]):
+                definitions.append(f"{line}\n{lines[index + 1]}")
+            else:
+                definitions.append(line)
+        elif NESTED_REFERENCE_PATTERN.match(line):
+            # a definition inside a blockquote or list item applies to the whole document, but can not be copied to the other sections
+            return None
+        elif previous_blank and index > section_start and HEADING_PATTERN.match(line):
+            sections.append("\n".join(lines[section_start:index]))
+            section_start = index
+        previous_blank = not line.strip()
+    if fence or html_tag:
+        return None
+    sections.append("\n".join(lines[section_start:]))
+    return sections, definitions
+
+def _convert_chunk(md_text: str, last: bool) -> str | None:
+    """
+    Converts a chunk of a document, keeping the whitespace that separates it from the next chunk.
+
+    :return str | None: The converted chunk, or None if the chunk end marker was not converted as expected
+    """
+    if last:
+        return render_markdown(md_text)
+    output = render_markdown(f"{md_text}\n\n{CHUNK_END_MARKER}")
+    if not output.endswith(CHUNK_END_HTML):
+        return None
+    return output[:-len(CHUNK_END_HTML)]
+
+def convert_markdown_parallel(md_text: str, workers: int) -> str:
+    """
+    Converts a large markdown document by splitting it into chunks at top-level headings and converting the chunks in a process pool.
+    The result is the same as converting the whole document at once. Documents that can not be split safely are converted serially.
+
+    :param str md_text: The markdown to convert
+    :param int workers: The number of processes to convert the chunks with
+    :return str: The converted HTML
+    """
+    split = split_sections(md_text)
+    if split is None or len(split[0]) == 1:
+        return render_markdown(md_text)
+    sections, definitions = split
+
+    # group the sections into a few chunks per worker so the work stays balanced without sending many tiny chunks
+    target_size = len(md_text) // (workers * 4) + 1
+    chunks: list[str] = []
+    chunk_sections: list[str] = []
+    chunk_size = 0
+    for section in sections:
+        chunk_sections.append(section)
+        chunk_size += len(section)
+        if chunk_size >= target_size:
+            chunks.append("\n".join(chunk_sections))
+            chunk_sections, chunk_size = [], 0
+    if chunk_sections:
+        chunks.append("\n".join(chunk_sections))
+
+    lasts = [index == len(chunks) - 1 for index in range(len(chunks))]
+    outputs = _convert_chunks(chunks, lasts, definitions, workers)
+    if None in outputs:
+        return render_markdown(md_text)
+    return "".join(outputs)
+
+def _convert_chunks(chunks: list[str], lasts: list[bool], definitions: list[str], workers: int) -> list[str | None]:
+    """
+    Converts chunks of a document, in a process pool if more than one worker is given.
+
+    :param list[str] chunks: The chunks to convert
+    :param list[bool] lasts: Whether each chunk is the end of the document
+    :param list[str] definitions: The reference link definitions of the whole document
+    :param int workers: The number of processes to convert the chunks with
+    :return list[str | None]: The output of :func:`_convert_chunk` for each chunk
+    """
+    # every chunk gets every reference definition in document order, so the last definition of a reference wins as it does in the whole document
+    references = _references(definitions)
+    texts = [chunk + references for chunk in chunks]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(_convert_chunk, texts, lasts))
+    return [_convert_chunk(text, last) for text, last in zip(texts, lasts)]
+
+def _references(definitions: list[str]) -> str:
+    return "\n\n" + "\n\n".join(definitions) if definitions else ""
+
+def convert_markdown_incremental(md_text: str, cache: ConversionCache, workers: int = 1) -> str:
+    """
+    Converts markdown one top-level section at a time, reusing the converted sections from the cache that are unchanged
+    since a previous conversion so that only the changed sections are converted again.
+    The result is the same as converting the whole document at once.
+
+    :param str md_text: The markdown to convert
+    :param ConversionCache cache: The cache of previously converted sections
+    :param int workers: The number of processes to convert the changed sections with
+    :return str: The converted HTML
+    """
+    split = split_sections(md_text)
+    if split is None:
+        return render_markdown(md_text)
+    sections, definitions = split
+
+    # a section converts differently if the reference definitions change or it stops being the end of the document
+    prefix = "\0".join([conversion_fingerprint(), _references(definitions), "section"])
+    lasts = [index == len(sections) - 1 for index in range(len(sections))]
+    keys = [content_hash(f"{prefix}\0{last}\0{section}") for section, last in zip(sections, lasts)]
+    fragments = [cache.get(key) for key in keys]
+
+    changed = [index for index, fragment in enumerate(fragments) if fragment is None]
+    outputs = _convert_chunks([sections[index] for index in changed], [lasts[index] for index in changed], definitions, workers)
+    if None in outputs:
+        return render_markdown(md_text)
+    for index, output in zip(changed, outputs):
+        fragments[index] = output
+        cache.put(keys[index], output)
+    return "".join(fragments)
+
+
+class MarkdownConverter:
+    """
+    Converts markdown with the same settings for every document of a run.
+    """
+
+    def __init__(self, cache: ConversionCache | None = None, workers: int = 1, incremental: bool = False, metrics: Metrics | None = None, profiler: "ConversionProfiler | None" = None):
+        """
+        Initialize the converter.
+
+        :param cache: The cache of previous conversions, or None to always convert.
+        :param workers: The number of processes large documents are converted with, or 1 to always convert serially.
+        :param incremental: Whether to only convert the sections of a document that changed since they were cached.
+        :param metrics: The metrics to record the time spent in each markdown processor in, or None to not time them.
+        :param profiler: The profiler to run every conversion under, or None to not profile them.
+            Profiled conversions are run serially without the cache, so the time of every processor is measured.
+        """
+        self.cache = cache
+        self.workers = workers
+        self.incremental = incremental
+        self.metrics = metrics
+        self.profiler = profiler
+        # profiles name the time of each processor after the spans of the instrumented pipeline
+        if metrics is not None or profiler is not None:
+            self.engine = ConversionEngine(metrics or Metrics())
+        else:
+            self.engine = DEFAULT_ENGINE
+
+    def convert(self, md_text: str) -> str:
+        """
+        Converts markdown to HTML.
+
+        :param md_text: The markdown to convert.
+        :return: The converted HTML.
+        """
+        if self.profiler:
+            return self.profiler.run(_convert, md_text, 1, None, False, self.engine)
+        return convert_markdown(md_text, self.cache, self.workers, self.incremental, self.engine)
+
+    def convert_many(self, md_texts: Iterable[str]) -> list[str]:
+        """
+        Converts several markdown documents with the same settings, see :meth:`convert`.
+
+        :param md_texts: The markdown documents to convert.
+        :return: The converted HTML of each document, in the same order.
+        """
+        return [self.convert(md_text) for md_text in md_texts]
@@ -5,4 +5,10 @@ class ConfluenceApiError(ValueError):
     """Raised when the Confluence API functions return invalid data."""
 
 class SubstringNotFoundError(LookupError):
-    """Raised when a required substring is not found in a text."""
\ No newline at end of file
+    """Raised when a required substring is not found in a text."""
+
+class BatchSyncError(RuntimeError):
+    """Raised when one or more of the pages in a batch sync failed to sync."""
+
+class SectionOverlapError(ValueError):
+    """Raised when two sections of a Confluence page marked for insertion overlap each other."""
\ No newline at end of file
@@ -0,0 +1,188 @@
+"""
+Uploads the local images referenced by converted markdown as attachments of the Confluence page they are synced to.
+"""
+
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from html import escape, unescape
+from urllib.parse import unquote
+from src.api import ConfluenceClient, GetAttachmentsCommand, GetAttachmentsCommandInput, UploadAttachmentCommand, UploadAttachmentCommandInput
+from src.utils import git_blob_id, next_cursor
+
+IMG_TAG_PATTERN = re.compile(r'<img\b[^>]*>')
+ATTRIBUTE_PATTERN = re.compile(r'([\w:-]+)="([^"]*)"')
+# sources with a scheme such as https: or data:, or protocol relative sources, are not local files
+EXTERNAL_SRC_PATTERN = re.compile(r'^(?:[a-zA-Z][\w+.-]*:|//)')
+# code block bodies are written as they are in the markdown, so the images in them are examples and not images of the page
+CDATA_PATTERN = re.compile(r'(<!\[CDATA\[.*?\]\]>)', re.DOTALL)
+
+# attachments uploaded by the action record the hash of their content in their comment, so unchanged images are not uploaded again
+HASH_COMMENT_PREFIX = "confluence-readme-sync sha256:"
+
+class LocalImage:
+    """
+    An image file referenced by converted markdown, to be uploaded as an attachment.
+    """
+
+    def __init__(self, path: str, name: str, content: bytes):
+        """
+        Initialize the image with its file and the name of its attachment.
+
+        :param path: The file path of the image.
+        :param name: The name of the attachment on the page.
+        :param content: The content of the file.
+        """
+        self.path = path
+        self.name = name
+        self.content = content
+        self.hash = hashlib.sha256(content).hexdigest()
+        self.blob_id = git_blob_id(content)
+
+    @property
+    def comment(self) -> str:
+        """
+        The comment of the attachment, which identifies the content it was uploaded with.
+        """
+        return HASH_COMMENT_PREFIX + self.hash
+
+
+def find_local_images(html: str, markdown_path: str) -> dict[str, str]:
+    """
+    Finds the ``<img>`` tags of converted markdown whose source is a file in the repository, outside of code blocks.
+    Sources are relative to the markdown file, or to the root of the repository if they start with a slash, as on GitHub.
+    The root of the repository is the current directory, and sources that resolve to a file outside of it, eg. with ``../``
+    or through a symbolic link, are not uploaded so the markdown can not attach any other file the action can read.
+
+    :param html: The converted markdown.
+    :param markdown_path: The file path of the markdown that was converted.
+    :return: The file path of each local image by its source, for the sources that exist in the repository.
+    """
+    root = os.path.realpath(os.getcwd())
+    paths: dict[str, str] = {}
+    tags = [tag for part in CDATA_PATTERN.split(html)[::2] for tag in IMG_TAG_PATTERN.findall(part)]
+    for tag in tags:
+        src = dict(ATTRIBUTE_PATTERN.findall(tag)).get("src")
+        if not src or src in paths or EXTERNAL_SRC_PATTERN.match(src):
+            continue
+        relative_path = unquote(unescape(src)).split("#")[0].split("?")[0]
+        if relative_path.startswith("/"):
+            path = os.path.normpath(relative_path.lstrip("/"))
+        else:
+            path = os.path.normpath(os.path.join(os.path.dirname(markdown_path), relative_path))
+        if os.path.commonpath([root, os.path.realpath(path)]) != root:
+            logging.warning(f"Image {src} referenced by {markdown_path} is outside of the repository and is not uploaded.")
+        elif os.path.isfile(path):
+            paths[src] = path
+        else:
+            logging.warning(f"Image {src} referenced by {markdown_path} does not exist and is not uploaded.")
+    return paths
+
+
+def attachment_names(paths: list[str]) -> dict[str, str]:
+    """
+    Names the attachment of each image after its file name, prefixing the names shared by different files with a hash of their path.
+
+    :param paths: The file paths of the images on a page.
+    :return: The attachment name of each path.
+    """
+    paths_by_name: dict[str, set[str]] = {}
+    for path in paths:
+        paths_by_name.setdefault(os.path.basename(path), set()).add(path)
+    names: dict[str, str] = {}
+    for name, same_name_paths in paths_by_name.items():
+        for path in same_name_paths:
+            names[path] = name if len(same_name_paths) == 1 else f"{hashlib.sha256(path.encode()).hexdigest()[:8]}-{name}"
+    return names
+
+
+def to_attachment_markup(html: str, names: dict[str, str]) -> str:
+    """
+    Replaces the ``<img>`` tags of local images with Confluence image macros that show the attachment of each image.
+    Code blocks are left untouched.
+
+    :param html: The converted markdown.
+    :param names: The attachment name of each local image source.
+    :return: The HTML with the local images replaced.
+    """
+    def replace(match: re.Match) -> str:
+        attributes = dict(ATTRIBUTE_PATTERN.findall(match.group(0)))
+        name = names.get(attributes.get("src", ""))
+        if name is None:
+            return match.group(0)
+        parameters = "".join(f' ac:{attribute}="{attributes[attribute]}"' for attribute in ("alt", "title", "width", "height") if attribute in attributes)
+        return f'<ac:image{parameters}><ri:attachment ri:filename="{escape(name)}" /></ac:image>'
+    parts = CDATA_PATTERN.split(html)
+    for index in range(0, len(parts), 2):
+        parts[index] = IMG_TAG_PATTERN.sub(replace, parts[index])
+    return ''.join(parts)
+
+
+def replace_local_images(htmls: list[str], markdown_paths: list[str]) -> tuple[list[str], list[LocalImage]]:
+    """
+    Replaces the local images of the converted markdown of every section of a page with image macros, see :func:`to_attachment_markup`.
+
+    :param htmls: The converted markdown of each section.
+    :param markdown_paths: The file path of the markdown of each section.
+    :return: The HTML of each section with its local images replaced, and the images to attach to the page.
+    """
+    sources = [find_local_images(html, markdown_path) for html, markdown_path in zip(htmls, markdown_paths)]
+    names = attachment_names([path for paths in sources for path in paths.values()])
+    images: dict[str, LocalImage] = {}
+    for path, name in names.items():
+        with open(path, 'rb') as f:
+            images[path] = LocalImage(path, name, f.read())
+    replaced = [to_attachment_markup(html, {src: names[path] for src, path in paths.items()}) if paths else html for html, paths in zip(htmls, sources)]
+    return replaced, list(images.values())
+
+
+def get_attachment_comments(client: ConfluenceClient, domain: str, page_id: str) -> dict[str, str]:
+    """
+    Lists every attachment of a page, following the cursor of each page of results.
+
+    :param client: The client to send the API commands with.
+    :param domain: The domain of the Confluence site.
+    :param page_id: The ID of the page.
+    :return: The comment of each attachment by its name.
+    """
+    comments: dict[str, str] = {}
+    cursor = None
+    while True:
+        response = client.send(GetAttachmentsCommand(GetAttachmentsCommandInput(domain, page_id, cursor)))
+        response.raise_for_status()
+        body = json.loads(response.text)
+        for attachment in body.get("results", []):
+            comments[attachment["title"]] = attachment.get("comment") or ""
+        cursor = next_cursor(body)
+        if not cursor:
+            return comments
+
+
+def upload_images(client: ConfluenceClient, domain: str, page_id: str, images: list[LocalImage], max_workers: int = 4) -> int:
+    """
+    Uploads images as attachments of a page concurrently, skipping the images whose attachment already has the same content.
+
+    :param client: The client to send the API commands with.
+    :param domain: The domain of the Confluence site.
+    :param page_id: The ID of the page.
+    :param images: The images to attach.
+    :param max_workers: The maximum number of images uploaded at the same time.
+    :return: The number of images that were uploaded.
+    """
+    comments = get_attachment_comments(client, domain, page_id)
+    changed = [image for image in images if comments.get(image.name) != image.comment]
+
+    def upload(image: LocalImage) -> None:
+        media_type = mimetypes.guess_type(image.name)[0] or "application/octet-stream"
+        client.send(UploadAttachmentCommand(UploadAttachmentCommandInput(domain, page_id, image.name, image.content, media_type, image.comment))).raise_for_status()
+
+    if changed:
+        logging.info(f"Uploading {len(changed)} of {len(images)} images.")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # list raises the first error of the uploads
+            list(executor.map(upload, changed))
+    return len(changed)
@@ -0,0 +1,87 @@
+"""
+Timings and counters of the phases of a sync, reported as JSON metrics and in the GitHub step summary.
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+class Metrics:
+    """
+    Collects how long each phase of a sync took and counters such as the number of bytes sent and received.
+    Spans with the same name are added together, eg. the conversion of every file synced by a batch.
+    The metrics are shared by every thread of a run.
+    """
+
+    def __init__(self):
+        """
+        Initialize the metrics without any spans or counters.
+        """
+        self.spans: dict[str, dict[str, float]] = {}
+        self.counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """
+        Times the code run inside the context as a span, including if it raises.
+
+        :param name: The name of the span, eg. ``sync.convert``.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float) -> None:
+        """
+        Adds a timing to a span.
+
+        :param name: The name of the span.
+        :param seconds: The number of seconds the timed code took.
+        """
+        with self._lock:
+            span = self.spans.setdefault(name, {"count": 0, "seconds": 0.0})
+            span["count"] += 1
+            span["seconds"] += seconds
+
+    def increment(self, name: str, value: int = 1) -> None:
+        """
+        Adds to a counter.
+
+        :param name: The name of the counter, eg. ``request.bytes``.
+        :param value: The amount to add.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self) -> dict:
+        """
+        :return: The spans, with their total time rounded to microseconds, and the counters, each sorted by name.
+        """
+        with self._lock:
+            return {
+                "spans": {name: {"count": span["count"], "seconds": round(span["seconds"], 6)} for name, span in sorted(self.spans.items())},
+                "counters": dict(sorted(self.counters.items()))
+            }
+
+    def to_json(self) -> str:
+        """
+        :return: The metrics as a single line of JSON, so they can be set as an action output.
+        """
+        return json.dumps(self.to_dict())
+
+    def to_markdown(self) -> str:
+        """
+        :return: The metrics as markdown tables for the GitHub step summary.
+        """
+        metrics = self.to_dict()
+        lines = ["### README sync metrics", "", "| Span | Count | Milliseconds |", "|------|-------|--------------|"]
+        lines += [f"|{name}|{span['count']}|{span['seconds'] * 1000:.1f}|" for name, span in metrics["spans"].items()]
+        if metrics["counters"]:
+            lines += ["", "| Counter | Value |", "|---------|-------|"]
+            lines += [f"|{name}|{value}|" for name, value in metrics["counters"].items()]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,171 @@
+"""
+Keeps the storage format bodies sent to Confluence small: compacts the HTML converted from markdown, and splits oversized
+markdown into parts that are synced to child pages of the page.
+"""
+
+import re
+from html import escape
+from src.converter import split_sections
+from src.metrics import Metrics
+
+# elements around which whitespace is not rendered, so it can be dropped between their tags
+BLOCK_TAGS = "|".join([
+    "p", "h[1-6]", "ul", "ol", "li", "dl", "dt", "dd", "table", "thead", "tbody", "tfoot", "tr", "th", "td", "blockquote", "div", "hr",
+    "ac:structured-macro", "ac:parameter", "ac:plain-text-body", "ac:rich-text-body", "ac:layout", "ac:layout-section", "ac:layout-cell",
+])
+# code block bodies keep their whitespace and their character references
+PROTECTED_PATTERN = re.compile(r'(<!\[CDATA\[.*?\]\]>|<pre\b.*?</pre>)', re.DOTALL)
+WHITESPACE_AFTER_BLOCK_TAG_PATTERN = re.compile(rf'(</?(?:{BLOCK_TAGS})\b[^>]*>)\s+(?=<)')
+WHITESPACE_BEFORE_BLOCK_TAG_PATTERN = re.compile(rf'(?<=>)\s+(?=</?(?:{BLOCK_TAGS})\b)')
+CHARACTER_REFERENCE_PATTERN = re.compile(r'&#(?:[xX]([0-9a-fA-F]+)|([0-9]+));')
+# characters that must stay escaped in storage format, and "]" which could end a CDATA section
+ESCAPED_CHARACTERS = '<>&"\']'
+HEADING_TEXT_PATTERN = re.compile(r'^#{1,6}(?:[ \t]+|$)(.*?)(?:[ \t]+#+)?[ \t]*$')
+
+def decode_character_references(html: str) -> str:
+    """
+    Replaces numeric character references, such as the ``&#109;`` of obfuscated email links, with the characters they stand for.
+    References to characters that must stay escaped and to non-printable characters are kept.
+
+    :param html: The storage format HTML to decode.
+    :return: The decoded HTML.
+    """
+    def replace(match: re.Match) -> str:
+        codepoint = int(match.group(1), 16) if match.group(1) else int(match.group(2))
+        if codepoint > 0x10FFFF:
+            return match.group(0)
+        character = chr(codepoint)
+        if character in ESCAPED_CHARACTERS or not character.isprintable():
+            return match.group(0)
+        return character
+    return CHARACTER_REFERENCE_PATTERN.sub(replace, html)
+
+
+def compact_storage(html: str) -> str:
+    """
+    Removes the whitespace that is not rendered from storage format HTML, between tags where one of them is a block element,
+    and decodes numeric character references, see :func:`decode_character_references`. Code block bodies are left untouched.
+
+    :param html: The storage format HTML converted from markdown.
+    :return: The compacted HTML, which renders the same.
+    """
+    parts = PROTECTED_PATTERN.split(html.strip())
+    # odd indexes are the code blocks matched by the split pattern, and <pre> blocks are not surrounded by rendered whitespace either
+    for index in range(1, len(parts), 2):
+        if parts[index].startswith("<pre"):
+            parts[index - 1] = parts[index - 1].rstrip()
+            parts[index + 1] = parts[index + 1].lstrip()
+    for index in range(0, len(parts), 2):
+        part = WHITESPACE_AFTER_BLOCK_TAG_PATTERN.sub(r'\1', parts[index])
+        part = WHITESPACE_BEFORE_BLOCK_TAG_PATTERN.sub('', part)
+        parts[index] = decode_character_references(part)
+    return ''.join(parts)
+
+
+def payload_size(html: str) -> int:
+    """
+    :return: The number of bytes of storage format HTML once encoded in a request.
+    """
+    return len(html.encode())
+
+
+def compact_sections(htmls: list[str], metrics: Metrics) -> list[str]:
+    """
+    Compacts the converted markdown of several sections, see :func:`compact_storage`, counting their size before and after
+    in the ``storage.bytes`` and ``storage.compacted_bytes`` counters.
+
+    :param htmls: The converted markdown of each section.
+    :param metrics: The metrics to count the sizes in.
+    :return: The compacted HTML of each section.
+    """
+    compacted = [compact_storage(html) for html in htmls]
+    metrics.increment("storage.bytes", sum(payload_size(html) for html in htmls))
+    metrics.increment("storage.compacted_bytes", sum(payload_size(html) for html in compacted))
+    return compacted
+
+
+class SplitPart:
+    """
+    A group of sections of oversized markdown that is synced to its own child page.
+    """
+
+    def __init__(self, heading: str, title: str, html: str):
+        """
+        Initialize the part.
+
+        :param heading: The text of the heading the part starts at.
+        :param title: The title of the child page, which must be unique in the space.
+        :param html: The converted markdown of the sections of the part.
+        """
+        self.heading = heading
+        self.title = title
+        self.html = html
+
+
+def split_markdown(md_text: str) -> tuple[str, list[str]] | None:
+    """
+    Splits markdown at its headings, see :func:`src.converter.split_sections`. Every section gets the reference link
+    definitions of the whole document, so it can be converted on its own.
+
+    :param md_text: The markdown to split.
+    :return: The markdown before the first heading and the sections that start at a heading, or None if the markdown
+        can not be split safely or has no heading.
+    """
+    split = split_sections(md_text)
+    if split is None:
+        return None
+    sections, definitions = split
+    preamble = ""
+    if not HEADING_TEXT_PATTERN.match(sections[0].split("\n", 1)[0]):
+        preamble = sections.pop(0)
+    if not sections:
+        return None
+    references = "\n\n" + "\n\n".join(definitions) if definitions else ""
+    return preamble + references if preamble.strip() else "", [section + references for section in sections]
+
+
+def group_parts(sections: list[str], htmls: list[str], max_size: int, page_title: str) -> list[SplitPart]:
+    """
+    Groups consecutive sections into parts of at most ``max_size`` bytes of HTML. A section that is larger on its own is a part by itself.
+
+    :param sections: The sections returned by :func:`split_markdown`.
+    :param htmls: The converted markdown of each section.
+    :param max_size: The maximum size of a part in bytes.
+    :param page_title: The title of the page the markdown is synced to, which prefixes the title of every part.
+    :return: The parts, in the order of the markdown.
+    """
+    groups: list[tuple[str, list[str]]] = []
+    group_size = 0
+    for section, html in zip(sections, htmls):
+        size = payload_size(html)
+        if groups and group_size + size <= max_size:
+            groups[-1][1].append(html)
+            group_size += size
+        else:
+            groups.append((HEADING_TEXT_PATTERN.match(section.split("\n", 1)[0]).group(1), [html]))
+            group_size = size
+
+    parts: list[SplitPart] = []
+    titles: set[str] = set()
+    for heading, group_htmls in groups:
+        heading = heading or f"Part {len(parts) + 1}"
+        title = f"{page_title} - {heading}"
+        # headings that repeat get numbered titles, as every page title must be unique in the space
+        suffix = 2
+        while title in titles:
+            title = f"{page_title} - {heading} ({suffix})"
+            suffix += 1
+        titles.add(title)
+        parts.append(SplitPart(heading, title, "".join(group_htmls)))
+    return parts
+
+
+def split_index(parts: list[SplitPart]) -> str:
+    """
+    :return: The storage format list of links to the child page of every part, in the order of the markdown.
+    """
+    items = "".join(
+        f'<li><ac:link><ri:page ri:content-title="{escape(part.title)}" /><ac:link-body>{escape(part.heading)}</ac:link-body></ac:link></li>'
+        for part in parts
+    )
+    return f"<ul>{items}</ul>"
@@ -0,0 +1,70 @@
+"""
+An opt-in profiling mode that shows which markdown processor a slow conversion spends its time in.
+"""
+
+import cProfile
+import os
+import pstats
+import threading
+from typing import Callable
+
+# the prefix of the wrappers that :func:`src.converter.instrument_processors` names after each processor
+PROCESSOR_PREFIX = "convert."
+
+class ConversionProfiler:
+    """
+    Runs conversions under :mod:`cProfile` and attributes their time to each registered markdown processor by name.
+    A profiler can only follow one thread at a time, so conversions profiled from several threads are run one after the other.
+    """
+
+    def __init__(self):
+        """
+        Initialize the profiler without any profiled conversions.
+        """
+        self.profile = cProfile.Profile()
+        self.conversions = 0
+        self._lock = threading.Lock()
+
+    def run(self, function: Callable[..., str], *args) -> str:
+        """
+        Runs a conversion under the profiler.
+
+        :param function: The function that converts the markdown.
+        :param args: The arguments of the function.
+        :return: The converted HTML returned by the function.
+        """
+        with self._lock:
+            self.conversions += 1
+            return self.profile.runcall(function, *args)
+
+    def processor_times(self) -> dict[str, tuple[int, float]]:
+        """
+        :return: The number of calls and the cumulative seconds of every instrumented processor, slowest first.
+        """
+        if not self.conversions:
+            return {}
+        times: dict[str, tuple[int, float]] = {}
+        for (_, _, name), (_, calls, _, cumulative, _) in pstats.Stats(self.profile).stats.items():
+            if name.startswith(PROCESSOR_PREFIX):
+                previous_calls, previous_cumulative = times.get(name, (0, 0.0))
+                times[name] = (previous_calls + calls, previous_cumulative + cumulative)
+        return dict(sorted(times.items(), key=lambda item: item[1][1], reverse=True))
+
+    def save(self, path: str) -> None:
+        """
+        Writes the profile in the :mod:`pstats` format, which can be read with ``python -m pstats`` or turned into a flame graph
+        with tools such as snakeviz or flameprof.
+
+        :param path: The file path to write the profile to.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._lock:
+            self.profile.dump_stats(path)
+
+    def to_markdown(self) -> str:
+        """
+        :return: The time spent in each processor as a markdown table for the GitHub step summary.
+        """
+        lines = [f"### Markdown conversion profile ({self.conversions} conversions)", "", "| Processor | Calls | Milliseconds |", "|-----------|-------|--------------|"]
+        lines += [f"|{name[len(PROCESSOR_PREFIX):]}|{calls}|{seconds * 1000:.1f}|" for name, (calls, seconds) in self.processor_times().items()]
+        return "\n".join(lines) + "\n"
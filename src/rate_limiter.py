@@ -0,0 +1,59 @@
+"""
+An adaptive limit on the number of requests sent to the Confluence API at the same time.
+"""
+
+import threading
+import time
+
+class AdaptiveRateLimiter:
+    """
+    Limits the number of requests in flight with additive increase, multiplicative decrease (AIMD):
+    every throttled request halves the limit and pauses all requests until the server allows them again,
+    and every successful request raises the limit a little, so the limit ramps back up once throttling stops.
+    The limiter is shared by every thread sending requests through the same client.
+    """
+
+    def __init__(self, max_concurrency: int = 10, min_concurrency: int = 1):
+        """
+        Initialize the limiter at its maximum concurrency.
+
+        :param max_concurrency: The maximum number of requests in flight.
+        :param min_concurrency: The number of requests in flight the limit never goes below.
+        """
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """
+        Waits until a request may be sent and counts it as in flight.
+        """
+        with self._condition:
+            while True:
+                delay = self.paused_until - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                elif self.in_flight >= int(self.limit):
+                    self._condition.wait()
+                else:
+                    self.in_flight += 1
+                    return
+
+    def release(self, throttled: bool = False, delay: float = 0.0) -> None:
+        """
+        Marks a request as no longer in flight and adapts the limit to its outcome.
+
+        :param throttled: Whether the server rejected the request because too many requests were sent.
+        :param delay: The number of seconds to pause every request for after a throttled request.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+                self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            self._condition.notify_all()
@@ -0,0 +1,73 @@
+"""
+Resolves the section links of converted markdown to the anchors Confluence gives its headings. Markdown links to a section
+with the slug GitHub generates for its heading, eg. ``#action-parameters``, while Confluence names the anchor of the heading
+after its text, eg. ``#Action-Parameters``.
+
+The links are resolved with an index of every heading of the document, built in one pass over its HTML, and rewritten in a
+second pass, so the time spent stays linear in the size of the document however many headings and links it has.
+"""
+
+import re
+from html import escape, unescape
+
+# code block bodies are written as they are in the markdown, so the headings and links in them are not resolved
+CDATA_PATTERN = re.compile(r'(<!\[CDATA\[.*?\]\]>)', re.DOTALL)
+HEADING_PATTERN = re.compile(r'<h([1-6])\b[^>]*>(.*?)</h\1>', re.DOTALL)
+SECTION_LINK_PATTERN = re.compile(r'(<a\b[^>]*?\shref=")#+([^"]*)(")')
+TAG_PATTERN = re.compile(r'<[^>]*>')
+# the characters GitHub removes from the text of a heading when generating its slug
+SLUG_REMOVED_PATTERN = re.compile(r'[^\w\- ]')
+
+def markdown_slug(text: str) -> str:
+    """
+    :return: The slug GitHub generates for a heading: its text in lowercase, without punctuation and with hyphens for spaces.
+    """
+    return SLUG_REMOVED_PATTERN.sub('', text.strip().lower()).replace(' ', '-')
+
+
+def confluence_anchor(text: str) -> str:
+    """
+    :return: The name of the anchor Confluence generates for a heading: its text with hyphens for whitespace, in its case.
+    """
+    return '-'.join(text.split())
+
+
+def section_anchors(html: str) -> dict[str, str]:
+    """
+    Indexes the headings of converted markdown.
+
+    :param html: The converted markdown.
+    :return: The Confluence anchor of every heading by its markdown slug. A heading whose slug repeats the slug of an
+        earlier heading is linked as ``slug-1``, ``slug-2``... in markdown, and is not indexed as Confluence does not
+        generate anchors the same way for repeated headings.
+    """
+    anchors: dict[str, str] = {}
+    for part in CDATA_PATTERN.split(html)[::2]:
+        for match in HEADING_PATTERN.finditer(part):
+            text = unescape(TAG_PATTERN.sub('', match.group(2)))
+            anchors.setdefault(markdown_slug(text), confluence_anchor(text))
+    return anchors
+
+
+def link_sections(html: str, anchors: dict[str, str] | None = None) -> str:
+    """
+    Rewrites the links to sections of converted markdown, eg. ``[Parameters](##action-parameters)``, to link to the
+    Confluence anchor of their heading with a single hashtag. Links to sections that are not in the index are only
+    left with a single hashtag.
+
+    :param html: The converted markdown.
+    :param anchors: The index of the headings to link to, or None to index the headings of the HTML, see :func:`section_anchors`.
+    :return: The HTML with the section links rewritten.
+    """
+    if anchors is None:
+        anchors = section_anchors(html)
+
+    def replace(match: re.Match) -> str:
+        slug = unescape(match.group(2))
+        anchor = anchors.get(slug) or anchors.get(slug.lower(), slug)
+        return f'{match.group(1)}#{escape(anchor)}{match.group(3)}'
+
+    parts = CDATA_PATTERN.split(html)
+    for index in range(0, len(parts), 2):
+        parts[index] = SECTION_LINK_PATTERN.sub(replace, parts[index])
+    return ''.join(parts)
@@ -0,0 +1,101 @@
+"""
+Replaces the sections of a Confluence page body that are marked by pairs of start and end substrings.
+"""
+
+import re
+from typing import Iterator
+from src.errors import SubstringNotFoundError, SectionOverlapError
+
+# a part of a string, by the string and the start and end index of the part, which is not copied until it is read
+Span = tuple[str, int, int]
+
+def find_markers(page_body: str, markers: list[str]) -> dict[str, int]:
+    """
+    Finds the first occurrence of every marker with a single scan of the page body.
+
+    :param page_body: The body of the Confluence page.
+    :param markers: The substrings to find.
+    :return: The index of the first occurrence of each marker that was found.
+    """
+    unique_markers = sorted(set(markers), key=len, reverse=True)
+    if not unique_markers:
+        return {}
+    # a zero width match at every index, so an occurrence that overlaps the match of another marker is not skipped.
+    # Only the longest marker at an index is matched, the shorter markers at the index are prefixes of it
+    pattern = re.compile('(?=(' + '|'.join(re.escape(marker) for marker in unique_markers) + '))')
+    prefixes = {marker: [other for other in unique_markers if marker.startswith(other)] for marker in unique_markers}
+    found: dict[str, int] = {}
+    for match in pattern.finditer(page_body):
+        for marker in prefixes[match.group(1)]:
+            found.setdefault(marker, match.start())
+        if len(found) == len(unique_markers):
+            break
+    return found
+
+
+def find_sections(page_body: str, marker_pairs: list[tuple[str, str]]) -> list[tuple[int, int]]:
+    """
+    Finds the text between each pair of start and end substrings of a page body.
+
+    :param page_body: The body of the Confluence page.
+    :param marker_pairs: The start and end substring of each section.
+    :return: The start and end index of the text between each pair of substrings, in the same order as the pairs.
+    """
+    found = find_markers(page_body, [marker for pair in marker_pairs for marker in pair])
+    sections: list[tuple[int, int]] = []
+    for start_substring, end_substring in marker_pairs:
+        start_index = found.get(start_substring, -1)
+        end_index = found.get(end_substring, -1)
+        if start_index == -1 or end_index == -1 or start_index > end_index: raise SubstringNotFoundError("Insert after string was not found in the body of the Confluence page")
+        sections.append((start_index + len(start_substring), end_index))
+
+    # a section may only start after the previous section's end substring, or share it as its own start substring
+    ordered = sorted(zip(sections, marker_pairs))
+    for ((_, previous_end), (_, previous_end_substring)), ((next_start, _), (next_start_substring, _)) in zip(ordered, ordered[1:]):
+        next_marker_start = next_start - len(next_start_substring)
+        shares_marker = previous_end == next_marker_start and previous_end_substring == next_start_substring
+        if previous_end + len(previous_end_substring) > next_marker_start and not shares_marker:
+            raise SectionOverlapError(f"Section starting with {next_start_substring} overlaps the section ending with {previous_end_substring}")
+    return sections
+
+
+def splice_spans(page_body: str, sections: list[tuple[int, int]], contents: list[str]) -> list[Span]:
+    """
+    Replaces the text of each section with its new content without copying the page body: the new body is made of the
+    spans of the page body around the sections and of the new contents, in order.
+
+    :param page_body: The body of the Confluence page.
+    :param sections: The start and end index of each section, as returned by :func:`find_sections`.
+    :param contents: The new content of each section, in the same order as the sections.
+    :return: The spans of the new page body.
+    """
+    spans: list[Span] = []
+    cursor = 0
+    for (start, end), content in sorted(zip(sections, contents)):
+        spans.append((page_body, cursor, start))
+        spans.append((content, 0, len(content)))
+        cursor = end
+    spans.append((page_body, cursor, len(page_body)))
+    return spans
+
+
+def splice_sections(page_body: str, sections: list[tuple[int, int]], contents: list[str]) -> str:
+    """
+    Replaces the text of each section with its new content in a single join, see :func:`splice_spans`.
+
+    :return: The new page body.
+    """
+    return ''.join(text[start:end] for text, start, end in splice_spans(page_body, sections, contents))
+
+
+def span_chunks(spans: list[Span], chunk_size: int) -> Iterator[str]:
+    """
+    Reads spans in order, at most ``chunk_size`` characters at a time, so only one chunk is copied at any time.
+
+    :param spans: The spans to read.
+    :param chunk_size: The maximum number of characters of a chunk.
+    :return: The chunks of the text of the spans.
+    """
+    for text, start, end in spans:
+        for index in range(start, end, chunk_size):
+            yield text[index:min(index + chunk_size, end)]
@@ -0,0 +1,106 @@
+"""
+A persistent record of previous syncs, used to skip work that a previous run already did.
+"""
+
+import json
+import os
+import threading
+
+STATE_FORMAT_VERSION = 3
+
+class SyncRecord:
+    """
+    What was written to a page section by the last successful sync.
+    """
+
+    def __init__(self, page_id: str, version: int, source_hash: str, rendered_hash: str, blob_ids: dict[str, str] | None = None, split_size: int | None = None):
+        """
+        Initialize the record.
+
+        :param page_id: The ID of the synced page.
+        :param version: The version number of the page after the sync.
+        :param source_hash: The hash of the markdown file that was synced.
+        :param rendered_hash: The hash of the normalized HTML that was written to the section.
+        :param blob_ids: The git object ID of the markdown file and of every local image it referenced, by their file path.
+        :param split_size: The size above which the markdown was split into child pages, or None if it was not split.
+        """
+        self.page_id = page_id
+        self.version = version
+        self.source_hash = source_hash
+        self.rendered_hash = rendered_hash
+        self.blob_ids = blob_ids or {}
+        self.split_size = split_size
+
+    def to_dict(self) -> dict:
+        return {"page_id": self.page_id, "version": self.version, "source_hash": self.source_hash, "rendered_hash": self.rendered_hash, "blob_ids": self.blob_ids, "split_size": self.split_size}
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "SyncRecord":
+        return cls(values["page_id"], values["version"], values["source_hash"], values["rendered_hash"], values["blob_ids"], values["split_size"])
+
+
+class SyncState:
+    """
+    A thread safe store of :class:`SyncRecord` objects, saved as a JSON file so it can be restored between runs, eg. with actions/cache.
+    """
+
+    def __init__(self, path: str | None = None, records: dict[str, SyncRecord] | None = None):
+        """
+        Initialize the state.
+
+        :param path: The file path the state is saved to, or None to keep it in memory only.
+        :param records: The records keyed by :attr:`SyncMapping.key`.
+        """
+        self.path = path
+        self.records: dict[str, SyncRecord] = records or {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "SyncState":
+        """
+        Loads the state from a file, starting with an empty state if the file does not exist or was written by another format version.
+
+        :param path: The file path of the state.
+        :return: The loaded state.
+        """
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path, 'r') as f:
+            contents = json.load(f)
+        if contents.get("format") != STATE_FORMAT_VERSION:
+            return cls(path)
+        return cls(path, {key: SyncRecord.from_dict(values) for key, values in contents["records"].items()})
+
+    def get(self, key: str) -> SyncRecord | None:
+        """
+        Gets the record of the last sync of a mapping.
+
+        :param key: The key of the mapping.
+        :return: The record, or None if the mapping was never synced.
+        """
+        with self._lock:
+            return self.records.get(key)
+
+    def set(self, key: str, record: SyncRecord) -> None:
+        """
+        Records a successful sync of a mapping.
+
+        :param key: The key of the mapping.
+        :param record: The record of the sync.
+        """
+        with self._lock:
+            self.records[key] = record
+
+    def save(self) -> None:
+        """
+        Saves the state to its file, replacing the previous file atomically.
+        """
+        if not self.path:
+            return
+        with self._lock:
+            contents = {"format": STATE_FORMAT_VERSION, "records": {key: record.to_dict() for key, record in self.records.items()}}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, 'w') as f:
+            json.dump(contents, f, indent=2, sort_keys=True)
+        os.replace(temporary_path, self.path)
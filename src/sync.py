@@ -0,0 +1,483 @@
+"""
+The sync pipeline that copies the contents of a markdown file into a section of a Confluence page.
+"""
+
+import json
+import logging
+import re
+from html import escape
+from typing import Any, Callable, Generator
+from src.api import BODY_CHUNK_SIZE, ApiCommand, ConfluenceClient, Page, CreatePageCommand, CreatePageCommandInput, GetChildPagesCommand, GetChildPagesCommandInput, GetPageCommand, GetPageCommandInput, GetPageVersionCommand, EditPageCommand, EditPageCommandInput
+from src.converter import MarkdownConverter
+from src.errors import ConfluenceApiError, InvalidParameterError
+from src.images import LocalImage, replace_local_images, upload_images
+from src.metrics import Metrics
+from src.payload import compact_sections, compact_storage, group_parts, payload_size, split_index, split_markdown
+from src.splice import Span, find_sections, span_chunks, splice_spans
+from src.state import SyncRecord, SyncState
+from src.utils import extract_domain_and_page_id, content_hash, file_blob_id, next_cursor
+
+CREATED = "created"
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+FAILED = "failed"
+
+CDATA_PATTERN = re.compile(r'(<!\[CDATA\[.*?\]\]>)', re.DOTALL)
+WHITESPACE_BETWEEN_TAGS_PATTERN = re.compile(r'>\s+<')
+VOID_TAG_PATTERN = re.compile(r'<(br|hr|img|col)\b([^>]*?)\s*/?>')
+# added to attachment references by Confluence when a page is saved in the editor
+VERSION_AT_SAVE_PATTERN = re.compile(r'\s+ri:version-at-save="\d+"')
+# added to macros by Confluence when a page is saved
+MACRO_TAG_PATTERN = re.compile(r'<ac:structured-macro\b[^>]*>')
+MACRO_SAVE_ATTRIBUTE_PATTERN = re.compile(r'\s+ac:(?:schema-version|macro-id)="[^"]*"')
+
+class SyncMapping:
+    """
+    A single markdown file to Confluence page section mapping.
+    """
+
+    def __init__(self, filepath: str, url: str, insert_start_text: str, insert_end_text: str, split_size: int | None = None):
+        """
+        Initialize the mapping with the file to read and the page section to write it to.
+
+        :param filepath: The file path of the markdown file to sync.
+        :param url: The full URL of the Confluence page to sync with, including the https://
+        :param insert_start_text: The HTML marking the start of the section to insert the markdown into.
+        :param insert_end_text: The HTML marking the end of the section to insert the markdown into.
+        :param split_size: The size in bytes above which the converted markdown is split into child pages at its headings,
+            with an index of the child pages in the section, or None to always sync it to the section.
+        """
+        self.filepath = filepath
+        self.url = url
+        self.insert_start_text = insert_start_text
+        self.insert_end_text = insert_end_text
+        self.split_size = split_size
+
+    @property
+    def key(self) -> str:
+        """
+        Identifies the page section of the mapping in a :class:`SyncState`.
+        """
+        domain, page_id = extract_domain_and_page_id(self.url)
+        return f"{domain}/{page_id}/{content_hash(self.insert_start_text + self.insert_end_text)[:16]}"
+
+
+class SyncResult:
+    """
+    The outcome of syncing a single :class:`SyncMapping`.
+    """
+
+    def __init__(self, mapping: SyncMapping, status: str = UPDATED, error: Exception | None = None):
+        """
+        Initialize the result for a mapping.
+
+        :param mapping: The mapping that was synced.
+        :param status: Whether the page was ``created``, ``updated``, ``unchanged`` or ``failed`` to sync.
+        :param error: The error that made the sync fail, or None if it succeeded.
+        """
+        self.mapping = mapping
+        self.status = FAILED if error else status
+        self.error = error
+
+    @property
+    def success(self) -> bool:
+        """
+        Whether the mapping was synced without an error.
+        """
+        return self.error is None
+
+
+class ConvertStep:
+    """
+    A step of :func:`sync_steps` that converts the markdown of a section, answered with the converted HTML.
+    """
+
+    def __init__(self, md_text: str):
+        """
+        :param md_text: The markdown to convert.
+        """
+        self.md_text = md_text
+
+
+class UploadImagesStep:
+    """
+    A step of :func:`sync_steps` that attaches local images to the page, answered with the number of images uploaded.
+    """
+
+    def __init__(self, domain: str, page_id: str, images: list[LocalImage]):
+        """
+        :param domain: The domain of the Confluence site.
+        :param page_id: The ID of the page.
+        :param images: The images to attach, see :func:`src.images.upload_images`.
+        """
+        self.domain = domain
+        self.page_id = page_id
+        self.images = images
+
+
+class EditStep:
+    """
+    A step of :func:`sync_steps` that edits the page, retrying on version conflicts, answered with the response to the last attempt.
+    """
+
+    def __init__(self, command: EditPageCommand, rebase: Callable[[str], str | list[Span]]):
+        """
+        :param command: The edit page command.
+        :param rebase: The function that applies the edit to the latest body of the page, see :meth:`ConfluenceClient.send_edit`.
+        """
+        self.command = command
+        self.rebase = rebase
+
+
+def normalize_storage(html: str) -> str:
+    """
+    Normalizes the formatting differences between the HTML generated from markdown and the same HTML once stored by Confluence,
+    such as whitespace between tags, ``<br>`` versus ``<br />`` and the attributes Confluence adds to attachments and macros.
+    Code block bodies are left untouched.
+
+    :param html: The storage format HTML to normalize.
+    :return: The normalized HTML.
+    """
+    parts = CDATA_PATTERN.split(html.strip())
+    # odd indexes are the CDATA sections matched by the split pattern
+    for index in range(0, len(parts), 2):
+        part = WHITESPACE_BETWEEN_TAGS_PATTERN.sub('><', parts[index])
+        part = VERSION_AT_SAVE_PATTERN.sub('', part)
+        part = MACRO_TAG_PATTERN.sub(lambda match: MACRO_SAVE_ATTRIBUTE_PATTERN.sub('', match.group(0)), part)
+        parts[index] = VOID_TAG_PATTERN.sub(r'<\1\2 />', part)
+    return ''.join(parts)
+
+
+def section_hash(html: str) -> str:
+    """
+    Hashes the content of a page section so that it can be compared with converted markdown, ignoring formatting differences.
+
+    :param html: The storage format HTML of the section.
+    :return: The hash of the normalized HTML.
+    """
+    return content_hash(normalize_storage(html))
+
+
+def files_unchanged(record: SyncRecord | None, mapping: SyncMapping) -> bool:
+    """
+    Whether the markdown file and the local images of a synced section still have the git object IDs they were synced with.
+
+    :param record: The record of the last sync of the section.
+    :param mapping: The mapping of the section.
+    :return: False if the section was never synced, was synced from another markdown file or with another split size,
+        or any of its files changed or was deleted.
+    """
+    return (
+        record is not None
+        and mapping.filepath in record.blob_ids
+        and record.split_size == mapping.split_size
+        and all(file_blob_id(path) == blob_id for path, blob_id in record.blob_ids.items())
+    )
+
+
+def unchanged_since_sync(mappings: list[SyncMapping], state: SyncState | None) -> bool:
+    """
+    Whether none of the files of the mappings changed since their last recorded sync, see :func:`files_unchanged`.
+    Only the files are compared, so no request is sent.
+
+    :param mappings: The mappings of a page.
+    :param state: The record of previous syncs.
+    :return: False if there is no state, a mapping has an invalid url or any file changed.
+    """
+    if state is None:
+        return False
+    try:
+        records = [state.get(mapping.key) for mapping in mappings]
+    except ValueError:
+        return False
+    return all(files_unchanged(record, mapping) for record, mapping in zip(records, mappings))
+
+
+def sync_page(client: ConfluenceClient, mapping: SyncMapping, state: SyncState | None = None, converter: MarkdownConverter | None = None, skip_unchanged_files: bool = False) -> str:
+    """
+    Syncs a markdown file to a section of a Confluence page, see :func:`sync_sections`.
+
+    :param client: The client to send the API commands with.
+    :param mapping: The file and page section to sync.
+    :param state: The record of previous syncs, which is updated after a successful sync.
+    :param converter: The converter to convert the markdown with, or None to convert it without a cache.
+    :param skip_unchanged_files: Whether to skip the page without any request if none of its files changed since the last recorded sync.
+    :return: ``updated`` if the page was edited or ``unchanged`` if it was already up to date.
+    """
+    return sync_sections(client, [mapping], state, converter, skip_unchanged_files=skip_unchanged_files)
+
+
+def sync_sections(client: ConfluenceClient, mappings: list[SyncMapping], state: SyncState | None = None, converter: MarkdownConverter | None = None, page: Page | None = None, skip_unchanged_files: bool = False) -> str:
+    """
+    Syncs markdown files to sections of the same Confluence page with a single GET and at most one edit.
+    The page is not edited if every section already contains its converted markdown.
+
+    When a state is given and neither the markdown files, the local images they reference nor the page changed since the
+    last recorded sync, only the page version is fetched and the page body is not downloaded. With ``skip_unchanged_files``,
+    the page is not requested at all if none of the files changed, so edits made to the sections in Confluence are kept.
+
+    The converted markdown is compacted before it is compared and spliced, see :func:`src.payload.compact_storage`, and the
+    markdown of a mapping with a ``split_size`` is synced to child pages if it is larger, see :func:`split_steps`.
+
+    :param client: The client to send the API commands with.
+    :param mappings: The files and page sections to sync, which must all be on the same page.
+    :param state: The record of previous syncs, which is updated after a successful sync.
+    :param converter: The converter to convert the markdown with, or None to convert it without a cache.
+    :param page: The page fetched in bulk before the sync, see :meth:`ConfluenceClient.get_pages`, or None to fetch it.
+        The page is fetched again if it was fetched without its body and the body is needed.
+    :param skip_unchanged_files: Whether to skip the page without any request if none of its files changed since the last recorded sync.
+    :return: ``updated`` if the page was edited or ``unchanged`` if it was already up to date.
+    """
+    converter = converter or MarkdownConverter()
+    steps = sync_steps(client.metrics, mappings, state, page, skip_unchanged_files)
+    result = None
+    while True:
+        try:
+            step = steps.send(result)
+        except StopIteration as done:
+            return done.value
+        # the previous response, eg. a whole page, is not kept while the next step runs
+        result = None
+        if isinstance(step, ConvertStep):
+            result = converter.convert(step.md_text)
+        elif isinstance(step, UploadImagesStep):
+            result = upload_images(client, step.domain, step.page_id, step.images, client.pool_size)
+        elif isinstance(step, EditStep):
+            result = client.send_edit(step.command, step.rebase)
+        else:
+            result = client.send(step)
+
+
+def sync_steps(metrics: Metrics, mappings: list[SyncMapping], state: SyncState | None = None, page: Page | None = None, skip_unchanged_files: bool = False) -> Generator[ApiCommand | ConvertStep | UploadImagesStep | EditStep, Any, str]:
+    """
+    The steps of a sync of sections of a page, see :func:`sync_sections`, without sending any request or converting any markdown itself.
+    Every request and conversion is yielded to the function running the sync, which sends the result back: the response to
+    an :class:`ApiCommand` or an :class:`EditStep`, the converted HTML of a :class:`ConvertStep` and the number of images
+    uploaded by an :class:`UploadImagesStep`.
+
+    :param metrics: The metrics to time the phases of the sync in.
+    :param mappings: The files and page sections to sync, which must all be on the same page.
+    :param state: The record of previous syncs, which is updated after a successful sync.
+    :param page: The page fetched in bulk before the sync, or None to fetch it.
+    :param skip_unchanged_files: Whether to skip the page without any request if none of its files changed since the last recorded sync.
+    :return: ``updated`` if the page was edited or ``unchanged`` if it was already up to date.
+    """
+    domain, page_id = extract_domain_and_page_id(mappings[0].url)
+    if any(extract_domain_and_page_id(mapping.url) != (domain, page_id) for mapping in mappings):
+        raise InvalidParameterError("Error: Sections synced together must be on the same Confluence page")
+
+    if skip_unchanged_files and unchanged_since_sync(mappings, state):
+        logging.info("Markdown files are unchanged since the last sync, skipping the confluence page.")
+        metrics.increment("pages.skipped")
+        return UNCHANGED
+
+    # read markdown files
+    logging.info("Reading markdown file.")
+    md_texts: list[str] = []
+    with metrics.span("sync.read_files"):
+        for mapping in mappings:
+            with open(mapping.filepath, 'r') as f:
+                md_texts.append(f.read())
+    source_hashes = [content_hash(md_text) for md_text in md_texts]
+    records = [state.get(mapping.key) if state else None for mapping in mappings]
+    # a changed image counts as a changed source, so it is uploaded even though the markdown is the same
+    sources_unchanged = [record is not None and record.source_hash == source_hash and files_unchanged(record, mapping) for record, source_hash, mapping in zip(records, source_hashes, mappings)]
+
+    # nothing can have changed if neither the markdown nor the page have a new version since the last sync
+    if all(sources_unchanged):
+        if page:
+            page_version_number = page.version
+        else:
+            logging.info("Checking confluence page version.")
+            with metrics.span("sync.get_page_version"):
+                response = yield GetPageVersionCommand(GetPageCommandInput(domain, page_id))
+                response.raise_for_status()
+                page_version_number = json.loads(response.text)["version"]["number"]
+        if all(record.version == page_version_number for record in records):
+            logging.info("Confluence page is already up to date.")
+            return UNCHANGED
+
+    if page is None or page.body is None:
+        # create get page command
+        input = GetPageCommandInput(domain, page_id)
+        command = GetPageCommand(input)
+
+        logging.info("Getting confluence page content.")
+        with metrics.span("sync.get_page"):
+            # the response is not kept, so only the parsed body stays in memory while the page is spliced and sent
+            page = Page.from_json(json.loads((yield command).text))
+
+    # process get page results
+    page_status: str = page.status
+    page_title: str = page.title
+    page_body: str = page.body
+    page_version_number: int = page.version
+    if not (page_status and page_title and page_body and page_version_number): raise ConfluenceApiError("Values were not correctly received from Confluence page")
+    marker_pairs = [(mapping.insert_start_text, mapping.insert_end_text) for mapping in mappings]
+    sections = find_sections(page_body, marker_pairs)
+    contents = [page_body[start:end] for start, end in sections]
+    rendered_hashes = [section_hash(content) for content in contents]
+
+    # a section that still holds what was last synced from unchanged markdown does not need to be converted,
+    # even if the page was edited elsewhere
+    converted_indexes = [index for index in range(len(mappings)) if not (sources_unchanged[index] and rendered_hashes[index] == records[index].rendered_hash)]
+    converted_htmls: list[str] = []
+    if converted_indexes:
+        logging.info("Converting markdown file.")
+    for index in converted_indexes:
+        with metrics.span("sync.convert"):
+            converted_htmls.append((yield ConvertStep(md_texts[index])))
+    with metrics.span("sync.compact"):
+        converted_htmls = compact_sections(converted_htmls, metrics)
+
+    # oversized markdown is synced to child pages, and its section lists them instead
+    split_images: dict[int, list[LocalImage]] = {}
+    children_changed = False
+    for position, index in enumerate(converted_indexes):
+        split_size = mappings[index].split_size
+        if split_size and payload_size(converted_htmls[position]) > split_size:
+            with metrics.span("sync.split"):
+                split = yield from split_steps(metrics, domain, page, mappings[index], md_texts[index])
+            if split:
+                converted_htmls[position], split_images[index], changed = split
+                children_changed = children_changed or changed
+
+    # local images are attached to the page before it is edited, so the page never shows a missing attachment
+    converted_htmls, images = replace_local_images(converted_htmls, [mappings[index].filepath for index in converted_indexes])
+    if images:
+        with metrics.span("sync.upload_images"):
+            uploaded = yield UploadImagesStep(domain, page_id, images)
+        metrics.increment("images.uploaded", uploaded)
+
+    # the files of a section that was not converted are the ones recorded by its last sync
+    blob_ids = [record.blob_ids if record else {} for record in records]
+    if state:
+        for index, converted_html in zip(converted_indexes, converted_htmls):
+            section_images = [image for image in images if f'ri:filename="{escape(image.name)}"' in converted_html] + split_images.get(index, [])
+            blob_ids[index] = {mappings[index].filepath: file_blob_id(mappings[index].filepath), **{image.path: image.blob_id for image in section_images}}
+
+    changed_indexes: list[int] = []
+    for index, converted_html in zip(converted_indexes, converted_htmls):
+        rendered_hash = section_hash(converted_html)
+        # skip sections that already hold the converted markdown, so no new page version is created if none changed
+        if rendered_hash != rendered_hashes[index]:
+            contents[index] = converted_html
+            rendered_hashes[index] = rendered_hash
+            changed_indexes.append(index)
+
+    if not changed_indexes:
+        logging.info("Confluence page is already up to date.")
+        record_sync(state, mappings, page_id, page_version_number, source_hashes, rendered_hashes, blob_ids)
+        return UPDATED if children_changed else UNCHANGED
+
+    # insert the markdown of every section between its insert_start_text and insert_end_text, as spans of the page body
+    # and the new contents that are sent without being joined
+    with metrics.span("sync.splice"):
+        page_spans = splice_spans(page_body, sections, contents)
+
+    # create edit page command
+    input = EditPageCommandInput(domain, page_id, page_status, page_title, page_spans, page_version_number)
+    command = EditPageCommand(input)
+
+    # if the page is edited by someone else before this edit, only the synced sections are replaced in their version of the page
+    changed_contents = {index: contents[index] for index in changed_indexes}
+    def rebase(latest_body: str) -> list[Span]:
+        latest_sections = find_sections(latest_body, marker_pairs)
+        latest_contents = [changed_contents.get(index, latest_body[start:end]) for index, (start, end) in enumerate(latest_sections)]
+        for index, content in enumerate(latest_contents):
+            if index not in changed_contents:
+                rendered_hashes[index] = section_hash(content)
+        return splice_spans(latest_body, latest_sections, latest_contents)
+
+    size = sum(payload_size(chunk) for chunk in span_chunks(page_spans, BODY_CHUNK_SIZE))
+    metrics.increment("storage.page_bytes", size)
+    logging.debug(f"The body of the page is {size} bytes.")
+    logging.info("Updating confluence page.")
+    with metrics.span("sync.edit_page"):
+        response = yield EditStep(command, rebase)
+    response.raise_for_status()
+    record_sync(state, mappings, page_id, command.input.version, source_hashes, rendered_hashes, blob_ids)
+    return UPDATED
+
+
+def split_steps(metrics: Metrics, domain: str, page: Page, mapping: SyncMapping, md_text: str) -> Generator[ApiCommand | ConvertStep | UploadImagesStep | EditStep, Any, tuple[str, list[LocalImage], bool] | None]:
+    """
+    The steps of :func:`sync_steps` that sync oversized markdown to child pages of its page instead of its section:
+    the markdown is split at its headings and grouped into parts of at most the split size of the mapping, see
+    :func:`src.payload.group_parts`, each synced to a child page titled after the page and the first heading of the part.
+    Missing child pages are created and the ones whose body changed are updated. The child pages of parts that no longer
+    exist are left untouched.
+
+    :param metrics: The metrics to count the child pages in.
+    :param domain: The domain of the Confluence site.
+    :param page: The page of the section.
+    :param mapping: The mapping of the section.
+    :param md_text: The markdown of the section.
+    :return: The HTML to sync to the section, which is the markdown before the first heading followed by an index of
+        the child pages, the local images attached to the child pages, and whether any child page was created or updated.
+        None if the markdown can not be split at its headings.
+    """
+    split = split_markdown(md_text)
+    if split is None:
+        logging.warning(f"{mapping.filepath} can not be split at its headings, syncing it to a single section.")
+        return None
+    preamble, sections = split
+    htmls: list[str] = []
+    for section in [preamble, *sections] if preamble else sections:
+        with metrics.span("sync.convert"):
+            htmls.append(compact_storage((yield ConvertStep(section))))
+    preamble_html = htmls.pop(0) if preamble else ""
+    parts = group_parts(sections, htmls, mapping.split_size, page.title)
+    logging.info(f"Splitting {mapping.filepath} into {len(parts)} child pages.")
+    metrics.increment("pages.split", len(parts))
+
+    space_id = page.space_id
+    if space_id is None:
+        response = yield GetPageVersionCommand(GetPageCommandInput(domain, page.id))
+        response.raise_for_status()
+        space_id = str(json.loads(response.text)["spaceId"])
+    children: dict[str, str] = {}
+    cursor = None
+    while True:
+        response = yield GetChildPagesCommand(GetChildPagesCommandInput(domain, page.id, cursor))
+        response.raise_for_status()
+        body = json.loads(response.text)
+        for child in body.get("results", []):
+            children[child["title"]] = child["id"]
+        cursor = next_cursor(body)
+        if not cursor:
+            break
+
+    part_htmls, images = replace_local_images([part.html for part in parts], [mapping.filepath] * len(parts))
+    changed = False
+    for part, html in zip(parts, part_htmls):
+        part_images = [image for image in images if f'ri:filename="{escape(image.name)}"' in html]
+        child_id = children.get(part.title)
+        if child_id is None:
+            response = yield CreatePageCommand(CreatePageCommandInput(domain, space_id, page.id, part.title, html))
+            response.raise_for_status()
+            child_id = json.loads(response.text)["id"]
+            changed = True
+        if part_images:
+            metrics.increment("images.uploaded", (yield UploadImagesStep(domain, child_id, part_images)))
+        if part.title not in children:
+            continue
+        response = yield GetPageCommand(GetPageCommandInput(domain, child_id))
+        response.raise_for_status()
+        child = Page.from_json(json.loads(response.text))
+        if section_hash(child.body) != section_hash(html):
+            command = EditPageCommand(EditPageCommandInput(domain, child_id, child.status, part.title, html, child.version))
+            # the child page is generated from the markdown, so a conflicting edit is overwritten
+            response = yield EditStep(command, lambda latest_body, html=html: html)
+            response.raise_for_status()
+            changed = True
+    return preamble_html + split_index(parts), images, changed
+
+
+def record_sync(state: SyncState | None, mappings: list[SyncMapping], page_id: str, version: int, source_hashes: list[str], rendered_hashes: list[str], blob_ids: list[dict[str, str]]) -> None:
+    """
+    Records the sync of every section of a page in the state, if one is given.
+    """
+    if state:
+        for mapping, source_hash, rendered_hash, section_blob_ids in zip(mappings, source_hashes, rendered_hashes, blob_ids):
+            state.set(mapping.key, SyncRecord(page_id, version, source_hash, rendered_hash, section_blob_ids, mapping.split_size))
@@ -0,0 +1,381 @@
+"""
+Tree mode that mirrors a directory of markdown files to a hierarchy of Confluence pages under a parent page.
+"""
+
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from html import escape, unescape
+from typing import Callable
+from urllib.parse import quote_plus, unquote
+from requests import RequestException
+from src.errors import InvalidParameterError
+from src.api import ConfluenceClient, Page, CreatePageCommand, CreatePageCommandInput, EditPageCommand, EditPageCommandInput, GetChildPagesCommand, GetChildPagesCommandInput, GetPageCommand, GetPageCommandInput, GetPageVersionCommand
+from src.converter import FENCE_OPEN_PATTERN, MarkdownConverter
+from src.images import LocalImage, replace_local_images, upload_images
+from src.payload import compact_sections
+from src.section_links import section_anchors
+from src.sync import SyncMapping, SyncResult, CREATED, UPDATED, UNCHANGED, section_hash
+from src.utils import extract_domain_and_page_id, next_cursor
+
+MARKDOWN_EXTENSIONS = (".md", ".markdown")
+# the file in a directory whose markdown is synced to the page of the directory itself
+INDEX_FILES = ("index.md", "readme.md")
+# closing hashes of a heading must follow whitespace, so the title of `# C#` is `C#`
+TITLE_PATTERN = re.compile(r'^#[ \t]+(.+?)(?:[ \t]+#+)?[ \t]*$')
+LINK_PATTERN = re.compile(r'<a\b([^>]*)>(.*?)</a>', re.DOTALL)
+HREF_PATTERN = re.compile(r'\bhref="([^"]*)"')
+# code block bodies are written as they are in the markdown, so the links in them are examples and not links of the page
+CDATA_PATTERN = re.compile(r'(<!\[CDATA\[.*?\]\]>)', re.DOTALL)
+# directories without an index list their child pages
+CHILDREN_MACRO = '<ac:structured-macro ac:name="children" />'
+
+class TreeNode:
+    """
+    A directory or markdown file that is mirrored to a Confluence page.
+    """
+
+    def __init__(self, path: str, title: str, markdown_path: str | None = None, children: list["TreeNode"] | None = None):
+        """
+        Initialize the node.
+
+        :param path: The path of the directory or markdown file.
+        :param title: The title of the page.
+        :param markdown_path: The markdown file whose content is synced to the page, or None for a directory without an index.
+        :param children: The nodes of the files and directories in a directory.
+        """
+        self.path = path
+        self.title = title
+        self.markdown_path = markdown_path
+        self.children = children or []
+
+
+def markdown_title(markdown_path: str) -> str:
+    """
+    Titles a page after the first top-level heading of its markdown, or after the file name if it has none.
+    Lines in fenced code blocks, such as shell comments, are not headings.
+    """
+    fence: str | None = None
+    with open(markdown_path, 'r') as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if fence:
+                if line.rstrip(' ') == fence:
+                    fence = None
+            elif match := FENCE_OPEN_PATTERN.match(line):
+                fence = match.group('fence')
+            elif match := TITLE_PATTERN.match(line):
+                return match.group(1)
+    return os.path.splitext(os.path.basename(markdown_path))[0]
+
+
+def build_tree(directory: str) -> TreeNode:
+    """
+    Builds the tree of pages for a directory: every markdown file is a page, and every directory that contains markdown
+    is a page with the pages of its files and directories as children. Hidden files and directories are skipped.
+
+    :param directory: The directory to mirror.
+    :return: The node of the directory, sorted by name at every level.
+    """
+    children: list[TreeNode] = []
+    index_path: str | None = None
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.startswith("."):
+            continue
+        if os.path.isdir(path):
+            child = build_tree(path)
+            if child.markdown_path or child.children:
+                children.append(child)
+        elif name.lower().endswith(MARKDOWN_EXTENSIONS):
+            if name.lower() in INDEX_FILES and index_path is None:
+                index_path = path
+            else:
+                children.append(TreeNode(path, markdown_title(path), path))
+    title = markdown_title(index_path) if index_path else os.path.basename(os.path.normpath(directory))
+    return TreeNode(directory, title, index_path, children)
+
+
+def page_titles(root: TreeNode) -> dict[str, str]:
+    """
+    :return: The page title of every markdown file and directory below the root, by their normalized path.
+    """
+    titles: dict[str, str] = {}
+    for node in descendants(root):
+        titles[os.path.normpath(node.path)] = node.title
+        if node.markdown_path:
+            titles[os.path.normpath(node.markdown_path)] = node.title
+    return titles
+
+
+def to_page_links(html: str, markdown_path: str, titles: dict[str, str], anchors: Callable[[str], dict[str, str]] | None = None) -> str:
+    """
+    Replaces the links of converted markdown to other markdown files and directories of the tree with links to their pages.
+    Code blocks are left untouched.
+
+    :param html: The converted markdown.
+    :param markdown_path: The file path of the markdown that was converted.
+    :param titles: The page title of every file and directory of the tree, see :func:`page_titles`.
+    :param anchors: Gets the Confluence anchor of every heading of a markdown file by its markdown slug, see
+        :func:`src.section_links.section_anchors`, to link to the sections of other pages. None keeps the anchors of the links.
+    :return: The HTML with the relative links replaced.
+    """
+    def replace(match: re.Match) -> str:
+        href = HREF_PATTERN.search(match.group(1))
+        if not href:
+            return match.group(0)
+        target, _, anchor = unquote(unescape(href.group(1))).partition("#")
+        if not target or re.match(r'^(?:[a-zA-Z][\w+.-]*:|//|/)', target):
+            return match.group(0)
+        path = os.path.normpath(os.path.join(os.path.dirname(markdown_path), target))
+        title = titles.get(path)
+        if title is None:
+            return match.group(0)
+        anchor = anchor.lstrip("#")
+        if anchor and anchors is not None and os.path.isfile(path):
+            index = anchors(path)
+            anchor = index.get(anchor) or index.get(anchor.lower(), anchor)
+        anchor_attribute = f' ac:anchor="{escape(anchor)}"' if anchor else ''
+        return f'<ac:link{anchor_attribute}><ri:page ri:content-title="{escape(title)}" /><ac:link-body>{match.group(2)}</ac:link-body></ac:link>'
+    parts = CDATA_PATTERN.split(html)
+    for index in range(0, len(parts), 2):
+        parts[index] = LINK_PATTERN.sub(replace, parts[index])
+    return ''.join(parts)
+
+
+def title_conflicts(root: TreeNode) -> dict[int, InvalidParameterError]:
+    """
+    Finds the nodes that share their title with a sibling. Sibling pages are found by their title, so they would all be
+    synced to the same page, each overwriting the others.
+
+    :return: The error of every node whose title is not unique among its siblings, by the ID of the node.
+    """
+    conflicts: dict[int, InvalidParameterError] = {}
+    for node in [root, *descendants(root)]:
+        siblings: dict[str, list[TreeNode]] = {}
+        for child in node.children:
+            siblings.setdefault(child.title, []).append(child)
+        for title, nodes in siblings.items():
+            if len(nodes) > 1:
+                paths = ", ".join(child.markdown_path or child.path for child in nodes)
+                for child in nodes:
+                    conflicts[id(child)] = InvalidParameterError(f"Error: {paths} are all titled {title}, but the pages under the same page need different titles")
+    return conflicts
+
+
+def list_child_pages(client: ConfluenceClient, domain: str, page_id: str) -> dict[str, str]:
+    """
+    Lists every child page of a page, following the cursor of each page of results.
+
+    :return: The ID of each child page by its title.
+    """
+    children: dict[str, str] = {}
+    cursor = None
+    while True:
+        response = client.send(GetChildPagesCommand(GetChildPagesCommandInput(domain, page_id, cursor)))
+        response.raise_for_status()
+        body = json.loads(response.text)
+        for page in body.get("results", []):
+            children[page["title"]] = page["id"]
+        cursor = next_cursor(body)
+        if not cursor:
+            return children
+
+
+class TreeSync:
+    """
+    Mirrors a directory tree to the subtree of a parent page, one level of the tree at a time.
+    """
+
+    def __init__(self, client: ConfluenceClient, directory: str, url: str, converter: MarkdownConverter | None = None, max_workers: int = 4):
+        """
+        Initialize the sync of a directory.
+
+        :param client: The client to send the API commands with.
+        :param directory: The directory to mirror.
+        :param url: The full URL of the parent page, including the https://
+        :param converter: The converter to convert the markdown with.
+        :param max_workers: The maximum number of pages synced at the same time.
+        """
+        self.client = client
+        self.directory = directory
+        self.url = url
+        self.domain, self.parent_id = extract_domain_and_page_id(url)
+        self.converter = converter or MarkdownConverter()
+        self.max_workers = max_workers
+        self.root = build_tree(directory)
+        # the parent page is not edited, so the index of the directory itself is synced to a child page like the other files
+        if self.root.markdown_path:
+            self.root.children.insert(0, TreeNode(self.root.markdown_path, self.root.title, self.root.markdown_path))
+        self.titles = page_titles(self.root)
+        self.conflicts = title_conflicts(self.root)
+        # the URL of every synced page by its ID, in the format of the URL of the parent page
+        self.urls: dict[str, str] = {self.parent_id: url}
+        # the headings of every converted file by its normalized path, to resolve the links to the sections of other pages
+        self.anchors: dict[str, dict[str, str]] = {}
+
+    def page_url(self, page_id: str, title: str) -> str:
+        """
+        :return: The URL of a page in the same space as the parent page, eg. ``https://domain/wiki/spaces/SPACE/pages/123/Page+Title``.
+        """
+        return re.sub(r'/pages/\d+.*$', lambda match: f'/pages/{page_id}/{quote_plus(title)}', self.url)
+
+    def render(self, node: TreeNode) -> tuple[str, list[LocalImage]]:
+        """
+        Converts the markdown of a node, linking to the other pages of the tree and to the attachments of its local images.
+
+        :return: The body of the page and the images to attach to it.
+        """
+        if not node.markdown_path:
+            return CHILDREN_MACRO, []
+        with open(node.markdown_path, 'r') as f:
+            html = self.converter.convert(f.read())
+        self.anchors[os.path.normpath(node.markdown_path)] = section_anchors(html)
+        html = to_page_links(compact_sections([html], self.client.metrics)[0], node.markdown_path, self.titles, self.section_anchors)
+        htmls, images = replace_local_images([html], [node.markdown_path])
+        return htmls[0], images
+
+    def section_anchors(self, markdown_path: str) -> dict[str, str]:
+        """
+        Gets the headings of a markdown file of the tree, converting it if it was not rendered yet, eg. when it is on a
+        lower level of the tree than the page that links to it.
+
+        :param markdown_path: The normalized path of the file.
+        :return: The Confluence anchor of every heading of the file by its markdown slug.
+        """
+        anchors = self.anchors.get(markdown_path)
+        if anchors is None:
+            # pages of the same level are rendered concurrently, and converting a file twice gives the same index
+            with open(markdown_path, 'r') as f:
+                anchors = self.anchors[markdown_path] = section_anchors(self.converter.convert(f.read()))
+        return anchors
+
+    def sync_node(self, node: TreeNode, parent_id: str, existing_id: str | None, space_id: str, page: Page | None = None) -> tuple[str, str]:
+        """
+        Creates the page of a node under its parent page, or updates the existing page if its body changed.
+
+        :param page: The existing page fetched in bulk with its body, or None to fetch it.
+        :return: The ID of the page and whether it was ``created``, ``updated`` or ``unchanged``.
+        """
+        body, images = self.render(node)
+        if existing_id is None:
+            response = self.client.send(CreatePageCommand(CreatePageCommandInput(self.domain, space_id, parent_id, node.title, body)))
+            response.raise_for_status()
+            page_id = json.loads(response.text)["id"]
+            if images:
+                upload_images(self.client, self.domain, page_id, images, self.client.pool_size)
+            return page_id, CREATED
+
+        if images:
+            upload_images(self.client, self.domain, existing_id, images, self.client.pool_size)
+        if page is None or page.body is None:
+            response = self.client.send(GetPageCommand(GetPageCommandInput(self.domain, existing_id)))
+            response.raise_for_status()
+            page = Page.from_json(json.loads(response.text))
+        if section_hash(page.body) == section_hash(body):
+            return existing_id, UNCHANGED
+        command = EditPageCommand(EditPageCommandInput(self.domain, existing_id, page.status, node.title, body, page.version))
+        # the page is mirrored from the markdown, so a conflicting edit is overwritten
+        self.client.send_edit(command, lambda latest_body: body).raise_for_status()
+        return existing_id, UPDATED
+
+    def get_pages(self, page_ids: list[str]) -> dict[str, Page]:
+        """
+        Gets the existing pages of a level in bulk, see :meth:`ConfluenceClient.get_pages`.
+
+        :return: Each page by its ID, or no pages if the bulk requests failed and each page is left to be fetched by its own sync.
+        """
+        try:
+            return self.client.get_pages(self.domain, page_ids)
+        except (RequestException, ValueError, KeyError) as e:
+            logging.warning(f"Failed to get the pages of {self.domain} in bulk, getting each page separately: {e}")
+            return {}
+
+    def sync_item(self, node: TreeNode, parent_id: str, children: dict[str, str], space_id: str, pages: dict[str, Page] | None = None) -> tuple[str | None, SyncResult]:
+        """
+        Syncs a node under its parent page, capturing any error in the result instead of raising it.
+
+        :param children: The ID of each existing child page of the parent by its title.
+        :param pages: The existing pages of the level fetched in bulk, by their ID.
+        :return: The ID of the page of the node, or None if it failed to sync, and the result of the node.
+        """
+        mapping = SyncMapping(node.markdown_path or node.path, self.urls[parent_id], "", "")
+        if id(node) in self.conflicts:
+            return None, SyncResult(mapping, error=self.conflicts[id(node)])
+        existing_id = children.get(node.title)
+        try:
+            page_id, status = self.sync_node(node, parent_id, existing_id, space_id, (pages or {}).get(existing_id))
+        except Exception as e:
+            return None, SyncResult(mapping, error=e)
+        mapping.url = self.urls[page_id] = self.page_url(page_id, node.title)
+        return page_id, SyncResult(mapping, status)
+
+    def run(self) -> list[SyncResult]:
+        """
+        Syncs every level of the tree concurrently, after the level above it so every page is created under its parent.
+        The pages below a page that failed to sync are not synced and fail as well, as do the pages that share their title
+        with a sibling, see :func:`title_conflicts`.
+
+        :return: The result of every markdown file and directory, in the order of the tree.
+        """
+        response = self.client.send(GetPageVersionCommand(GetPageCommandInput(self.domain, self.parent_id)))
+        response.raise_for_status()
+        space_id = json.loads(response.text)["spaceId"]
+
+        results: dict[int, SyncResult] = {}
+        level = [(node, self.parent_id) for node in self.root.children]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while level:
+                # one listing per parent finds every existing child page, instead of looking up each page
+                parent_ids = list(dict.fromkeys(parent_id for _, parent_id in level))
+                children = dict(zip(parent_ids, executor.map(lambda parent_id: list_child_pages(self.client, self.domain, parent_id), parent_ids)))
+                # the existing pages of the level are fetched with a few bulk requests, instead of a GET per page
+                existing_ids = [children[parent_id][node.title] for node, parent_id in level if node.title in children[parent_id] and id(node) not in self.conflicts]
+                pages = self.get_pages(existing_ids) if existing_ids else {}
+                level_results = list(executor.map(lambda item: self.sync_item(item[0], item[1], children[item[1]], space_id, pages), level))
+
+                next_level: list[tuple[TreeNode, str]] = []
+                for (node, _), (page_id, result) in zip(level, level_results):
+                    results[id(node)] = result
+                    if page_id is not None:
+                        next_level.extend((child, page_id) for child in node.children)
+                    else:
+                        for descendant in descendants(node):
+                            results[id(descendant)] = SyncResult(SyncMapping(descendant.markdown_path or descendant.path, result.mapping.url, "", ""), error=result.error)
+                level = next_level
+
+        ordered = [results[id(node)] for node in descendants(self.root)]
+        for result in ordered:
+            if result.success:
+                logging.info(f"Synced {result.mapping.filepath} to {result.mapping.url}: {result.status}")
+            else:
+                logging.error(f"Failed to sync {result.mapping.filepath}: {result.error}")
+        return ordered
+
+
+def descendants(node: TreeNode) -> list[TreeNode]:
+    """
+    :return: Every node below a node, depth first in the order of the tree.
+    """
+    nodes: list[TreeNode] = []
+    for child in node.children:
+        nodes.append(child)
+        nodes.extend(descendants(child))
+    return nodes
+
+
+def sync_tree(client: ConfluenceClient, directory: str, url: str, converter: MarkdownConverter | None = None, max_workers: int = 4) -> list[SyncResult]:
+    """
+    Mirrors a directory of markdown files to the subtree of a parent page, see :class:`TreeSync`.
+    Missing pages are created, changed pages are updated and links between the markdown files link to their pages.
+
+    :param client: The client to send the API commands with.
+    :param directory: The directory to mirror.
+    :param url: The full URL of the parent page, including the https://
+    :param converter: The converter to convert the markdown with.
+    :param max_workers: The maximum number of pages synced at the same time.
+    :return: The result of every markdown file and directory, in the order of the tree.
+    """
+    return TreeSync(client, directory, url, converter, max_workers).run()
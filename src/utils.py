@@ -1,4 +1,7 @@
+import hashlib
 import re
+from os import environ
+from urllib.parse import parse_qs, urlparse
 
 def extract_domain_and_page_id(url: str) -> tuple[str, str]:
     """
@@ -37,4 +40,74 @@ def extract_page_id_from_url(url: str) -> str:
     match = re.search(pattern, url)
     if match:
         return match.group(1)
-    raise ValueError(f"Failed to extract page id from url: {url}")
\ No newline at end of file
+    raise ValueError(f"Failed to extract page id from url: {url}")
+
+def content_hash(text: str) -> str:
+    """
+    Hashes a piece of text so that it can be compared or stored without keeping the text itself.
+
+    :param str text: The text to hash
+    :return str: The hex encoded SHA-256 digest of the text
+    """
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def git_blob_id(content: bytes) -> str:
+    """
+    Computes the git object ID of a file's content, the same ID ``git hash-object`` gives a file without filters such as LFS.
+
+    :param bytes content: The content of the file
+    :return str: The hex encoded SHA-1 of the content as a git blob
+    """
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+def file_blob_id(path: str) -> str | None:
+    """
+    Computes the git object ID of a file, see :func:`git_blob_id`.
+
+    :param str path: The file path of the file
+    :return str | None: The git object ID of the file, or None if the file does not exist
+    """
+    try:
+        with open(path, 'rb') as f:
+            return git_blob_id(f.read())
+    except FileNotFoundError:
+        return None
+
+def next_cursor(response_body: dict) -> str | None:
+    """
+    Extracts the cursor of the next page of results from the next link of a paginated v2 API response.
+
+    :param dict response_body: The parsed JSON body of the response
+    :return str | None: The cursor to request the next results with, or None if these are the last results
+    """
+    next_link = response_body.get("_links", {}).get("next")
+    if not next_link:
+        return None
+    return parse_qs(urlparse(next_link).query).get("cursor", [None])[0]
+
+def set_output(name: str, value: str) -> None:
+    """
+    Sets an output of the action by appending it to the file in the GITHUB_OUTPUT environment variable.
+    Does nothing when the action is not run by GitHub Actions.
+
+    :param str name: The name of the output
+    :param str value: The value of the output, which must not contain newlines
+    """
+    output_path = environ.get("GITHUB_OUTPUT")
+    if not output_path:
+        return
+    with open(output_path, 'a') as f:
+        f.write(f"{name}={value}\n")
+
+def write_step_summary(markdown: str) -> None:
+    """
+    Adds markdown to the summary of the action's step by appending it to the file in the GITHUB_STEP_SUMMARY environment variable.
+    Does nothing when the action is not run by GitHub Actions.
+
+    :param str markdown: The markdown to add to the summary
+    """
+    summary_path = environ.get("GITHUB_STEP_SUMMARY")
+    if not summary_path:
+        return
+    with open(summary_path, 'a') as f:
+        f.write(markdown)
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""
+Watch mode that keeps syncing markdown files from a working tree as they are edited.
+"""
+
+import logging
+import os
+import threading
+import time
+from src.api import ConfluenceClient
+from src.batch import run_batch
+from src.converter import MarkdownConverter
+from src.state import SyncState
+from src.sync import SyncMapping, SyncResult
+
+class Watcher:
+    """
+    Polls the markdown files of a set of mappings, and the local images they reference, for changes.
+    Once a burst of edits has settled, the mappings whose files changed are synced together, so the sections of a page that
+    changed in the same burst are written with a single edit of the page.
+    The client, its connections, the converter and the state are kept between syncs.
+    """
+
+    def __init__(self, client: ConfluenceClient, mappings: list[SyncMapping], state: SyncState | None = None, converter: MarkdownConverter | None = None, interval: float = 0.5, debounce: float = 2.0, max_workers: int = 4):
+        """
+        Initialize the watcher.
+
+        :param client: The client to send the API commands with.
+        :param mappings: The mappings to keep in sync.
+        :param state: The record of previous syncs, saved after every sync, or None to keep the record in memory only.
+        :param converter: The converter to convert the markdown with.
+        :param interval: The number of seconds between two checks of the files.
+        :param debounce: The number of seconds without any change to wait for before syncing the changed files.
+        :param max_workers: The maximum number of pages synced at the same time.
+        """
+        self.client = client
+        self.mappings = mappings
+        # the record of what was synced is what lets a sync skip the sections that did not change
+        self.state = state or SyncState()
+        self.converter = converter or MarkdownConverter()
+        self.interval = interval
+        self.debounce = debounce
+        self.max_workers = max_workers
+        self.pending: set[str] = set()
+        self.last_change = 0.0
+        self.snapshot: dict[str, tuple[int, int] | None] = {}
+        self.watch_paths()
+
+    def watched_mappings(self) -> dict[str, list[SyncMapping]]:
+        """
+        :return: The mappings synced from each watched file: the markdown file of every mapping and the local images recorded by its last sync.
+        """
+        mappings_by_path: dict[str, list[SyncMapping]] = {}
+        for mapping in self.mappings:
+            mappings_by_path.setdefault(mapping.filepath, []).append(mapping)
+            try:
+                record = self.state.get(mapping.key)
+            except ValueError:
+                continue
+            for path in record.blob_ids if record else {}:
+                if path != mapping.filepath:
+                    mappings_by_path.setdefault(path, []).append(mapping)
+        return mappings_by_path
+
+    def watch_paths(self) -> None:
+        """
+        Starts watching the files referenced since the last check, without counting them as changed.
+        """
+        self.paths = self.watched_mappings()
+        self.snapshot = {path: self.snapshot[path] if path in self.snapshot else file_signature(path) for path in self.paths}
+
+    def poll(self) -> set[str]:
+        """
+        Checks every watched file for changes since the previous check.
+
+        :return: The files that were modified, created or deleted.
+        """
+        changed: set[str] = set()
+        for path in self.paths:
+            signature = file_signature(path)
+            if signature != self.snapshot.get(path):
+                self.snapshot[path] = signature
+                changed.add(path)
+        return changed
+
+    def step(self, now: float) -> list[SyncResult] | None:
+        """
+        Checks the files once and syncs the pending changes if no file changed for the debounce time.
+
+        :param now: The current time in seconds, eg. from :func:`time.monotonic`.
+        :return: The results of the sync, or None if nothing was synced.
+        """
+        changed = self.poll()
+        if changed:
+            self.pending |= changed
+            self.last_change = now
+        if not self.pending or now - self.last_change < self.debounce:
+            return None
+        paths, self.pending = self.pending, set()
+        # a mapping that several of the changed files belong to is synced once
+        changed_mappings = {id(mapping) for path in paths for mapping in self.paths.get(path, [])}
+        mappings = [mapping for mapping in self.mappings if id(mapping) in changed_mappings]
+        logging.info(f"{len(paths)} files changed, syncing {len(mappings)} entries.")
+        return self.sync(mappings)
+
+    def sync(self, mappings: list[SyncMapping]) -> list[SyncResult]:
+        """
+        Syncs mappings, saves the state and starts watching the images they reference.
+
+        :param mappings: The mappings to sync.
+        :return: The result of each mapping.
+        """
+        results = run_batch(self.client, mappings, self.max_workers, self.state, self.converter)
+        self.state.save()
+        self.watch_paths()
+        return results
+
+    def run(self, stop: threading.Event) -> None:
+        """
+        Syncs every mapping, then keeps syncing the changed files until the stop event is set.
+
+        :param stop: The event that stops watching.
+        """
+        self.sync(self.mappings)
+        logging.info(f"Watching {len(self.paths)} files for changes.")
+        while not stop.is_set():
+            self.step(time.monotonic())
+            stop.wait(self.interval)
+
+
+def file_signature(path: str) -> tuple[int, int] | None:
+    """
+    :return: The modification time and the size of a file, which change whenever it is written, or None if it does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
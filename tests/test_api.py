@@ -1,6 +1,7 @@
+import json
 import unittest
 from src.api import *
-from unittest.mock import patch
+from unittest.mock import patch, ANY, MagicMock
 from requests import Response
 from requests.auth import HTTPBasicAuth
 
@@ -49,6 +50,25 @@ class TestGetPageCommand(unittest.TestCase):
             auth = auth,
             params = {"body-format": "storage"}
         )
+    def test_execute_with_session(self):
+        session = MagicMock()
+        self.command.execute(auth, session)
+        self.assertEqual(session.request.call_args.args, ("GET", f"https://{self.input.domain}/wiki/api/v2/pages/{self.input.id}"), "Request should be sent through the session")
+
+class TestGetPageVersionCommand(unittest.TestCase):
+    def setUp(self):
+        self.input = GetPageCommandInput("example.com", "1234567890")
+        self.command = GetPageVersionCommand(self.input)
+    @patch('requests.request')
+    def test_execute(self, mock_request):
+        response = self.command.execute(auth)
+        self.assertIsNotNone(response)
+        mock_request.assert_called_with(
+            "GET",
+            f"https://{self.input.domain}/wiki/api/v2/pages/{self.input.id}",
+            headers = {"Accept": "application/json"},
+            auth = auth
+        )
 
 class TestEditPageCommand(unittest.TestCase):
     def setUp(self):
@@ -87,10 +107,122 @@ class TestEditPageCommand(unittest.TestCase):
         mock_request.assert_called_with(
             "PUT",
             f"https://{self.input.domain}/wiki/api/v2/pages/{self.input.id}",
-            data = payload,
+            data = ANY,
             headers = headers,
             auth = auth,
         )
+        self.assertEqual(bytes(mock_request.call_args.kwargs["data"]), payload.encode(), "Streamed body should be the JSON of the edit")
+    def test_spans(self):
+        body = "<p>a \"quoted\" ünïcödé\tbody</p>" * 5000
+        input = EditPageCommandInput("example.com", "1", "current", "Title", [(body, 3, len(body)), ("<p>new</p>", 0, 10)], 1)
+        self.assertEqual(input.body, body[3:] + "<p>new</p>")
+        data = StreamedJsonBody({"body": STREAMED_VALUE, "version": 2}, input.spans)
+        self.assertEqual(bytes(data), json.dumps({"body": input.body, "version": 2}).encode(), "Chunks should escape like json.dumps")
+        self.assertEqual(len(data), len(bytes(data)))
+        prepared = requests.Request("PUT", "https://example.com", data=data).prepare()
+        self.assertEqual(prepared.headers["Content-Length"], str(len(data)), "The body should be sent with its length instead of in chunked encoding")
+
+class TestGetChildPagesCommand(unittest.TestCase):
+    @patch('requests.request')
+    def test_execute(self, mock_request):
+        GetChildPagesCommand(GetChildPagesCommandInput("example.com", "1234567890", "abc")).execute(auth)
+        mock_request.assert_called_with(
+            "GET",
+            "https://example.com/wiki/api/v2/pages/1234567890/children",
+            headers = {"Accept": "application/json"},
+            auth = auth,
+            params = {"limit": 250, "cursor": "abc"}
+        )
+
+class TestCreatePageCommand(unittest.TestCase):
+    @patch('requests.request')
+    def test_execute(self, mock_request):
+        CreatePageCommand(CreatePageCommandInput("example.com", "9", "1234567890", "Title", "<p>body</p>")).execute(auth)
+        mock_request.assert_called_with(
+            "POST",
+            "https://example.com/wiki/api/v2/pages",
+            data = json.dumps({"spaceId": "9", "status": "current", "title": "Title", "parentId": "1234567890", "body": {"representation": "storage", "value": "<p>body</p>"}}),
+            headers = {"Accept": "application/json", "Content-Type": "application/json"},
+            auth = auth
+        )
+
+class TestGetAttachmentsCommand(unittest.TestCase):
+    @patch('requests.request')
+    def test_execute(self, mock_request):
+        GetAttachmentsCommand(GetAttachmentsCommandInput("example.com", "1234567890")).execute(auth)
+        mock_request.assert_called_with(
+            "GET",
+            "https://example.com/wiki/api/v2/pages/1234567890/attachments",
+            headers = {"Accept": "application/json"},
+            auth = auth,
+            params = {"limit": 250}
+        )
+    @patch('requests.request')
+    def test_execute_with_cursor(self, mock_request):
+        GetAttachmentsCommand(GetAttachmentsCommandInput("example.com", "1234567890", "abc")).execute(auth)
+        self.assertEqual(mock_request.call_args.kwargs["params"], {"limit": 250, "cursor": "abc"})
+
+class TestUploadAttachmentCommand(unittest.TestCase):
+    @patch('requests.request')
+    def test_execute(self, mock_request):
+        input = UploadAttachmentCommandInput("example.com", "1234567890", "diagram.png", b"png", "image/png", "comment")
+        UploadAttachmentCommand(input).execute(auth)
+        mock_request.assert_called_with(
+            "PUT",
+            "https://example.com/wiki/rest/api/content/1234567890/child/attachment",
+            files = {"file": ("diagram.png", b"png", "image/png")},
+            data = {"comment": "comment", "minorEdit": "true"},
+            headers = {"Accept": "application/json", "X-Atlassian-Token": "no-check"},
+            auth = auth
+        )
+
+class TestBulkGetPagesCommand(unittest.TestCase):
+    @patch('requests.request')
+    def test_execute(self, mock_request):
+        BulkGetPagesCommand(BulkGetPagesCommandInput("example.com", ["1", "2"])).execute(auth)
+        mock_request.assert_called_with(
+            "GET",
+            "https://example.com/wiki/api/v2/pages",
+            headers = {"Accept": "application/json"},
+            auth = auth,
+            params = {"id": "1,2", "limit": 250, "body-format": "storage"}
+        )
+    @patch('requests.request')
+    def test_execute_without_body(self, mock_request):
+        BulkGetPagesCommand(BulkGetPagesCommandInput("example.com", ["1"], include_body=False, cursor="abc")).execute(auth)
+        self.assertEqual(mock_request.call_args.kwargs["params"], {"id": "1", "limit": 250, "cursor": "abc"}, "Body should not be requested")
+
+class TestPage(unittest.TestCase):
+    def test_from_json(self):
+        page = Page.from_json({"id": 1, "status": "current", "title": "Title", "body": {"storage": {"value": "<p>body</p>"}}, "version": {"number": 3}})
+        self.assertEqual((page.id, page.status, page.title, page.body, page.version), ("1", "current", "Title", "<p>body</p>", 3))
+        self.assertIsNone(page.space_id)
+        self.assertEqual(Page.from_json({"id": "1", "status": "current", "title": "Title", "spaceId": 9, "version": {"number": 3}}).space_id, "9")
+    def test_without_body(self):
+        page = Page.from_json({"id": "1", "status": "current", "title": "Title", "version": {"number": 3}})
+        self.assertIsNone(page.body)
+
+class TestConfluenceClientGetPages(unittest.TestCase):
+    def setUp(self):
+        self.client = ConfluenceClient(auth)
+        self.client.send = MagicMock()
+    def page(self, page_id: str) -> dict:
+        return {"id": page_id, "status": "current", "title": f"Page {page_id}", "body": {"storage": {"value": "<p>body</p>"}}, "version": {"number": 1}}
+    def test_chunks(self):
+        page_ids = [str(page_id) for page_id in range(300)]
+        self.client.send.side_effect = lambda command: MagicMock(text=json.dumps({"results": [self.page(page_id) for page_id in command.input.ids]}))
+        pages = self.client.get_pages("example.com", page_ids + ["0"])
+        self.assertEqual([len(call.args[0].input.ids) for call in self.client.send.call_args_list], [250, 50], "IDs should be requested in chunks of 250 without duplicates")
+        self.assertEqual(list(pages), page_ids)
+        self.assertEqual(pages["299"].title, "Page 299")
+    def test_pagination(self):
+        self.client.send.side_effect = [
+            MagicMock(text=json.dumps({"results": [self.page("1")], "_links": {"next": "/wiki/api/v2/pages?id=1,2&cursor=abc"}})),
+            MagicMock(text=json.dumps({"results": [self.page("2")], "_links": {}}))
+        ]
+        pages = self.client.get_pages("example.com", ["1", "2", "3"])
+        self.assertEqual(self.client.send.call_args_list[1].args[0].input.cursor, "abc")
+        self.assertEqual(list(pages), ["1", "2"], "Pages that were not found should be missing")
 
 class TestConfluenceClient(unittest.TestCase):
     def setUp(self):
@@ -104,9 +236,110 @@ class TestConfluenceClient(unittest.TestCase):
         class FakeCommand(ApiCommand):
             def __init__(self, input: FakeCommandInput):
                 super().__init__(input)
-            def execute(self, auth: HTTPBasicAuth) -> Response:
+            def execute(self, auth: HTTPBasicAuth, session: Session | None = None) -> Response:
+                self.session = session
                 return Response()
         input = FakeCommandInput("example.com")
         command = FakeCommand(input)
         response = self.client.send(command)
-        self.assertIsInstance(response, Response)
\ No newline at end of file
+        self.assertIsInstance(response, Response)
+        self.assertIs(command.session, self.client.session("example.com"), "Command should be sent with the domain's pooled session")
+    def test_send_metrics(self):
+        response = Response()
+        response._content = b"{}"
+        response.request = MagicMock(body='{"a": "\u00e9"}')
+        command = GetPageCommand(GetPageCommandInput("example.com", "1234567890"))
+        command.execute = MagicMock(return_value=response)
+        self.client.send(command)
+        self.assertEqual(self.client.metrics.spans["request.GetPageCommand"]["count"], 1)
+        self.assertEqual(self.client.metrics.counters, {"requests": 1, "request.bytes": 11, "response.bytes": 2})
+    def test_session_per_domain(self):
+        session = self.client.session("example.com")
+        self.assertIsInstance(session, ConfluenceSession)
+        self.assertIs(self.client.session("example.com"), session, "Session should be reused for the same domain")
+        self.assertIsNot(self.client.session("other.example.com"), session, "Each domain should have its own session")
+    def test_close(self):
+        with patch('src.api.ConfluenceSession.close') as mock_close:
+            with ConfluenceClient(auth) as client:
+                client.session("example.com")
+        mock_close.assert_called_once()
+        self.assertEqual(client.sessions, {}, "Sessions should be closed when leaving the context")
+
+class TestConfluenceClientSendEdit(unittest.TestCase):
+    def setUp(self):
+        self.client = ConfluenceClient(auth, max_conflict_retries=2, conflict_backoff=0)
+        self.client.send = MagicMock()
+        self.command = EditPageCommand(EditPageCommandInput("example.com", "1234567890", "current", "Title", "<p>mine</p>", 1))
+        latest_page = {"id": "1234567890", "status": "current", "title": "New Title", "body": {"storage": {"value": "<p>theirs</p>"}}, "version": {"number": 2}}
+        self.page_response = MagicMock(text=json.dumps(latest_page))
+    def test_no_conflict(self):
+        self.client.send.return_value = MagicMock(status_code=200)
+        response = self.client.send_edit(self.command, lambda body: body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.send.call_count, 1)
+        self.assertEqual(self.client.conflicts, 0)
+    def test_conflict(self):
+        self.client.send.side_effect = [MagicMock(status_code=409), self.page_response, MagicMock(status_code=200)]
+        response = self.client.send_edit(self.command, lambda body: body + "<p>mine</p>")
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(self.client.send.call_args_list[1].args[0], GetPageCommand, "Latest page should be fetched after a conflict")
+        self.assertEqual(self.command.input.body, "<p>theirs</p><p>mine</p>", "Edit should be rebased on the latest body")
+        self.assertEqual(self.command.input.version, 3)
+        self.assertEqual(self.command.input.title, "New Title")
+        self.assertEqual(self.client.conflicts, 1)
+    def test_bounded_retries(self):
+        self.client.send.side_effect = [MagicMock(status_code=409), self.page_response, MagicMock(status_code=409), self.page_response, MagicMock(status_code=409)]
+        response = self.client.send_edit(self.command, lambda body: body)
+        self.assertEqual(response.status_code, 409, "Last conflict should be returned once the retries are used up")
+        self.assertEqual(self.client.conflicts, 2)
+
+class TestConfluenceClientThrottling(unittest.TestCase):
+    def setUp(self):
+        self.client = ConfluenceClient(auth, max_throttle_retries=2, throttle_backoff=0)
+        self.command = GetPageCommand(GetPageCommandInput("example.com", "1234567890"))
+        self.command.execute = MagicMock()
+    def throttled(self, retry_after: str | None = None):
+        return MagicMock(status_code=429, headers={"Retry-After": retry_after} if retry_after else {})
+    def test_retry_after(self):
+        self.command.execute.side_effect = [self.throttled("0"), MagicMock(status_code=200)]
+        response = self.client.send(self.command)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.throttles, 1)
+        self.assertEqual(self.client.retries, 1)
+        self.assertEqual(self.client.rate_limiter.in_flight, 0, "Every request should be released")
+        self.assertLess(self.client.rate_limiter.limit, self.client.rate_limiter.max_concurrency, "Throttling should lower the concurrency limit")
+    def test_bounded_retries(self):
+        self.command.execute.side_effect = [self.throttled(), self.throttled(), self.throttled(), MagicMock(status_code=200)]
+        response = self.client.send(self.command)
+        self.assertEqual(response.status_code, 429, "Last throttled response should be returned once the retries are used up")
+        self.assertEqual(self.command.execute.call_count, 3)
+        self.assertEqual(self.client.retries, 2)
+    def test_error_releases(self):
+        self.command.execute.side_effect = ConnectionError()
+        with self.assertRaises(ConnectionError):
+            self.client.send(self.command)
+        self.assertEqual(self.client.rate_limiter.in_flight, 0)
+
+class TestRetryAfter(unittest.TestCase):
+    def test_seconds(self):
+        self.assertEqual(retry_after(MagicMock(headers={"Retry-After": "7"})), 7.0)
+    def test_http_date(self):
+        delay = retry_after(MagicMock(headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}))
+        self.assertEqual(delay, 0.0, "Dates in the past should not be waited for")
+    def test_missing_or_invalid(self):
+        self.assertIsNone(retry_after(MagicMock(headers={})))
+        self.assertIsNone(retry_after(MagicMock(headers={"Retry-After": "soon"})))
+
+class TestConfluenceSession(unittest.TestCase):
+    def test_init(self):
+        session = ConfluenceSession(pool_size=3, timeout=5)
+        adapter = session.get_adapter("https://example.com")
+        self.assertEqual(adapter._pool_maxsize, 3, "Pool size should be applied to HTTPS connections")
+        self.assertEqual(session.headers["Connection"], "keep-alive")
+    @patch('requests.Session.request')
+    def test_default_timeout(self, mock_request):
+        session = ConfluenceSession(timeout=5)
+        session.request("GET", "https://example.com")
+        mock_request.assert_called_with("GET", "https://example.com", timeout=5)
+        session.request("GET", "https://example.com", timeout=1)
+        mock_request.assert_called_with("GET", "https://example.com", timeout=1)
\ No newline at end of file
@@ -0,0 +1,130 @@
+import json
+import unittest
+import requests
+from src.batch import *
+from src.state import SyncRecord
+from unittest.mock import patch, mock_open, MagicMock
+
+url = "https://domain/wiki/spaces/aSpace/pages/1234567890/Page"
+
+class TestLoadManifest(unittest.TestCase):
+    def test_list(self):
+        manifest = json.dumps([{"filepath": "README.md", "url": url, "insert_start_text": "<p>start</p>", "insert_end_text": "<p>end</p>"}])
+        with patch('builtins.open', mock_open(read_data=manifest)):
+            mappings = load_manifest("manifest.json")
+        self.assertEqual(len(mappings), 1)
+        self.assertEqual(mappings[0].filepath, "README.md")
+        self.assertEqual(mappings[0].insert_end_text, "<p>end</p>")
+    def test_defaults(self):
+        manifest = json.dumps({
+            "defaults": {"insert_start_text": "<p>start</p>", "insert_end_text": "<p>end</p>"},
+            "pages": [{"filepath": "README.md", "url": url}, {"filepath": "CHANGELOG.md", "url": url, "insert_end_text": "<p>stop</p>"}]
+        })
+        with patch('builtins.open', mock_open(read_data=manifest)):
+            mappings = load_manifest("manifest.json")
+        self.assertEqual([mapping.insert_start_text for mapping in mappings], ["<p>start</p>", "<p>start</p>"])
+        self.assertEqual([mapping.insert_end_text for mapping in mappings], ["<p>end</p>", "<p>stop</p>"], "Entry values should override defaults")
+    def test_yaml(self):
+        manifest = "pages:\n  - filepath: README.md\n    url: " + url + "\n    insert_start_text: <p>start</p>\n    insert_end_text: <p>end</p>\n"
+        with patch('builtins.open', mock_open(read_data=manifest)):
+            mappings = load_manifest("manifest.yml")
+        self.assertEqual(mappings[0].url, url)
+    def test_split_size(self):
+        manifest = json.dumps({
+            "defaults": {"insert_start_text": "<p>start</p>", "insert_end_text": "<p>end</p>"},
+            "pages": [{"filepath": "README.md", "url": url}, {"filepath": "CHANGELOG.md", "url": url, "split_size": 500}]
+        })
+        with patch('builtins.open', mock_open(read_data=manifest)):
+            mappings = load_manifest("manifest.json", 100000)
+        self.assertEqual([mapping.split_size for mapping in mappings], [100000, 500], "Entries should override the split size")
+        with patch('builtins.open', mock_open(read_data=json.dumps([{"filepath": "README.md", "url": url, "insert_start_text": "a", "insert_end_text": "b", "split_size": "big"}]))):
+            with self.assertRaises(InvalidParameterError):
+                load_manifest("manifest.json")
+    def test_missing_value(self):
+        manifest = json.dumps([{"filepath": "README.md", "url": url, "insert_start_text": "<p>start</p>"}])
+        with patch('builtins.open', mock_open(read_data=manifest)):
+            with self.assertRaises(InvalidParameterError):
+                load_manifest("manifest.json")
+    def test_empty(self):
+        with patch('builtins.open', mock_open(read_data='{"pages": []}')):
+            with self.assertRaises(InvalidParameterError):
+                load_manifest("manifest.json")
+
+class TestRunBatch(unittest.TestCase):
+    @patch('src.batch.sync_sections')
+    def test_partial_failure(self, mock_sync_sections):
+        mappings = [SyncMapping(f"{name}.md", url.replace("1234567890", str(page_id)), "<p>start</p>", "<p>end</p>") for page_id, name in enumerate(["a", "b", "c"])]
+        def sync(client, mappings, state, converter, page):
+            if mappings[0].filepath == "b.md":
+                raise ValueError("failed")
+            return "unchanged"
+        mock_sync_sections.side_effect = sync
+        with self.assertLogs(level='INFO'):
+            results = run_batch(MagicMock(), mappings, max_workers=2)
+        self.assertEqual([result.mapping for result in results], mappings, "Results should be in manifest order")
+        self.assertEqual([result.success for result in results], [True, False, True], "Only the failing entry should fail")
+        self.assertIsInstance(results[1].error, ValueError)
+        self.assertEqual([result.status for result in results], ["unchanged", "failed", "unchanged"])
+
+    @patch('src.batch.sync_sections', return_value="updated")
+    def test_same_page_synced_together(self, mock_sync_sections):
+        mappings = [SyncMapping("a.md", url, "<p>a</p>", "<p>/a</p>"), SyncMapping("b.md", url.replace("1234567890", "1"), "<p>b</p>", "<p>/b</p>"), SyncMapping("c.md", url, "<p>c</p>", "<p>/c</p>")]
+        with self.assertLogs(level='INFO'):
+            results = run_batch(MagicMock(), mappings)
+        self.assertEqual(mock_sync_sections.call_count, 2, "Sections of the same page should be synced together")
+        self.assertEqual([result.mapping for result in results], mappings)
+
+    @patch('src.batch.unchanged_since_sync', side_effect=lambda mappings, state: mappings[0].filepath == "a.md")
+    @patch('src.batch.sync_sections', return_value="updated")
+    def test_skip_unchanged_files(self, mock_sync_sections, mock_unchanged_since_sync):
+        mappings = [SyncMapping("a.md", url, "<p>a</p>", "<p>/a</p>"), SyncMapping("b.md", url.replace("1234567890", "1"), "<p>b</p>", "<p>/b</p>")]
+        client = MagicMock()
+        with self.assertLogs(level='INFO'):
+            results = run_batch(client, mappings, state=SyncState(), skip_unchanged_files=True)
+        self.assertEqual([result.status for result in results], ["unchanged", "updated"])
+        self.assertEqual([call.args[1] for call in mock_sync_sections.call_args_list], [mappings[1:]], "Unchanged pages should not be synced")
+        self.assertEqual(client.get_pages.call_args.args[1], ["1"], "Unchanged pages should not be fetched")
+
+    @patch('src.batch.sync_sections', return_value="updated")
+    def test_prefetched_pages(self, mock_sync_sections):
+        client = MagicMock()
+        client.get_pages.return_value = {"1234567890": Page("1234567890", "current", "Title", "<p>body</p>", 1)}
+        with self.assertLogs(level='INFO'):
+            run_batch(client, [SyncMapping("a.md", url, "<p>a</p>", "<p>/a</p>")])
+        client.get_pages.assert_called_once()
+        self.assertIs(mock_sync_sections.call_args.args[4], client.get_pages.return_value["1234567890"], "Prefetched page should be passed to the sync")
+
+class TestPrefetchPages(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.get_pages.side_effect = lambda domain, page_ids, include_body: {page_id: Page(page_id, "current", "Title", "<p>body</p>" if include_body else None, 1) for page_id in page_ids}
+        self.groups = group_by_page([SyncMapping("a.md", url, "<p>a</p>", "<p>/a</p>"), SyncMapping("b.md", url.replace("1234567890", "1"), "<p>b</p>", "<p>/b</p>"), SyncMapping("c.md", "invalid", "<p>c</p>", "<p>/c</p>")])
+    def test_bodies(self):
+        pages = prefetch_pages(self.client, self.groups)
+        self.client.get_pages.assert_called_once_with("domain", ["1234567890", "1"], True)
+        self.assertEqual(set(pages), {("domain", "1234567890"), ("domain", "1")})
+    def test_recorded_pages_without_body(self):
+        state = SyncState()
+        state.set(self.groups[0][0].key, SyncRecord("1234567890", 1, "source", "rendered"))
+        pages = prefetch_pages(self.client, self.groups, state)
+        self.assertIsNone(pages[("domain", "1234567890")].body, "Pages synced before should only be fetched for their version")
+        self.assertEqual(pages[("domain", "1")].body, "<p>body</p>")
+    def test_failure(self):
+        self.client.get_pages.side_effect = requests.HTTPError("400 Client Error")
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual(prefetch_pages(self.client, self.groups), {}, "Pages should be fetched by their sync if the bulk request fails")
+
+class TestGroupByPage(unittest.TestCase):
+    def test_group(self):
+        mappings = [SyncMapping("a.md", url, "<p>a</p>", "<p>/a</p>"), SyncMapping("b.md", "invalid", "<p>b</p>", "<p>/b</p>"), SyncMapping("c.md", url, "<p>c</p>", "<p>/c</p>"), SyncMapping("d.md", "invalid", "<p>d</p>", "<p>/d</p>")]
+        groups = group_by_page(mappings)
+        self.assertEqual([[mapping.filepath for mapping in group] for group in groups], [["a.md", "c.md"], ["b.md"], ["d.md"]], "Invalid urls should not be grouped")
+
+class TestSummarizeResults(unittest.TestCase):
+    def test_summarize(self):
+        mapping = SyncMapping("README.md", url, "<p>start</p>", "<p>end</p>")
+        summary = json.loads(summarize_results([SyncResult(mapping, "updated"), SyncResult(mapping, error=ValueError("bad"))]))
+        self.assertEqual(summary, [
+            {"filepath": "README.md", "url": url, "status": "updated", "error": None},
+            {"filepath": "README.md", "url": url, "status": "failed", "error": "bad"}
+        ])
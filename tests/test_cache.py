@@ -0,0 +1,44 @@
+import os
+import tempfile
+import time
+import unittest
+from src.cache import *
+from unittest.mock import patch
+
+class TestConversionCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ConversionCache(os.path.join(self.directory.name, "cache"), max_bytes=10)
+    def tearDown(self):
+        self.directory.cleanup()
+    def test_get_and_put(self):
+        self.assertIsNone(self.cache.get("a"), "Missing entry should not be found")
+        self.cache.put("a", "<p>a</p>")
+        self.assertEqual(self.cache.get("a"), "<p>a</p>")
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "evictions": 0})
+    def test_evicts_least_recently_used(self):
+        self.cache.put("a", "aaaa")
+        self.cache.put("b", "bbbb")
+        # mark a as used after b, so b is the least recently used entry
+        past = time.time() - 10
+        os.utime(os.path.join(self.cache.directory, "b.html"), (past, past))
+        self.cache.get("a")
+        self.cache.put("c", "cccc")
+        self.assertIsNone(self.cache.get("b"), "Least recently used entry should be evicted")
+        self.assertEqual(self.cache.get("a"), "aaaa")
+        self.assertEqual(self.cache.get("c"), "cccc")
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+    def test_put_does_not_scan(self):
+        cache = ConversionCache(os.path.join(self.directory.name, "large"))
+        with patch('os.scandir', wraps=os.scandir) as mock_scandir:
+            for index in range(20):
+                cache.put(str(index), "text")
+        self.assertEqual(mock_scandir.call_count, 1, "The directory should only be scanned by the first put")
+    def test_evicts_below_maximum(self):
+        for key in "abcd":
+            self.cache.put(key, "aaa")
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+        # the cache is left below its maximum size, so the next entry fits without scanning the directory again
+        with patch('os.scandir', wraps=os.scandir) as mock_scandir:
+            self.cache.put("e", "a")
+        mock_scandir.assert_not_called()
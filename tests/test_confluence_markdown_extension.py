@@ -2,26 +2,27 @@ import unittest
 from src.confluence_markdown_extension import *
 from unittest.mock import patch
 
-class TestSectionLinkPreprocessor(unittest.TestCase):
+class TestCodeBlockTreeprocessor(unittest.TestCase):
+    def convert(self, text: str, **config) -> str:
+        return Markdown(extensions=['fenced_code', ConfluenceExtension(**config)]).convert(text)
     def test_run(self):
-        lines: list[str] = [
-            " - [How to debug](##How-to-debug)",
-            "  - [Deploy the app](###header3)",
-            "- [Header](#header1)"
-        ]
-        processed_lines = SectionLinkPreprocessor().run(lines)
-        self.assertEqual(processed_lines, [
-            " - [How to debug](#How-to-debug)",
-            "  - [Deploy the app](#header3)",
-            "- [Header](#header1)"
-        ])
-class TestCodeBlockPostprocessor(unittest.TestCase):
-    def setUp(self):
-        self.postprocessor = CodeBlockPostprocessor()
-    def test_run(self):
-        text = "<pre><code class=\"language-shell\">ping github.com/gabesw</code></pre>"
-        processed_text = self.postprocessor.run(text)
-        self.assertEqual(processed_text, "<ac:structured-macro ac:name=\"code\"><ac:parameter ac:name=\"language\">shell</ac:parameter><ac:plain-text-body><![CDATA[ping github.com/gabesw]]></ac:plain-text-body></ac:structured-macro>")
+        text = "```shell\nping github.com/gabesw\n```"
+        self.assertEqual(self.convert(text), "<ac:structured-macro ac:name=\"code\"><ac:parameter ac:name=\"language\">shell</ac:parameter><ac:plain-text-body><![CDATA[ping github.com/gabesw]]></ac:plain-text-body></ac:structured-macro>")
+    def test_language_alias(self):
+        self.assertIn("<ac:parameter ac:name=\"language\">shell</ac:parameter>", self.convert("```bash\nls\n```"))
+        self.assertIn("<ac:parameter ac:name=\"language\">javascript</ac:parameter>", self.convert("```JS\nlet a\n```"), "Aliases should ignore case")
+        self.assertIn("<ac:parameter ac:name=\"language\">go</ac:parameter>", self.convert("```go\nfunc\n```"), "Languages without an alias should be kept")
+    def test_configured_aliases(self):
+        self.assertIn("<ac:parameter ac:name=\"language\">bash</ac:parameter>", self.convert("```bash\nls\n```", language_aliases={}))
+    def test_no_language(self):
+        self.assertEqual(self.convert("```\nplain\n```"), "<ac:structured-macro ac:name=\"code\"><ac:plain-text-body><![CDATA[plain]]></ac:plain-text-body></ac:structured-macro>")
+    def test_indented_code_block(self):
+        self.assertEqual(self.convert("text\n\n    indented\n"), "<p>text</p>\n<ac:structured-macro ac:name=\"code\"><ac:plain-text-body><![CDATA[indented]]></ac:plain-text-body></ac:structured-macro>")
+    def test_html_not_escaped(self):
+        self.assertIn("<![CDATA[<div class=\"a\">&amp;</div>]]>", self.convert("```html\n<div class=\"a\">&amp;</div>\n```"))
+        self.assertIn("<![CDATA[<b> & c]]>", self.convert("    <b> & c\n"))
+    def test_cdata_terminator(self):
+        self.assertIn("<![CDATA[a]]]]><![CDATA[>b]]>", self.convert("```\na]]>b\n```"))
 
 class TestConfluenceExtension(unittest.TestCase):
     def test_extend_markdown(self):
@@ -29,8 +30,7 @@ class TestConfluenceExtension(unittest.TestCase):
         confluence_extension = ConfluenceExtension()
         confluence_extension.extendMarkdown(md)
         self.assertTrue(confluence_extension in md.registeredExtensions, "Extension is registered")
-        self.assertTrue('confluence_section_links' in md.preprocessors, "Section links preprocessor is registered")
-        self.assertTrue('confluence_code_block' in md.postprocessors, "Code block postprocessor is registered")
+        self.assertTrue('confluence_code_block' in md.treeprocessors, "Code block treeprocessor is registered")
 
 class TestMakeExtension(unittest.TestCase):
     def test_make_extension(self):
@@ -0,0 +1,234 @@
+import os
+import random
+import tempfile
+import threading
+import unittest
+import markdown
+import src.converter
+from src.converter import *
+from src.confluence_markdown_extension import ConfluenceExtension
+from src.metrics import Metrics
+from src.profiling import ConversionProfiler
+from unittest.mock import patch
+
+class TestMarkdownExtensions(unittest.TestCase):
+    def test_extensions(self):
+        extensions = markdown_extensions()
+        self.assertEqual(extensions[:-1], EXTENSION_NAMES)
+        self.assertIsInstance(extensions[-1], ConfluenceExtension)
+
+class TestConversionFingerprint(unittest.TestCase):
+    def test_stable(self):
+        self.assertEqual(conversion_fingerprint(), conversion_fingerprint())
+
+document = """Intro with [a link][ref] and [duplicate][d].
+
+# Heading one
+
+Text [later][later] here.
+- list
+- items
+
+    indented # code
+
+## Heading two
+```bash
+# not a heading
+echo hi
+```
+
+<div>
+# inside html
+
+text
+</div>
+
+# Heading three
+
+| a | b |
+|---|---|
+| 1 | 2 |
+
+[d]: http://first
+[ref]: http://ref "Title"
+
+<!-- comment
+
+# in comment
+-->
+
+# Heading four
+> quote
+continued
+# Heading five
+[later]: http://later
+[d]: http://second
+"""
+
+# reference definitions inside a blockquote or a list item, which apply to the links of the other sections
+nested_definitions = [
+    "> [a]: http://x\n\n# H\n\n[link][a]\n",
+    "- item\n\n    [a]: http://x\n\n# H\n\n[link][a]\n",
+]
+
+# reference definitions whose title is on the next line
+title_definitions = [
+    '[a]: http://e.com\n    "Title here"\n\n# H\n\n[x][a]\n',
+    "[a]: http://e.com\n(Title)\n\n# H\n\n[x][a]\n",
+]
+
+class TestSplitSections(unittest.TestCase):
+    def test_split(self):
+        sections, definitions = split_sections(document)
+        self.assertEqual([section.splitlines()[0] for section in sections], ["Intro with [a link][ref] and [duplicate][d].", "# Heading one", "## Heading two", "# Heading three", "# Heading four"], "Headings in code, HTML, comments or right after text should not split")
+        self.assertEqual(definitions, ["[d]: http://first", "[ref]: http://ref \"Title\"", "[later]: http://later", "[d]: http://second"])
+    def test_unclosed_fence(self):
+        self.assertIsNone(split_sections("# a\n\n```\ncode\n\n# b\n"))
+    def test_multiline_definition(self):
+        self.assertIsNone(split_sections("# a\n\n[ref]:\n    http://ref\n\n# b\n"))
+    def test_title_on_next_line(self):
+        sections, definitions = split_sections(title_definitions[0])
+        self.assertEqual(definitions, ['[a]: http://e.com\n    "Title here"'], "The title should be collected with its definition")
+    def test_nested_definition(self):
+        for text in nested_definitions:
+            self.assertIsNone(split_sections(text), f"Definitions that are not at the top level should not split:\n{text}")
+
+class TestConvertMarkdownParallel(unittest.TestCase):
+    def test_same_as_serial(self):
+        for text in [document * 5, "# only one section\n", "no headings\n\ntext", *nested_definitions, *title_definitions]:
+            self.assertEqual(convert_markdown_parallel(text, 2), markdown.markdown(text, extensions=markdown_extensions()))
+    def test_section_links(self):
+        text = "[last](##section-99)\n\n" + "".join(f"# Section {index}\n\ntext\n\n" for index in range(100))
+        with patch('src.converter.PARALLEL_MIN_SIZE', 1):
+            self.assertIn('<a href="#Section-99">last</a>', convert_markdown(text, workers=2), "Links to sections in other chunks should be resolved")
+    @patch('src.converter.convert_markdown_parallel', return_value="<p>parallel</p>")
+    def test_threshold(self, mock_convert_markdown_parallel):
+        self.assertEqual(convert_markdown("# hi", workers=2), "<h1>hi</h1>", "Small documents should be converted serially")
+        with patch('src.converter.PARALLEL_MIN_SIZE', 1):
+            self.assertEqual(convert_markdown("# hi", workers=2), "<p>parallel</p>")
+            self.assertEqual(convert_markdown("# hi", workers=1), "<h1>hi</h1>")
+
+class TestConvertMarkdownIncremental(unittest.TestCase):
+    sections = [
+        "# Install\n\nRun the [installer][install] and see the [guide][].",
+        "## Usage\n\n```bash\n# not a heading\nsync --all\n```\n\n    indented <code>",
+        "# Tables\n\n| a | b |\n|---|---|\n| 1 | 2 |",
+        "## Lists\n\n- one\n- two\n\n  nested paragraph\n\n1. first\n2. second",
+        "# HTML\n\n<div>\n# inside html\n\ntext\n</div>",
+        "## Quotes\n\n> quoted\ncontinued\n# heading right after text",
+        "# References\n\n[install]: http://install\n[guide]: http://guide \"Guide\"",
+        "## Comment\n\n<!-- a comment\n\n# in the comment\n-->\n\nAfter the comment with a [link](##Install).",
+        "# Redefined\n\n[install]: http://other-install",
+    ]
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ConversionCache(self.directory.name)
+    def tearDown(self):
+        self.directory.cleanup()
+    def assertSameAsFull(self, text: str):
+        self.assertEqual(convert_markdown_incremental(text, self.cache), markdown.markdown(text, extensions=markdown_extensions()), f"Incremental conversion should match full conversion of:\n{text}")
+    def test_reuses_unchanged_sections(self):
+        text = "\n\n".join(self.sections)
+        self.assertSameAsFull(text)
+        misses = self.cache.stats()["misses"]
+        changed = text.replace("quoted", "requoted")
+        with patch('src.converter._convert_chunks', wraps=src.converter._convert_chunks) as mock_convert_chunks:
+            self.assertSameAsFull(changed)
+        self.assertEqual(mock_convert_chunks.call_args.args[0], ["## Quotes\n\n> requoted\ncontinued\n# heading right after text\n"], "Only the changed section should be converted")
+        self.assertEqual(self.cache.stats()["misses"] - misses, 1)
+    def test_nested_definition(self):
+        for text in [*nested_definitions, *title_definitions]:
+            self.assertSameAsFull(text)
+    def test_last_section_removed(self):
+        self.assertSameAsFull("\n\n".join(self.sections))
+        self.assertSameAsFull("\n\n".join(self.sections[:-1]))
+    def test_random_edits(self):
+        generator = random.Random(1234)
+        document = list(self.sections)
+        for _ in range(40):
+            edit = generator.choice(["insert", "delete", "modify", "swap"])
+            index = generator.randrange(len(document))
+            if edit == "insert":
+                document.insert(index, generator.choice(self.sections))
+            elif edit == "delete" and len(document) > 1:
+                document.pop(index)
+            elif edit == "modify":
+                document[index] = document[index].replace("\n\n", f"\n\nEdited {generator.randrange(100)} text.\n\n", 1)
+            else:
+                other = generator.randrange(len(document))
+                document[index], document[other] = document[other], document[index]
+            self.assertSameAsFull("\n\n".join(document))
+    @patch('src.converter.convert_markdown_incremental', return_value="<p>incremental</p>")
+    def test_enabled_by_converter(self, mock_convert_markdown_incremental):
+        self.assertEqual(MarkdownConverter(self.cache, incremental=True).convert("# hi"), "<p>incremental</p>")
+        self.assertEqual(MarkdownConverter(incremental=True).convert("# hi"), "<h1>hi</h1>", "Incremental conversion should need a cache")
+
+class TestConvertMarkdown(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ConversionCache(self.directory.name)
+    def tearDown(self):
+        self.directory.cleanup()
+    def test_convert(self):
+        self.assertEqual(convert_markdown("# hi"), "<h1>hi</h1>")
+    def test_cache(self):
+        self.assertEqual(convert_markdown("# hi", self.cache), "<h1>hi</h1>")
+        with patch('src.converter.render_markdown') as mock_render_markdown:
+            self.assertEqual(convert_markdown("# hi", self.cache), "<h1>hi</h1>")
+        mock_render_markdown.assert_not_called()
+        self.assertEqual(self.cache.stats()["hits"], 1)
+    def test_cache_keyed_by_fingerprint(self):
+        convert_markdown("# hi", self.cache)
+        with patch('src.converter.conversion_fingerprint', return_value="other"):
+            convert_markdown("# hi", self.cache)
+        self.assertEqual(self.cache.stats()["misses"], 2, "Changing the conversion settings should miss the cache")
+
+class TestRenderMarkdown(unittest.TestCase):
+    def test_metrics(self):
+        metrics = Metrics()
+        md_text = "# hi\n\n```py\nx\n```\n\n[link](##hi)"
+        self.assertEqual(render_markdown(md_text, metrics), render_markdown(md_text), "Timing the processors should not change the output")
+        for name in ("convert.preprocessor.normalize_whitespace", "convert.treeprocessor.confluence_code_block", "convert.treeprocessor.inline", "convert.postprocessor.raw_html", "convert.block_parser"):
+            self.assertEqual(metrics.spans[name]["count"], 1, f"{name} should be timed")
+
+class TestConversionEngine(unittest.TestCase):
+    def setUp(self):
+        self.engine = ConversionEngine()
+    def test_reused_instance(self):
+        self.assertIs(self.engine.markdown(), self.engine.markdown(), "A thread should reuse its markdown instance")
+        self.assertEqual(self.engine.convert("[a][ref]\n\n[ref]: https://example.com"), '<p><a href="https://example.com">a</a></p>')
+        self.assertEqual(self.engine.convert("[a][ref]"), "<p>[a][ref]</p>", "No state of a conversion should be left for the next one")
+    def test_instance_per_thread(self):
+        other: list = []
+        thread = threading.Thread(target=lambda: other.append(self.engine.markdown()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], self.engine.markdown(), "Every thread should have its own markdown instance")
+    def test_convert_many(self):
+        md_texts = ["# one\n\n[a][ref]\n\n[ref]: https://example.com", "[a][ref]", "```py\nx\n```"]
+        self.assertEqual(self.engine.convert_many(md_texts), [markdown.markdown(md_text, extensions=markdown_extensions()) for md_text in md_texts])
+    def test_metrics(self):
+        metrics = Metrics()
+        engine = ConversionEngine(metrics)
+        engine.convert_many(["# one", "# two"])
+        self.assertEqual(metrics.spans["convert.block_parser"]["count"], 2, "Every conversion should be timed")
+        self.assertEqual(engine.link_sections('<h1>One</h1><a href="##one">'), '<h1>One</h1><a href="#One">')
+        self.assertEqual(metrics.spans["convert.section_links"]["count"], 1, "Resolving section links should be timed")
+
+class TestMarkdownConverter(unittest.TestCase):
+    def test_convert(self):
+        with tempfile.TemporaryDirectory() as directory:
+            converter = MarkdownConverter(ConversionCache(directory))
+            self.assertEqual(converter.convert("# hi"), "<h1>hi</h1>")
+            self.assertEqual(converter.cache.stats()["misses"], 1)
+    def test_metrics(self):
+        metrics = Metrics()
+        self.assertEqual(MarkdownConverter(metrics=metrics).convert("# One\n\n[a](#one)"), '<h1>One</h1>\n<p><a href="#One">a</a></p>')
+        self.assertEqual(metrics.spans["convert.section_links"]["count"], 1, "Resolving section links should be timed")
+    def test_profiler(self):
+        with tempfile.TemporaryDirectory() as directory:
+            converter = MarkdownConverter(ConversionCache(directory), profiler=ConversionProfiler())
+            self.assertEqual(converter.convert("# hi"), "<h1>hi</h1>")
+            self.assertEqual(converter.profiler.conversions, 1)
+            self.assertIn("convert.section_links", converter.profiler.processor_times(), "Resolving section links should be profiled by name")
+            self.assertEqual(converter.cache.stats()["misses"], 0, "Profiled conversions should not use the cache")
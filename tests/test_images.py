@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+import unittest
+from src.images import *
+from src.api import ConfluenceClient, GetAttachmentsCommand, UploadAttachmentCommand
+from requests.auth import HTTPBasicAuth
+from unittest.mock import MagicMock
+
+class ImageDirectoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.previous_directory = os.getcwd()
+        os.chdir(self.directory.name)
+        os.makedirs("docs/img")
+        os.makedirs("img")
+        for path, content in [("docs/img/diagram.png", b"diagram"), ("img/logo.png", b"logo"), ("docs/img/logo.png", b"other logo")]:
+            with open(path, 'wb') as f:
+                f.write(content)
+    def tearDown(self):
+        os.chdir(self.previous_directory)
+        self.directory.cleanup()
+
+class TestFindLocalImages(ImageDirectoryTestCase):
+    def test_find(self):
+        html = '<p><img alt="a" src="img/diagram.png" /><img src="/img/logo.png"><img src="https://example.com/a.png" /><img src="data:image/png;base64,AA==" /></p>'
+        self.assertEqual(find_local_images(html, "docs/README.md"), {
+            "img/diagram.png": os.path.join("docs", "img", "diagram.png"),
+            "/img/logo.png": os.path.join("img", "logo.png")
+        })
+    def test_outside_repository(self):
+        outside = tempfile.TemporaryDirectory()
+        self.addCleanup(outside.cleanup)
+        secret = os.path.join(outside.name, "secret.png")
+        with open(secret, 'wb') as f:
+            f.write(b"secret")
+        os.symlink(secret, "img/link.png")
+        relative = os.path.relpath(secret, "docs")
+        html = f'<img src="{relative}" /><img src="/{os.path.relpath(secret)}" /><img src="../img/link.png" /><img src="../../img/logo.png" />'
+        with self.assertLogs(level="WARNING") as cm:
+            self.assertEqual(find_local_images(html, "docs/README.md"), {}, "Images outside of the repository should not be uploaded")
+        self.assertEqual(len(cm.output), 4)
+        self.assertIn("is outside of the repository", cm.output[0])
+    def test_quoted_source(self):
+        os.rename("docs/img/diagram.png", "docs/img/my diagram.png")
+        self.assertEqual(find_local_images('<img src="img/my%20diagram.png" />', "docs/README.md"), {"img/my%20diagram.png": os.path.join("docs", "img", "my diagram.png")})
+    def test_missing(self):
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual(find_local_images('<img src="missing.png" />', "README.md"), {})
+
+class TestAttachmentNames(unittest.TestCase):
+    def test_unique(self):
+        self.assertEqual(attachment_names(["docs/a.png", "b.png"]), {"docs/a.png": "a.png", "b.png": "b.png"})
+    def test_shared_name(self):
+        names = attachment_names(["docs/logo.png", "logo.png"])
+        self.assertEqual(len(set(names.values())), 2, "Different files with the same name should get different attachments")
+        self.assertTrue(all(name.endswith("-logo.png") for name in names.values()))
+
+class TestToAttachmentMarkup(unittest.TestCase):
+    def test_replace(self):
+        html = '<p><img alt="A &amp; B" src="a.png" title="T" width="100" /> <img src="https://example.com/b.png" /></p>'
+        self.assertEqual(
+            to_attachment_markup(html, {"a.png": "a.png"}),
+            '<p><ac:image ac:alt="A &amp; B" ac:title="T" ac:width="100"><ri:attachment ri:filename="a.png" /></ac:image> <img src="https://example.com/b.png" /></p>'
+        )
+
+class TestReplaceLocalImages(ImageDirectoryTestCase):
+    def test_replace(self):
+        htmls, images = replace_local_images(['<img src="img/logo.png" />', '<img src="img/logo.png" /><p>text</p>'], ["docs/README.md", "README.md"])
+        names = {image.path: image.name for image in images}
+        self.assertEqual(len(set(names.values())), 2, "Images of different sections should not share an attachment name")
+        self.assertEqual(htmls[0], f'<ac:image><ri:attachment ri:filename="{names[os.path.join("docs", "img", "logo.png")]}" /></ac:image>')
+        self.assertEqual(htmls[1], f'<ac:image><ri:attachment ri:filename="{names[os.path.join("img", "logo.png")]}" /></ac:image><p>text</p>')
+    def test_no_images(self):
+        self.assertEqual(replace_local_images(["<p>text</p>"], ["README.md"]), (["<p>text</p>"], []))
+    def test_code_block(self):
+        from src.converter import render_markdown
+        html = render_markdown('```html\n<img src="img/logo.png" alt="Logo">\n```')
+        self.assertEqual(replace_local_images([html], ["README.md"]), ([html], []), "Images in code blocks should not be uploaded or replaced")
+
+class TestUploadImages(unittest.TestCase):
+    def setUp(self):
+        self.client = ConfluenceClient(HTTPBasicAuth("username", "token"))
+        self.client.send = MagicMock()
+        self.unchanged = LocalImage("img/a.png", "a.png", b"a")
+        self.changed = LocalImage("img/b.png", "b.png", b"b")
+        self.new = LocalImage("img/c.png", "c.png", b"c")
+    def attachments(self, attachments: list[dict], next_link: str | None = None):
+        return MagicMock(text=json.dumps({"results": attachments, "_links": {"next": next_link} if next_link else {}}))
+    def test_upload(self):
+        self.client.send.side_effect = [
+            self.attachments([{"title": "a.png", "comment": self.unchanged.comment}], "/wiki/api/v2/pages/1/attachments?cursor=next"),
+            self.attachments([{"title": "b.png", "comment": "old"}]),
+            MagicMock(),
+            MagicMock()
+        ]
+        uploaded = upload_images(self.client, "example.com", "1", [self.unchanged, self.changed, self.new])
+        self.assertEqual(uploaded, 2, "Images whose attachment has the same content should not be uploaded")
+        commands = [call.args[0] for call in self.client.send.call_args_list]
+        self.assertEqual(commands[1].input.cursor, "next", "Every page of attachments should be listed")
+        self.assertEqual(sorted(command.input.filename for command in commands[2:] if isinstance(command, UploadAttachmentCommand)), ["b.png", "c.png"])
+        self.assertEqual(commands[2].input.media_type, "image/png")
+    def test_upload_error(self):
+        self.client.send.side_effect = [self.attachments([]), MagicMock(raise_for_status=MagicMock(side_effect=ValueError()))]
+        with self.assertRaises(ValueError):
+            upload_images(self.client, "example.com", "1", [self.new])
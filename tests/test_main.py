@@ -1,9 +1,12 @@
 import os
+import subprocess
+import sys
 import unittest
 from unittest.mock import patch, mock_open
 from main import main
-from src.errors import InvalidParameterError, ConfluenceApiError, SubstringNotFoundError
+from src.errors import InvalidParameterError, ConfluenceApiError, SubstringNotFoundError, BatchSyncError
 from markdown import markdown
+from src.sync import SyncMapping, SyncResult
 
 @patch('src.utils.extract_domain_and_page_id')
 @patch('src.api.ConfluenceClient.send')
@@ -25,6 +28,7 @@ class TestMain(unittest.TestCase):
         mock_extract_domain_and_page_id.return_value = ("domain", "1234567890")
         get_page_text = """
         {
+            "id": "1234567890",
             "status": 200,
             "title": "Some Title",
             "body": {
@@ -43,11 +47,13 @@ class TestMain(unittest.TestCase):
         mock_markdown.return_value = "<h1>hi</h1>"
         with self.assertLogs(level='INFO') as cm:
             with patch('builtins.open', mock_open(read_data='#hi')) as open:
-                main()
+                with patch('main.set_output') as mock_set_output:
+                    main()
+        mock_set_output.assert_called_with("status", "updated")
         self.assertEqual(cm.output, [
             'INFO:root:Starting README sync...',
-            'INFO:root:Getting confluence page content.',
             'INFO:root:Reading markdown file.',
+            'INFO:root:Getting confluence page content.',
             'INFO:root:Converting markdown file.',
             'INFO:root:Updating confluence page.',
             'INFO:root:Sync successful!'
@@ -60,4 +66,97 @@ class TestMain(unittest.TestCase):
         self.assertEqual(cm.output, [
            'INFO:root:Starting README sync...',
         ])
-#TODO: add tests for ConfluenceApiError and SubstringNotFoundError
\ No newline at end of file
+    @patch.dict(os.environ, {
+        "INPUT_MANIFEST": "manifest.json",
+        "INPUT_TOKEN": "aksh74HLKF7hiu78P1VSKAB7",
+        "INPUT_USERNAME": "gabesw@example.com",
+    }, clear=True)
+    @patch('src.batch.run_batch')
+    @patch('src.batch.load_manifest')
+    def test_main_batch_failure(self, mock_load_manifest, mock_run_batch, mock_markdown, mock_edit_page_command_input, mock_edit_page_command, mock_get_page_command_input, mock_get_page_command, mock_confluence_client_send, mock_extract_domain_and_page_id):
+        mappings = [SyncMapping(f"{name}.md", "https://domain/wiki/spaces/aSpace/pages/1234567890/Gabesw", "<p>start</p>", "<p>end</p>") for name in ["a", "b"]]
+        mock_load_manifest.return_value = mappings
+        mock_run_batch.return_value = [SyncResult(mappings[0]), SyncResult(mappings[1], error=ValueError())]
+        with self.assertLogs(level='INFO'):
+            with self.assertRaises(BatchSyncError):
+                main()
+        mock_load_manifest.assert_called_with("manifest.json", None)
+        self.assertEqual(mock_run_batch.call_args.args[2], 4, "Should default to 4 workers")
+    @patch.dict(os.environ, {
+        "INPUT_MANIFEST": "manifest.json",
+        "INPUT_TOKEN": "aksh74HLKF7hiu78P1VSKAB7",
+        "INPUT_USERNAME": "gabesw@example.com",
+        "INPUT_MAX_WORKERS": "0",
+    }, clear=True)
+    def test_main_batch_bad_max_workers(self, mock_markdown, mock_edit_page_command_input, mock_edit_page_command, mock_get_page_command_input, mock_get_page_command, mock_confluence_client_send, mock_extract_domain_and_page_id):
+        with self.assertLogs(level='INFO'):
+            with self.assertRaises(InvalidParameterError):
+                main()
+    @patch.dict(os.environ, {
+        "INPUT_FILEPATH": "gabesw.md",
+        "INPUT_URL": "https://domain/wiki/spaces/aSpace/pages/1234567890/Gabesw",
+        "INPUT_TOKEN": "aksh74HLKF7hiu78P1VSKAB7",
+        "INPUT_USERNAME": "gabesw@example.com",
+        "INPUT_INSERT_START_TEXT": "<p>start</p>",
+        "INPUT_INSERT_END_TEXT": "<p>end</p>",
+        "INPUT_INCREMENTAL": "true"
+    }, clear=True)
+    def test_main_incremental_without_cache(self, mock_markdown, mock_edit_page_command_input, mock_edit_page_command, mock_get_page_command_input, mock_get_page_command, mock_confluence_client_send, mock_extract_domain_and_page_id):
+        with self.assertLogs(level='INFO'):
+            with self.assertRaises(InvalidParameterError):
+                main()
+    @patch.dict(os.environ, {
+        "INPUT_FILEPATH": "README.md",
+        "INPUT_URL": "https://domain/wiki/spaces/aSpace/pages/1234567890/Gabesw",
+        "INPUT_TOKEN": "aksh74HLKF7hiu78P1VSKAB7",
+        "INPUT_USERNAME": "gabesw@example.com",
+        "INPUT_INSERT_START_TEXT": "<p>start</p>",
+        "INPUT_INSERT_END_TEXT": "<p>end</p>",
+        "INPUT_SKIP_UNCHANGED_FILES": "true"
+    }, clear=True)
+    def test_main_skip_unchanged_files_without_state(self, mock_markdown, mock_edit_page_command_input, mock_edit_page_command, mock_get_page_command_input, mock_get_page_command, mock_confluence_client_send, mock_extract_domain_and_page_id):
+        with self.assertLogs(level='INFO'):
+            with self.assertRaises(InvalidParameterError):
+                main()
+    @patch.dict(os.environ, {
+        "INPUT_DIRECTORY": "docs",
+        "INPUT_URL": "https://domain/wiki/spaces/aSpace/pages/1234567890/Gabesw",
+        "INPUT_TOKEN": "aksh74HLKF7hiu78P1VSKAB7",
+        "INPUT_USERNAME": "gabesw@example.com",
+    }, clear=True)
+    @patch('src.tree.sync_tree')
+    @patch('os.path.isdir', return_value=True)
+    def test_main_tree(self, mock_isdir, mock_sync_tree, mock_markdown, mock_edit_page_command_input, mock_edit_page_command, mock_get_page_command_input, mock_get_page_command, mock_confluence_client_send, mock_extract_domain_and_page_id):
+        mapping = SyncMapping("docs/a.md", "https://domain/wiki/spaces/aSpace/pages/1/A", "", "")
+        mock_sync_tree.return_value = [SyncResult(mapping, "created")]
+        with self.assertLogs(level='INFO'):
+            with patch('main.set_output') as mock_set_output:
+                main()
+        self.assertEqual(mock_sync_tree.call_args.args[1:3], ("docs", "https://domain/wiki/spaces/aSpace/pages/1234567890/Gabesw"))
+        mock_set_output.assert_called_with("status", "updated")
+    @patch.dict(os.environ, {
+        "INPUT_FILEPATH": "README.md",
+        "INPUT_URL": "https://domain/wiki/spaces/aSpace/pages/1234567890/Gabesw",
+        "INPUT_TOKEN": "aksh74HLKF7hiu78P1VSKAB7",
+        "INPUT_USERNAME": "gabesw@example.com",
+        "INPUT_INSERT_START_TEXT": "<p>start</p>",
+        "INPUT_INSERT_END_TEXT": "<p>end</p>",
+        "INPUT_WATCH": "true",
+        "INPUT_WATCH_DEBOUNCE_MS": "500"
+    }, clear=True)
+    @patch('src.watch.Watcher')
+    def test_main_watch(self, mock_watcher, mock_markdown, mock_edit_page_command_input, mock_edit_page_command, mock_get_page_command_input, mock_get_page_command, mock_confluence_client_send, mock_extract_domain_and_page_id):
+        mock_watcher.return_value.run.side_effect = KeyboardInterrupt
+        with self.assertLogs(level='INFO') as cm:
+            main()
+        self.assertEqual([mapping.filepath for mapping in mock_watcher.call_args.args[1]], ["README.md"])
+        self.assertEqual(mock_watcher.call_args.kwargs["debounce"], 0.5)
+        self.assertIn('INFO:root:Stopped watching.', cm.output)
+#TODO: add tests for ConfluenceApiError and SubstringNotFoundError
+
+class TestImports(unittest.TestCase):
+    def test_lazy_imports(self):
+        # a new interpreter, as the tests have already imported every module
+        modules = subprocess.run([sys.executable, "-c", "import sys, main; print(' '.join(sorted(sys.modules)))"], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), capture_output=True, text=True, check=True).stdout.split()
+        for module in ("requests", "markdown", "dotenv", "src.api", "src.converter"):
+            self.assertNotIn(module, modules, f"{module} should only be imported by the runs that use it")
@@ -0,0 +1,37 @@
+import json
+import unittest
+from src.metrics import Metrics
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+    def test_span(self):
+        with self.metrics.span("sync.convert"):
+            pass
+        with self.assertRaises(ValueError):
+            with self.metrics.span("sync.convert"):
+                raise ValueError()
+        self.assertEqual(self.metrics.spans["sync.convert"]["count"], 2, "Spans should be recorded even if the code raises")
+    def test_record(self):
+        self.metrics.record("sync.splice", 0.25)
+        self.metrics.record("sync.splice", 0.5)
+        self.assertEqual(self.metrics.spans["sync.splice"], {"count": 2, "seconds": 0.75})
+    def test_increment(self):
+        self.metrics.increment("requests")
+        self.metrics.increment("requests", 2)
+        self.assertEqual(self.metrics.counters["requests"], 3)
+    def test_to_json(self):
+        self.metrics.record("b", 0.1234567)
+        self.metrics.record("a", 1)
+        self.metrics.increment("requests")
+        metrics = json.loads(self.metrics.to_json())
+        self.assertEqual(list(metrics["spans"]), ["a", "b"], "Spans should be sorted by name")
+        self.assertEqual(metrics["spans"]["b"], {"count": 1, "seconds": 0.123457})
+        self.assertEqual(metrics["counters"], {"requests": 1})
+        self.assertNotIn("\n", self.metrics.to_json())
+    def test_to_markdown(self):
+        self.metrics.record("sync.convert", 0.0125)
+        self.metrics.increment("requests", 2)
+        markdown = self.metrics.to_markdown()
+        self.assertIn("|sync.convert|1|12.5|", markdown)
+        self.assertIn("|requests|2|", markdown)
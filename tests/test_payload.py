@@ -0,0 +1,48 @@
+import unittest
+from src.payload import *
+from src.metrics import Metrics
+
+class TestCompactStorage(unittest.TestCase):
+    def test_whitespace_between_blocks(self):
+        self.assertEqual(compact_storage("<h1>hi</h1>\n<p>a <em>b</em> <code>c</code></p>\n<ul>\n<li>x</li>\n</ul>\n"), "<h1>hi</h1><p>a <em>b</em> <code>c</code></p><ul><li>x</li></ul>")
+    def test_inline_whitespace_kept(self):
+        html = "<p><em>a</em> <strong>b</strong></p>"
+        self.assertEqual(compact_storage(html), html, "Whitespace between inline elements is rendered")
+    def test_code_untouched(self):
+        html = '<ac:structured-macro ac:name="code">\n<ac:plain-text-body><![CDATA[a  &#109;\n  <b>\n]]></ac:plain-text-body>\n</ac:structured-macro>\n<pre><code>x\n\n  y &#109;</code></pre>'
+        self.assertEqual(compact_storage(html), '<ac:structured-macro ac:name="code"><ac:plain-text-body><![CDATA[a  &#109;\n  <b>\n]]></ac:plain-text-body></ac:structured-macro><pre><code>x\n\n  y &#109;</code></pre>')
+    def test_character_references(self):
+        self.assertEqual(compact_storage('<p><a href="&#109;&#x61;ilto:a">&#109;e</a></p>'), '<p><a href="mailto:a">me</a></p>')
+        self.assertEqual(compact_storage("<p>&#60;&#x26;&#34;&#93;&#0;&#x110000;</p>"), "<p>&#60;&#x26;&#34;&#93;&#0;&#x110000;</p>", "References to escaped and invalid characters should be kept")
+    def test_compact_sections(self):
+        metrics = Metrics()
+        self.assertEqual(compact_sections(["<p>a</p>\n<p>b</p>\n"], metrics), ["<p>a</p><p>b</p>"])
+        self.assertEqual(metrics.counters, {"storage.bytes": 18, "storage.compacted_bytes": 16})
+
+class TestSplitMarkdown(unittest.TestCase):
+    def test_split(self):
+        preamble, sections = split_markdown("Intro [a].\n\n# One\n\ntext\n\n## Two\n\n[a]: https://a")
+        self.assertEqual(preamble, "Intro [a].\n\n\n[a]: https://a")
+        self.assertEqual(sections, ["# One\n\ntext\n\n\n[a]: https://a", "## Two\n\n[a]: https://a\n\n[a]: https://a"], "Every section should get the reference definitions")
+    def test_definition_title(self):
+        preamble, sections = split_markdown('# One\n\n[x][a]\n\n[a]: https://a\n    "Title"')
+        self.assertIn('[a]: https://a\n    "Title"', sections[0], "The title of a definition should be kept with it")
+    def test_without_preamble(self):
+        self.assertEqual(split_markdown("# One\n\n# Two"), ("", ["# One\n", "# Two"]))
+    def test_without_heading(self):
+        self.assertIsNone(split_markdown("just text"))
+        self.assertIsNone(split_markdown("```\n# not a heading"), "Markdown that can not be split safely should not be split")
+
+class TestGroupParts(unittest.TestCase):
+    def test_group(self):
+        sections = ["# One", "## Two", "# Three", "# One"]
+        htmls = ["a" * 6, "b" * 4, "c" * 20, "d" * 5]
+        parts = group_parts(sections, htmls, 10, "Docs")
+        self.assertEqual([part.html for part in parts], ["a" * 6 + "b" * 4, "c" * 20, "d" * 5], "An oversized section should be a part by itself")
+        self.assertEqual([part.heading for part in parts], ["One", "Three", "One"])
+        self.assertEqual([part.title for part in parts], ["Docs - One", "Docs - Three", "Docs - One (2)"], "Titles should be unique")
+    def test_index(self):
+        self.assertEqual(split_index([SplitPart("A & B", "Docs - A & B", "")]), '<ul><li><ac:link><ri:page ri:content-title="Docs - A &amp; B" /><ac:link-body>A &amp; B</ac:link-body></ac:link></li></ul>')
+
+if __name__ == '__main__':
+    unittest.main()
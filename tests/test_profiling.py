@@ -0,0 +1,36 @@
+import os
+import pstats
+import tempfile
+import unittest
+from src.converter import render_markdown
+from src.metrics import Metrics
+from src.profiling import ConversionProfiler
+
+class TestConversionProfiler(unittest.TestCase):
+    def setUp(self):
+        self.profiler = ConversionProfiler()
+    def test_run(self):
+        html = self.profiler.run(render_markdown, "# hi", Metrics())
+        self.assertEqual(html, "<h1>hi</h1>")
+        self.assertEqual(self.profiler.conversions, 1)
+    def test_processor_times(self):
+        self.assertEqual(self.profiler.processor_times(), {})
+        for _ in range(2):
+            self.profiler.run(render_markdown, "```py\nx\n```\n\n[link](##hi)", Metrics())
+        times = self.profiler.processor_times()
+        self.assertEqual(times["convert.treeprocessor.confluence_code_block"][0], 2)
+        self.assertEqual(times["convert.treeprocessor.inline"][0], 2)
+        seconds = [seconds for _, seconds in times.values()]
+        self.assertEqual(seconds, sorted(seconds, reverse=True), "Slowest processors should be first")
+    def test_save(self):
+        self.profiler.run(render_markdown, "# hi", Metrics())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "profiles", "conversion.pstats")
+            self.profiler.save(path)
+            names = [name for _, _, name in pstats.Stats(path).stats]
+        self.assertIn("convert.treeprocessor.inline", names, "Saved profile should name the processors")
+    def test_to_markdown(self):
+        self.profiler.run(render_markdown, "# hi", Metrics())
+        markdown = self.profiler.to_markdown()
+        self.assertIn("(1 conversions)", markdown)
+        self.assertIn("|treeprocessor.confluence_code_block|1|", markdown)
@@ -0,0 +1,46 @@
+import threading
+import time
+import unittest
+from src.rate_limiter import AdaptiveRateLimiter
+
+class TestAdaptiveRateLimiter(unittest.TestCase):
+    def test_init(self):
+        limiter = AdaptiveRateLimiter(4)
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.in_flight, 0)
+    def test_throttled_halves_limit(self):
+        limiter = AdaptiveRateLimiter(8, min_concurrency=3)
+        for _ in range(2):
+            limiter.acquire()
+            limiter.release(throttled=True)
+        self.assertEqual(limiter.limit, 3, "Limit should be halved down to the minimum")
+    def test_success_raises_limit(self):
+        limiter = AdaptiveRateLimiter(4)
+        limiter.limit = 2.0
+        limiter.acquire()
+        limiter.release()
+        self.assertEqual(limiter.limit, 2.5)
+        limiter.limit = 4.0
+        limiter.acquire()
+        limiter.release()
+        self.assertEqual(limiter.limit, 4, "Limit should not grow past the maximum")
+    def test_pause(self):
+        limiter = AdaptiveRateLimiter(4)
+        limiter.acquire()
+        limiter.release(throttled=True, delay=0.05)
+        start = time.monotonic()
+        limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.04, "Requests should wait for the Retry-After delay")
+    def test_blocks_at_limit(self):
+        limiter = AdaptiveRateLimiter(1)
+        limiter.acquire()
+        acquired = threading.Event()
+        def acquire():
+            limiter.acquire()
+            acquired.set()
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        self.assertFalse(acquired.wait(0.05), "Second request should wait while the first is in flight")
+        limiter.release()
+        self.assertTrue(acquired.wait(1))
+        thread.join()
@@ -0,0 +1,45 @@
+import unittest
+from src.section_links import *
+
+class TestMarkdownSlug(unittest.TestCase):
+    def test_slug(self):
+        self.assertEqual(markdown_slug("Action Parameters"), "action-parameters")
+        self.assertEqual(markdown_slug("What's new in v1.2?"), "whats-new-in-v12")
+        self.assertEqual(markdown_slug("snake_case & co-op"), "snake_case--co-op", "Underscores and hyphens should be kept")
+        self.assertEqual(markdown_slug("Ünïcödé"), "ünïcödé")
+
+class TestConfluenceAnchor(unittest.TestCase):
+    def test_anchor(self):
+        self.assertEqual(confluence_anchor("Action Parameters"), "Action-Parameters")
+        self.assertEqual(confluence_anchor(" What's  new? "), "What's-new?")
+
+class TestSectionAnchors(unittest.TestCase):
+    def test_index(self):
+        html = '<h1>Action Parameters</h1><h2 id="x">Run <code>sync</code> &amp; wait</h2><h3>Action parameters</h3><p>Action Parameters</p>'
+        self.assertEqual(section_anchors(html), {"action-parameters": "Action-Parameters", "run-sync--wait": "Run-sync-&-wait"}, "Repeated slugs should keep the first heading")
+    def test_code_block(self):
+        self.assertEqual(section_anchors('<ac:plain-text-body><![CDATA[<h1>Not a heading</h1>]]></ac:plain-text-body><h2>Heading</h2>'), {"heading": "Heading"})
+
+class TestLinkSections(unittest.TestCase):
+    def test_links(self):
+        html = (
+            '<h2>Action Parameters</h2><h2>Run &amp; wait</h2>'
+            '<p><a href="##action-parameters">a</a> <a title="t" href="#Action-Parameters">b</a> <a href="#run--wait">c</a> '
+            '<a href="###missing">d</a> <a href="https://example.com/#action-parameters">e</a></p>'
+        )
+        self.assertEqual(link_sections(html), (
+            '<h2>Action Parameters</h2><h2>Run &amp; wait</h2>'
+            '<p><a href="#Action-Parameters">a</a> <a title="t" href="#Action-Parameters">b</a> <a href="#Run-&amp;-wait">c</a> '
+            '<a href="#missing">d</a> <a href="https://example.com/#action-parameters">e</a></p>'
+        ))
+    def test_index(self):
+        self.assertEqual(link_sections('<a href="#setup">setup</a>', {"setup": "Set-Up"}), '<a href="#Set-Up">setup</a>')
+    def test_code_block(self):
+        html = '<h1>Setup</h1><ac:plain-text-body><![CDATA[<a href="##setup">x</a>]]></ac:plain-text-body>'
+        self.assertEqual(link_sections(html), html, "Links in code blocks should be left as they are")
+    def test_many_headings(self):
+        count = 5000
+        html = "".join(f"<h2>Section {index}</h2><p><a href=\"##section-{count - 1 - index}\">next</a></p>" for index in range(count))
+        linked = link_sections(html)
+        self.assertEqual(linked.count('href="#Section-'), count)
+        self.assertIn('<a href="#Section-0">next</a>', linked)
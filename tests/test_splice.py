@@ -0,0 +1,48 @@
+import unittest
+from src.splice import *
+from unittest.mock import patch
+
+body = "<p>before</p><p>start</p><p>old</p><p>end</p><p>log</p><p>entries</p><p>/log</p><p>after</p>"
+
+class TestFindMarkers(unittest.TestCase):
+    def test_first_occurrence(self):
+        found = find_markers("<p>a</p><p>b</p><p>a</p>", ["<p>a</p>", "<p>b</p>", "<p>c</p>"])
+        self.assertEqual(found, {"<p>a</p>": 0, "<p>b</p>": 8}, "Missing markers should not be found")
+    def test_overlapping_markers(self):
+        found = find_markers("<p>start here</p>", ["<p>start here</p>", "start"])
+        self.assertEqual(found, {"<p>start here</p>": 0, "start": 3}, "Markers inside other markers should be found")
+    def test_overlapping_occurrences(self):
+        self.assertEqual(find_markers("aaa<ap<p", ["a<", "<"]), {"a<": 2, "<": 3}, "The first occurrence of a marker should be found when it overlaps another marker")
+        found = find_markers("<p>API START</p><p>START</p>", ["START", "API START"])
+        self.assertEqual(found, {"API START": 3, "START": 7}, "Markers ending other markers should be found inside them")
+        self.assertEqual(find_markers("STARTS", ["START", "STARTS"]), {"START": 0, "STARTS": 0})
+
+class TestFindSections(unittest.TestCase):
+    def test_success(self):
+        sections = find_sections(body, [("<p>log</p>", "<p>/log</p>"), ("<p>start</p>", "<p>end</p>")])
+        self.assertEqual([body[start:end] for start, end in sections], ["<p>entries</p>", "<p>old</p>"], "Sections should be in the order of the marker pairs")
+    def test_missing_substring(self):
+        with self.assertRaises(SubstringNotFoundError):
+            find_sections(body, [("<p>start</p>", "<p>missing</p>")])
+    def test_reversed_substrings(self):
+        with self.assertRaises(SubstringNotFoundError):
+            find_sections(body, [("<p>end</p>", "<p>start</p>")])
+    def test_overlap(self):
+        with self.assertRaises(SectionOverlapError):
+            find_sections(body, [("<p>start</p>", "<p>/log</p>"), ("<p>end</p>", "<p>after</p>")])
+        with self.assertRaises(SectionOverlapError):
+            find_sections(body, [("<p>start</p>", "<p>end</p>"), ("<p>start</p>", "<p>end</p>")])
+    def test_shared_marker(self):
+        sections = find_sections(body, [("<p>start</p>", "<p>end</p>"), ("<p>end</p>", "<p>log</p>")])
+        self.assertEqual([body[start:end] for start, end in sections], ["<p>old</p>", ""], "A section may start at the end substring of the previous one")
+
+class TestSpliceSections(unittest.TestCase):
+    def test_splice(self):
+        sections = find_sections(body, [("<p>log</p>", "<p>/log</p>"), ("<p>start</p>", "<p>end</p>")])
+        self.assertEqual(splice_sections(body, sections, ["<p>new entries</p>", "<h1>hi</h1>"]), "<p>before</p><p>start</p><h1>hi</h1><p>end</p><p>log</p><p>new entries</p><p>/log</p><p>after</p>")
+    def test_spans(self):
+        sections = find_sections(body, [("<p>start</p>", "<p>end</p>")])
+        spans = splice_spans(body, sections, ["<h1>hi</h1>"])
+        self.assertTrue(all(text is body for text, _, _ in spans[::2]), "Spans should refer to the page body instead of copying it")
+        self.assertEqual("".join(span_chunks(spans, 4)), splice_sections(body, sections, ["<h1>hi</h1>"]))
+        self.assertTrue(all(len(chunk) <= 4 for chunk in span_chunks(spans, 4)))
@@ -0,0 +1,40 @@
+import json
+import os
+import tempfile
+import unittest
+from src.state import *
+
+class TestSyncRecord(unittest.TestCase):
+    def test_dict_round_trip(self):
+        record = SyncRecord("1234567890", 3, "source", "rendered", {"README.md": "blob"}, 1000)
+        loaded = SyncRecord.from_dict(record.to_dict())
+        self.assertEqual(loaded.to_dict(), record.to_dict())
+        self.assertEqual(loaded.blob_ids, {"README.md": "blob"})
+        self.assertEqual(loaded.split_size, 1000)
+
+class TestSyncState(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "state", "sync.json")
+    def tearDown(self):
+        self.directory.cleanup()
+    def test_load_missing(self):
+        state = SyncState.load(self.path)
+        self.assertEqual(state.records, {}, "Missing state file should load an empty state")
+    def test_save_and_load(self):
+        state = SyncState.load(self.path)
+        state.set("key", SyncRecord("1234567890", 3, "source", "rendered"))
+        state.save()
+        loaded = SyncState.load(self.path)
+        self.assertEqual(loaded.get("key").version, 3)
+        self.assertIsNone(loaded.get("other"))
+    def test_load_other_format(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w') as f:
+            json.dump({"format": 0, "records": {"key": {}}}, f)
+        self.assertEqual(SyncState.load(self.path).records, {}, "State of another format version should be discarded")
+    def test_save_in_memory(self):
+        state = SyncState()
+        state.set("key", SyncRecord("1234567890", 3, "source", "rendered"))
+        state.save()
+        self.assertFalse(os.path.exists(self.path))
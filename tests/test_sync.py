@@ -0,0 +1,297 @@
+import json
+import os
+import tempfile
+import unittest
+from src.sync import *
+from src.state import SyncRecord, SyncState
+from src.utils import git_blob_id
+from src.api import ConfluenceClient, CreatePageCommand, Page, UploadAttachmentCommand
+from requests.auth import HTTPBasicAuth
+from unittest.mock import patch, mock_open, MagicMock
+
+page = {
+    "id": "1234567890",
+    "status": "current",
+    "title": "Some Title",
+    "body": {"storage": {"value": "<p>before</p><p>start</p><p>old</p><p>end</p><p>after</p>"}},
+    "version": {"number": 3}
+}
+
+def open_files(files: dict[str, str]):
+    """
+    Patches open to read the content of each file as text, or as bytes in binary mode.
+    """
+    def open_file(path, mode='r'):
+        return mock_open(read_data=files[path].encode() if 'b' in mode else files[path])()
+    return patch('builtins.open', open_file)
+
+class TestSyncResult(unittest.TestCase):
+    def test_success(self):
+        mapping = SyncMapping("README.md", "https://domain/wiki/spaces/aSpace/pages/1234567890/Page", "<p>start</p>", "<p>end</p>")
+        self.assertTrue(SyncResult(mapping).success, "Result without an error should be a success")
+        self.assertFalse(SyncResult(mapping, error=ValueError()).success, "Result with an error should not be a success")
+        self.assertEqual(SyncResult(mapping, UNCHANGED).status, UNCHANGED)
+        self.assertEqual(SyncResult(mapping, error=ValueError()).status, FAILED, "Result with an error should have a failed status")
+
+class TestNormalizeStorage(unittest.TestCase):
+    def test_whitespace_and_void_tags(self):
+        self.assertEqual(normalize_storage("\n<p>a<br></p>\n  <hr/>\n"), "<p>a<br /></p><hr />")
+    def test_code_body_untouched(self):
+        html = "<ac:plain-text-body><![CDATA[a >  <b\n]]></ac:plain-text-body>\n<p>x</p>"
+        self.assertEqual(normalize_storage(html), "<ac:plain-text-body><![CDATA[a >  <b\n]]></ac:plain-text-body><p>x</p>", "Whitespace inside CDATA should be kept")
+    def test_attachment_version(self):
+        html = '<ac:image><ri:attachment ri:filename="a.png" ri:version-at-save="2" /></ac:image>'
+        self.assertEqual(normalize_storage(html), '<ac:image><ri:attachment ri:filename="a.png" /></ac:image>')
+    def test_macro_attributes(self):
+        stored = ('<ac:structured-macro ac:name="code" ac:schema-version="1" ac:macro-id="4f1b2c3d-5e6f-4a7b-8c9d-0e1f2a3b4c5d">'
+            '<ac:parameter ac:name="language">python</ac:parameter><ac:plain-text-body><![CDATA[x = 1]]></ac:plain-text-body></ac:structured-macro>')
+        converted = MarkdownConverter().convert("```python\nx = 1\n```")
+        self.assertEqual(normalize_storage(stored), normalize_storage(converted), "Attributes added by Confluence on save should be ignored")
+        html = '<ac:plain-text-body><![CDATA[<ac:structured-macro ac:schema-version="1">]]></ac:plain-text-body>'
+        self.assertEqual(normalize_storage(html), html, "Macros inside code blocks should be left untouched")
+
+class TestSectionHash(unittest.TestCase):
+    def test_unchanged(self):
+        self.assertEqual(section_hash("<h1>hi</h1><p>a<br /></p>"), section_hash("<h1>hi</h1>\n<p>a<br></p>"))
+    def test_changed(self):
+        self.assertNotEqual(section_hash("<h1>hi</h1>"), section_hash("<h1>hello</h1>"))
+
+class TestSyncPage(unittest.TestCase):
+    def setUp(self):
+        self.mapping = SyncMapping("README.md", "https://domain/wiki/spaces/aSpace/pages/1234567890/Page", "<p>start</p>", "<p>end</p>")
+        self.client = ConfluenceClient(HTTPBasicAuth("username", "token"), conflict_backoff=0)
+        self.client.send = MagicMock()
+        self.client.send.side_effect = [MagicMock(text=json.dumps(page)), MagicMock()]
+    def test_success(self):
+        with patch('builtins.open', mock_open(read_data='# hi')):
+            status = sync_page(self.client, self.mapping)
+        self.assertEqual(status, UPDATED)
+        edit_command = self.client.send.call_args_list[1].args[0]
+        self.assertIsInstance(edit_command, EditPageCommand)
+        self.assertEqual(edit_command.input.id, "1234567890")
+        self.assertEqual(edit_command.input.version, 4, "Version should be incremented")
+        self.assertEqual(edit_command.input.body, "<p>before</p><p>start</p><h1>hi</h1><p>end</p><p>after</p>")
+        for name in ("sync.read_files", "sync.get_page", "sync.convert", "sync.splice", "sync.edit_page"):
+            self.assertIn(name, self.client.metrics.spans, f"{name} should be timed")
+    def test_unchanged(self):
+        unchanged_page = {**page, "body": {"storage": {"value": "<p>start</p><h1>hi</h1><p>end</p>"}}}
+        self.client.send.side_effect = [MagicMock(text=json.dumps(unchanged_page))]
+        with patch('builtins.open', mock_open(read_data='# hi')):
+            status = sync_page(self.client, self.mapping)
+        self.assertEqual(status, UNCHANGED)
+        self.assertEqual(self.client.send.call_count, 1, "Page should not be edited when the section is unchanged")
+    def test_local_images(self):
+        self.client.send.side_effect = [MagicMock(text=json.dumps(page)), MagicMock(text=json.dumps({"results": []})), MagicMock(), MagicMock()]
+        with tempfile.TemporaryDirectory() as directory:
+            # local images must be in the repository, which is the current directory
+            previous_directory = os.getcwd()
+            os.chdir(directory)
+            self.addCleanup(os.chdir, previous_directory)
+            markdown_path = os.path.join(directory, "README.md")
+            with open(markdown_path, 'w') as f:
+                f.write("![diagram](diagram.png)")
+            with open(os.path.join(directory, "diagram.png"), 'wb') as f:
+                f.write(b"png")
+            status = sync_page(self.client, SyncMapping(markdown_path, self.mapping.url, "<p>start</p>", "<p>end</p>"))
+        self.assertEqual(status, UPDATED)
+        commands = [call.args[0] for call in self.client.send.call_args_list]
+        self.assertIsInstance(commands[2], UploadAttachmentCommand, "Images should be uploaded before the page is edited")
+        self.assertEqual(commands[3].input.body, '<p>before</p><p>start</p><p><ac:image ac:alt="diagram"><ri:attachment ri:filename="diagram.png" /></ac:image></p><p>end</p><p>after</p>')
+    def test_prefetched_page(self):
+        self.client.send.side_effect = [MagicMock()]
+        with patch('builtins.open', mock_open(read_data='# hi')):
+            status = sync_sections(self.client, [self.mapping], page=Page.from_json(page))
+        self.assertEqual(status, UPDATED)
+        self.assertEqual(self.client.send.call_count, 1, "Prefetched page should not be fetched again")
+        self.assertIsInstance(self.client.send.call_args.args[0], EditPageCommand)
+    def test_missing_page_values(self):
+        self.client.send.side_effect = [MagicMock(text=json.dumps({**page, "title": ""}))]
+        with self.assertRaises(ConfluenceApiError):
+            sync_page(self.client, self.mapping)
+
+
+class TestSyncSplit(unittest.TestCase):
+    def setUp(self):
+        self.mapping = SyncMapping("README.md", "https://domain/wiki/spaces/aSpace/pages/1234567890/Page", "<p>start</p>", "<p>end</p>", split_size=50)
+        self.client = ConfluenceClient(HTTPBasicAuth("username", "token"), conflict_backoff=0)
+        self.client.send = MagicMock()
+        self.md_text = "Intro\n\n# One\n\n" + "a" * 30 + "\n\n# Two\n\n" + "b" * 30
+    def test_split(self):
+        child = {**page, "id": "7", "title": "Some Title - Two", "body": {"storage": {"value": "<p>old</p>"}}}
+        self.client.send.side_effect = [
+            MagicMock(text=json.dumps({**page, "spaceId": "9"})),
+            MagicMock(text=json.dumps({"results": [{"id": "7", "title": "Some Title - Two"}]})),
+            MagicMock(text=json.dumps({"id": "8"})),
+            MagicMock(text=json.dumps(child)),
+            MagicMock(),
+            MagicMock()
+        ]
+        with patch('builtins.open', mock_open(read_data=self.md_text)):
+            status = sync_page(self.client, self.mapping)
+        self.assertEqual(status, UPDATED)
+        commands = [call.args[0] for call in self.client.send.call_args_list]
+        self.assertIsInstance(commands[2], CreatePageCommand, "Missing child pages should be created")
+        self.assertEqual((commands[2].input.space_id, commands[2].input.parent_id, commands[2].input.title), ("9", "1234567890", "Some Title - One"))
+        self.assertEqual(commands[2].input.body, "<h1>One</h1><p>" + "a" * 30 + "</p>")
+        self.assertEqual((commands[4].input.id, commands[4].input.body), ("7", "<h1>Two</h1><p>" + "b" * 30 + "</p>"), "Changed child pages should be updated")
+        self.assertEqual(commands[5].input.body, '<p>before</p><p>start</p><p>Intro</p><ul>'
+            '<li><ac:link><ri:page ri:content-title="Some Title - One" /><ac:link-body>One</ac:link-body></ac:link></li>'
+            '<li><ac:link><ri:page ri:content-title="Some Title - Two" /><ac:link-body>Two</ac:link-body></ac:link></li>'
+            '</ul><p>end</p><p>after</p>', "The section should list the child pages")
+        self.assertEqual(self.client.metrics.counters["pages.split"], 2)
+    def test_small_markdown_not_split(self):
+        self.mapping.split_size = 1000
+        self.client.send.side_effect = [MagicMock(text=json.dumps(page)), MagicMock()]
+        with patch('builtins.open', mock_open(read_data=self.md_text)):
+            sync_page(self.client, self.mapping)
+        self.assertEqual(self.client.send.call_count, 2, "Markdown smaller than the split size should be synced to the section")
+        self.assertIn("<h1>One</h1>", self.client.send.call_args.args[0].input.body)
+
+class TestSyncPageWithState(unittest.TestCase):
+    def setUp(self):
+        self.mapping = SyncMapping("README.md", "https://domain/wiki/spaces/aSpace/pages/1234567890/Page", "<p>start</p>", "<p>end</p>")
+        self.client = ConfluenceClient(HTTPBasicAuth("username", "token"), conflict_backoff=0)
+        self.client.send = MagicMock()
+        self.state = SyncState()
+    def test_records_update(self):
+        self.client.send.side_effect = [MagicMock(text=json.dumps(page)), MagicMock()]
+        with open_files({"README.md": "# hi"}):
+            sync_page(self.client, self.mapping, self.state)
+        record = self.state.get(self.mapping.key)
+        self.assertEqual(record.version, 4, "Record should hold the version created by the edit")
+        self.assertEqual(record.source_hash, content_hash("# hi"))
+        self.assertEqual(record.rendered_hash, section_hash("<h1>hi</h1>"))
+    def test_version_unchanged(self):
+        self.state.set(self.mapping.key, SyncRecord("1234567890", 3, content_hash("# hi"), section_hash("<h1>hi</h1>"), {"README.md": git_blob_id(b"# hi")}))
+        self.client.send.side_effect = [MagicMock(text=json.dumps({"version": {"number": 3}}))]
+        with open_files({"README.md": "# hi"}):
+            status = sync_page(self.client, self.mapping, self.state)
+        self.assertEqual(status, UNCHANGED)
+        self.assertEqual(self.client.send.call_count, 1, "Only the page version should be fetched")
+        self.assertIsInstance(self.client.send.call_args.args[0], GetPageVersionCommand)
+    def test_prefetched_version(self):
+        self.state.set(self.mapping.key, SyncRecord("1234567890", 3, content_hash("# hi"), section_hash("<h1>hi</h1>"), {"README.md": git_blob_id(b"# hi")}))
+        with open_files({"README.md": "# hi"}):
+            status = sync_sections(self.client, [self.mapping], self.state, page=Page("1234567890", "current", "Some Title", None, 3))
+        self.assertEqual(status, UNCHANGED)
+        self.client.send.assert_not_called()
+    def test_prefetched_version_source_changed(self):
+        self.state.set(self.mapping.key, SyncRecord("1234567890", 3, content_hash("# old"), section_hash("<h1>old</h1>"), {"README.md": git_blob_id(b"# old")}))
+        self.client.send.side_effect = [MagicMock(text=json.dumps(page)), MagicMock()]
+        with open_files({"README.md": "# hi"}):
+            status = sync_sections(self.client, [self.mapping], self.state, page=Page("1234567890", "current", "Some Title", None, 3))
+        self.assertEqual(status, UPDATED)
+        self.assertIsInstance(self.client.send.call_args_list[0].args[0], GetPageCommand, "Body should be fetched when the prefetched page has none")
+    def test_source_changed(self):
+        self.state.set(self.mapping.key, SyncRecord("1234567890", 3, content_hash("# old"), section_hash("<h1>old</h1>"), {"README.md": git_blob_id(b"# old")}))
+        self.client.send.side_effect = [MagicMock(text=json.dumps(page)), MagicMock()]
+        with open_files({"README.md": "# hi"}):
+            status = sync_page(self.client, self.mapping, self.state)
+        self.assertEqual(status, UPDATED)
+        self.assertIsInstance(self.client.send.call_args_list[0].args[0], GetPageCommand, "Version check should be skipped when the markdown changed")
+    @patch('src.converter.convert_markdown')
+    def test_page_edited_elsewhere(self, mock_convert_markdown):
+        self.state.set(self.mapping.key, SyncRecord("1234567890", 2, content_hash("# hi"), section_hash("<p>old</p>"), {"README.md": git_blob_id(b"# hi")}))
+        self.client.send.side_effect = [MagicMock(text=json.dumps({"version": {"number": 3}})), MagicMock(text=json.dumps(page))]
+        with open_files({"README.md": "# hi"}):
+            status = sync_page(self.client, self.mapping, self.state)
+        self.assertEqual(status, UNCHANGED)
+        mock_convert_markdown.assert_not_called()
+        self.assertEqual(self.state.get(self.mapping.key).version, 3, "Record should be moved to the new page version")
+
+
+class TestSyncPageFileChanges(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.previous_directory = os.getcwd()
+        os.chdir(self.directory.name)
+        self.markdown_path = os.path.join(self.directory.name, "README.md")
+        self.image_path = os.path.join(self.directory.name, "diagram.png")
+        self.write(self.markdown_path, b"![diagram](diagram.png)")
+        self.write(self.image_path, b"png")
+        self.mapping = SyncMapping(self.markdown_path, "https://domain/wiki/spaces/aSpace/pages/1234567890/Page", "<p>start</p>", "<p>end</p>")
+        self.client = ConfluenceClient(HTTPBasicAuth("username", "token"), conflict_backoff=0)
+        self.client.send = MagicMock()
+        self.state = SyncState()
+        # the first sync gets the page, lists the attachments, uploads the image and edits the page
+        self.client.send.side_effect = [MagicMock(text=json.dumps(page)), MagicMock(text=json.dumps({"results": []})), MagicMock(), MagicMock()]
+        sync_page(self.client, self.mapping, self.state)
+        self.client.send.reset_mock()
+    def tearDown(self):
+        os.chdir(self.previous_directory)
+        self.directory.cleanup()
+    def write(self, path, content):
+        with open(path, 'wb') as f:
+            f.write(content)
+    def test_records_files(self):
+        self.assertEqual(self.state.get(self.mapping.key).blob_ids, {self.markdown_path: git_blob_id(b"![diagram](diagram.png)"), self.image_path: git_blob_id(b"png")})
+    def test_skip_unchanged_files(self):
+        status = sync_page(self.client, self.mapping, self.state, skip_unchanged_files=True)
+        self.assertEqual(status, UNCHANGED)
+        self.client.send.assert_not_called()
+        self.assertEqual(self.client.metrics.counters["pages.skipped"], 1)
+    def test_repointed_mapping_not_skipped(self):
+        other_path = os.path.join(self.directory.name, "OTHER.md")
+        self.write(other_path, b"# other")
+        mapping = SyncMapping(other_path, self.mapping.url, self.mapping.insert_start_text, self.mapping.insert_end_text)
+        self.assertEqual(mapping.key, self.mapping.key, "The section of the page is the same")
+        self.client.send.side_effect = [MagicMock(text=json.dumps(page)), MagicMock()]
+        status = sync_page(self.client, mapping, self.state, skip_unchanged_files=True)
+        self.assertEqual(status, UPDATED, "A section synced from another file should not be skipped")
+        self.assertEqual(self.state.get(mapping.key).blob_ids, {other_path: git_blob_id(b"# other")})
+    def test_changed_split_size_not_skipped(self):
+        self.mapping.split_size = 1000
+        self.assertFalse(unchanged_since_sync([self.mapping], self.state), "A section synced with another split size should not be skipped")
+        self.mapping.split_size = None
+        self.assertTrue(unchanged_since_sync([self.mapping], self.state))
+    def test_changed_markdown_not_skipped(self):
+        self.write(self.markdown_path, b"# hi")
+        self.client.send.side_effect = [MagicMock(text=json.dumps(page)), MagicMock()]
+        status = sync_page(self.client, self.mapping, self.state, skip_unchanged_files=True)
+        self.assertEqual(status, UPDATED)
+        self.assertEqual(self.state.get(self.mapping.key).blob_ids, {self.markdown_path: git_blob_id(b"# hi")}, "Images that are no longer referenced should not be recorded")
+    def test_changed_image(self):
+        self.write(self.image_path, b"new png")
+        synced_body = '<p>start</p><p><ac:image ac:alt="diagram"><ri:attachment ri:filename="diagram.png" /></ac:image></p><p>end</p>'
+        synced_page = {**page, "body": {"storage": {"value": synced_body}}, "version": {"number": 4}}
+        self.client.send.side_effect = [MagicMock(text=json.dumps(synced_page)), MagicMock(text=json.dumps({"results": [{"title": "diagram.png", "comment": "old"}]})), MagicMock()]
+        status = sync_page(self.client, self.mapping, self.state, skip_unchanged_files=True)
+        self.assertEqual(status, UNCHANGED, "Page should not be edited when only an image changed")
+        self.assertIsInstance(self.client.send.call_args.args[0], UploadAttachmentCommand, "Changed image should be uploaded")
+        self.assertEqual(self.state.get(self.mapping.key).blob_ids[self.image_path], git_blob_id(b"new png"))
+
+
+class TestSyncSections(unittest.TestCase):
+    def setUp(self):
+        url = "https://domain/wiki/spaces/aSpace/pages/1234567890/Page"
+        self.mappings = [SyncMapping("README.md", url, "<p>start</p>", "<p>end</p>"), SyncMapping("CHANGELOG.md", url, "<p>log</p>", "<p>/log</p>")]
+        self.page = {**page, "body": {"storage": {"value": "<p>start</p><p>old</p><p>end</p><p>log</p><h1>changes</h1><p>/log</p>"}}}
+        self.client = ConfluenceClient(HTTPBasicAuth("username", "token"), conflict_backoff=0)
+        self.client.send = MagicMock()
+    def read(self, path, mode='r'):
+        content = {"README.md": "# hi", "CHANGELOG.md": "# changes"}[path]
+        return mock_open(read_data=content.encode() if 'b' in mode else content)()
+    def test_single_edit(self):
+        self.client.send.side_effect = [MagicMock(text=json.dumps(self.page)), MagicMock()]
+        with patch('builtins.open', self.read):
+            status = sync_sections(self.client, self.mappings)
+        self.assertEqual(status, UPDATED)
+        self.assertEqual(self.client.send.call_count, 2, "Every section should be updated with one GET and one PUT")
+        self.assertEqual(self.client.send.call_args.args[0].input.body, "<p>start</p><h1>hi</h1><p>end</p><p>log</p><h1>changes</h1><p>/log</p>")
+    def test_version_conflict(self):
+        latest_page = {**self.page, "body": {"storage": {"value": "<p>new intro</p><p>start</p><p>old</p><p>end</p><p>log</p><h1>edited</h1><p>/log</p>"}}, "version": {"number": 4}}
+        self.mappings = self.mappings[:1]
+        self.client.send.side_effect = [MagicMock(text=json.dumps(self.page)), MagicMock(status_code=409), MagicMock(text=json.dumps(latest_page)), MagicMock(status_code=200)]
+        state = SyncState()
+        with patch('builtins.open', self.read):
+            status = sync_sections(self.client, self.mappings, state)
+        self.assertEqual(status, UPDATED)
+        self.assertEqual(self.client.conflicts, 1)
+        edit_command = self.client.send.call_args.args[0]
+        self.assertEqual(edit_command.input.body, "<p>new intro</p><p>start</p><h1>hi</h1><p>end</p><p>log</p><h1>edited</h1><p>/log</p>", "Only the synced section should be replaced in the latest page")
+        self.assertEqual(edit_command.input.version, 5)
+        self.assertEqual(state.get(self.mappings[0].key).version, 5)
+    def test_different_pages(self):
+        self.mappings[1].url = "https://domain/wiki/spaces/aSpace/pages/987654321/Other"
+        with self.assertRaises(InvalidParameterError):
+            sync_sections(self.client, self.mappings)
@@ -0,0 +1,185 @@
+import json
+import os
+import tempfile
+import unittest
+import requests
+from src.tree import *
+from src.api import BulkGetPagesCommand, ConfluenceClient, CreatePageCommand, EditPageCommand, GetChildPagesCommand, GetPageCommand, GetPageVersionCommand
+from src.errors import InvalidParameterError
+from src.sync import CREATED, UPDATED, UNCHANGED
+from src.utils import extract_domain_and_page_id
+from requests.auth import HTTPBasicAuth
+from unittest.mock import MagicMock
+
+url = "https://domain/wiki/spaces/aSpace/pages/100/Parent"
+
+class TreeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.docs = os.path.join(self.directory.name, "docs")
+        self.files = {
+            "README.md": "# Docs Home\n\nSee the [guide](guide/intro.md#setup) and [API](api.md).",
+            "api.md": "The API.",
+            "guide/intro.md": "# Intro\n\n## Setup\n\n[Deep dive](deep/) and [home](../README.md).",
+            "guide/deep/index.md": "# Deep Dive",
+            "empty/notes.txt": "not markdown",
+            ".github/hidden.md": "# Hidden",
+        }
+        for path, text in self.files.items():
+            path = os.path.join(self.docs, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(text)
+    def tearDown(self):
+        self.directory.cleanup()
+
+class TestBuildTree(TreeTestCase):
+    def test_build(self):
+        root = build_tree(self.docs)
+        self.assertEqual(root.title, "Docs Home", "Directory should be titled after the heading of its index")
+        self.assertEqual(root.markdown_path, os.path.join(self.docs, "README.md"))
+        self.assertEqual([child.title for child in root.children], ["api", "guide"], "Files without a heading should be titled after their name")
+        guide = root.children[1]
+        self.assertIsNone(guide.markdown_path, "Directory without an index should not have markdown")
+        self.assertEqual([child.title for child in guide.children], ["Deep Dive", "Intro"])
+        self.assertEqual(guide.children[0].children, [], "Index should be the content of the directory page, not a child")
+    def test_title_in_code_block(self):
+        path = os.path.join(self.docs, "script.md")
+        with open(path, 'w') as f:
+            f.write("```bash\n# install the tool\n```\n\n# Script\n")
+        self.assertEqual(markdown_title(path), "Script", "Comments in code blocks should not title the page")
+    def test_title_hashes(self):
+        path = os.path.join(self.docs, "csharp.md")
+        for heading, title in [("# C#", "C#"), ("# C# ##", "C#"), ("# Title #", "Title")]:
+            with open(path, 'w') as f:
+                f.write(heading + "\n")
+            self.assertEqual(markdown_title(path), title)
+
+class TestToPageLinks(TreeTestCase):
+    def test_links(self):
+        titles = {**page_titles(build_tree(self.docs)), os.path.join(self.docs, "README.md"): "Docs Home"}
+        html = '<p><a href="deep/">Deep <em>dive</em></a> <a href="../README.md">home</a> <a href="https://example.com/a.md">external</a> <a href="missing.md">missing</a> <a href="#setup">setup</a></p>'
+        self.assertEqual(to_page_links(html, os.path.join(self.docs, "guide", "intro.md"), titles), (
+            '<p><ac:link><ri:page ri:content-title="Deep Dive" /><ac:link-body>Deep <em>dive</em></ac:link-body></ac:link> '
+            '<ac:link><ri:page ri:content-title="Docs Home" /><ac:link-body>home</ac:link-body></ac:link> '
+            '<a href="https://example.com/a.md">external</a> <a href="missing.md">missing</a> <a href="#setup">setup</a></p>'
+        ))
+    def test_anchor(self):
+        titles = page_titles(build_tree(self.docs))
+        html = to_page_links('<a href="guide/intro.md#setup">guide</a>', os.path.join(self.docs, "README.md"), titles)
+        self.assertEqual(html, '<ac:link ac:anchor="setup"><ri:page ri:content-title="Intro" /><ac:link-body>guide</ac:link-body></ac:link>')
+    def test_code_block(self):
+        titles = page_titles(build_tree(self.docs))
+        html = '<ac:plain-text-body><![CDATA[<a href="api.md">API</a>]]></ac:plain-text-body><a href="api.md">API</a>'
+        self.assertEqual(to_page_links(html, os.path.join(self.docs, "README.md"), titles), (
+            '<ac:plain-text-body><![CDATA[<a href="api.md">API</a>]]></ac:plain-text-body>'
+            '<ac:link><ri:page ri:content-title="api" /><ac:link-body>API</ac:link-body></ac:link>'
+        ), "Links in code blocks should be left as they are")
+    def test_section_anchor(self):
+        titles = page_titles(build_tree(self.docs))
+        requested = []
+        anchors = lambda path: requested.append(path) or {"setup": "Set-Up"}
+        html = to_page_links('<a href="guide/intro.md##setup">guide</a> <a href="guide/">guide</a>', os.path.join(self.docs, "README.md"), titles, anchors)
+        self.assertEqual(html, '<ac:link ac:anchor="Set-Up"><ri:page ri:content-title="Intro" /><ac:link-body>guide</ac:link-body></ac:link> <ac:link><ri:page ri:content-title="guide" /><ac:link-body>guide</ac:link-body></ac:link>')
+        self.assertEqual(requested, [os.path.join(self.docs, "guide", "intro.md")])
+
+class TestListChildPages(unittest.TestCase):
+    def test_pagination(self):
+        client = ConfluenceClient(HTTPBasicAuth("username", "token"))
+        client.send = MagicMock(side_effect=[
+            MagicMock(text=json.dumps({"results": [{"id": "1", "title": "One"}], "_links": {"next": "/wiki/api/v2/pages/100/children?cursor=abc"}})),
+            MagicMock(text=json.dumps({"results": [{"id": "2", "title": "Two"}], "_links": {}}))
+        ])
+        self.assertEqual(list_child_pages(client, "domain", "100"), {"One": "1", "Two": "2"})
+        self.assertEqual(client.send.call_args_list[1].args[0].input.cursor, "abc")
+
+class TestSyncTree(TreeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = ConfluenceClient(HTTPBasicAuth("username", "token"), conflict_backoff=0)
+        self.client.send = MagicMock(side_effect=self.respond)
+        # the guide page and the API page already exist, the API page with the current content
+        self.pages = {
+            "200": {"id": "200", "status": "current", "title": "guide", "body": {"storage": {"value": CHILDREN_MACRO}}, "version": {"number": 1}, "parentId": "100"},
+            "201": {"id": "201", "status": "current", "title": "api", "body": {"storage": {"value": "<p>The API.</p>"}}, "version": {"number": 1}, "parentId": "100"},
+        }
+        self.created: list = []
+        self.edited: list = []
+        self.bulk_requests = 0
+        self.single_requests = 0
+    def respond(self, command):
+        if isinstance(command, GetPageVersionCommand):
+            return MagicMock(text=json.dumps({"spaceId": "9"}))
+        if isinstance(command, GetChildPagesCommand):
+            children = [{"id": page["id"], "title": page["title"]} for page in self.pages.values() if page["parentId"] == command.input.id]
+            return MagicMock(text=json.dumps({"results": children}))
+        if isinstance(command, BulkGetPagesCommand):
+            self.bulk_requests += 1
+            return MagicMock(text=json.dumps({"results": [self.pages[page_id] for page_id in command.input.ids if page_id in self.pages]}))
+        if isinstance(command, GetPageCommand):
+            self.single_requests += 1
+            return MagicMock(text=json.dumps(self.pages[command.input.id]))
+        if isinstance(command, CreatePageCommand):
+            page_id = str(300 + len(self.created))
+            self.created.append(command.input)
+            self.pages[page_id] = {"id": page_id, "title": command.input.title, "parentId": command.input.parent_id}
+            return MagicMock(status_code=200, text=json.dumps({"id": page_id}))
+        if isinstance(command, EditPageCommand):
+            self.edited.append(command.input)
+            return MagicMock(status_code=200)
+        raise AssertionError(f"Unexpected command {command}")
+    def test_sync(self):
+        results = sync_tree(self.client, self.docs, url)
+        self.assertEqual([(os.path.relpath(result.mapping.filepath, self.docs), result.status) for result in results], [
+            ("README.md", CREATED),
+            ("api.md", UNCHANGED),
+            ("guide", UNCHANGED),
+            (os.path.join("guide", "deep", "index.md"), CREATED),
+            (os.path.join("guide", "intro.md"), CREATED),
+        ])
+        self.assertEqual(self.edited, [], "Unchanged pages should not be edited")
+        self.assertEqual((self.bulk_requests, self.single_requests), (1, 0), "The existing pages of a level should be fetched in one request")
+        created = {input.title: input for input in self.created}
+        self.assertEqual(created["Docs Home"].parent_id, "100")
+        self.assertEqual(created["Docs Home"].space_id, "9")
+        self.assertEqual(created["Intro"].parent_id, "200", "Pages should be created under the page of their directory")
+        self.assertIn('<ac:link ac:anchor="Setup"><ri:page ri:content-title="Intro" />', created["Docs Home"].body, "Links to sections of pages on lower levels should be resolved")
+        self.assertEqual(results[0].mapping.url, "https://domain/wiki/spaces/aSpace/pages/300/Docs+Home")
+        self.assertEqual(extract_domain_and_page_id(results[0].mapping.url), ("domain", "300"), "Result URLs should have the format of the input URL")
+    def test_update(self):
+        self.pages["201"]["body"]["storage"]["value"] = "<p>Old.</p>"
+        sync_tree(self.client, self.docs, url)
+        self.assertEqual([(input.id, input.body, input.version) for input in self.edited], [("201", "<p>The API.</p>", 2)])
+    def test_bulk_failure(self):
+        original_respond = self.respond
+        def respond(command):
+            if isinstance(command, BulkGetPagesCommand):
+                return MagicMock(raise_for_status=MagicMock(side_effect=requests.HTTPError("400 Client Error")))
+            return original_respond(command)
+        self.client.send.side_effect = respond
+        with self.assertLogs(level='WARNING'):
+            results = sync_tree(self.client, self.docs, url)
+        self.assertTrue(all(result.success for result in results))
+        self.assertEqual(self.single_requests, 2, "Each existing page should be fetched separately if the bulk request fails")
+    def test_duplicate_titles(self):
+        with open(os.path.join(self.docs, "guide", "setup.md"), 'w') as f:
+            f.write("# Intro\n\nAnother intro.")
+        with self.assertLogs(level='ERROR'):
+            results = sync_tree(self.client, self.docs, url)
+        failed = {os.path.relpath(result.mapping.filepath, self.docs): result.error for result in results if not result.success}
+        self.assertEqual(sorted(failed), [os.path.join("guide", "intro.md"), os.path.join("guide", "setup.md")], "Siblings with the same title should fail")
+        self.assertIsInstance(failed[os.path.join("guide", "intro.md")], InvalidParameterError)
+        self.assertNotIn("Intro", [input.title for input in self.created], "Pages with a duplicate title should not be synced")
+        self.assertEqual(results[0].status, CREATED, "Other pages should still be synced")
+    def test_failed_parent(self):
+        del self.pages["200"]
+        original_respond = self.respond
+        def respond(command):
+            if isinstance(command, CreatePageCommand) and command.input.title == "guide":
+                raise ValueError("Title already exists")
+            return original_respond(command)
+        self.client.send.side_effect = respond
+        with self.assertLogs(level='ERROR'):
+            results = sync_tree(self.client, self.docs, url)
+        failed = [os.path.relpath(result.mapping.filepath, self.docs) for result in results if not result.success]
+        self.assertEqual(failed, ["guide", os.path.join("guide", "deep", "index.md"), os.path.join("guide", "intro.md")], "Pages below a failed page should fail")
@@ -1,5 +1,7 @@
 import unittest
 from src.utils import *
+import os
+import tempfile
 from unittest.mock import patch
 
 url = "https://example.atlassian.net/wiki/spaces/teamSE/pages/1234567890/Page+Name"
@@ -31,5 +33,55 @@ class TestExtractDomainAndPageIdFromUrl(unittest.TestCase):
         result = extract_domain_and_page_id(url)
         self.assertTupleEqual((domain, id), result)
 
+class TestContentHash(unittest.TestCase):
+    def test_hash(self):
+        self.assertEqual(content_hash("abc"), content_hash("abc"), "Same text should have the same hash")
+        self.assertNotEqual(content_hash("abc"), content_hash("abd"), "Different text should have a different hash")
+
+class TestGitBlobId(unittest.TestCase):
+    def test_hash(self):
+        self.assertEqual(git_blob_id(b"hello\n"), "ce013625030ba8dba906f756967f9e9ca394464a", "ID should match git hash-object")
+        self.assertEqual(git_blob_id(b""), "e69de29bb2d1d6434b8b29ae775ad8c2e48c5391")
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "README.md")
+            with open(path, 'wb') as f:
+                f.write(b"hello\n")
+            self.assertEqual(file_blob_id(path), "ce013625030ba8dba906f756967f9e9ca394464a")
+            self.assertIsNone(file_blob_id(os.path.join(directory, "missing.md")), "Missing file should have no ID")
+
+class TestNextCursor(unittest.TestCase):
+    def test_next(self):
+        self.assertEqual(next_cursor({"_links": {"next": "/wiki/api/v2/pages/1/children?limit=250&cursor=abc%3D"}}), "abc=")
+    def test_last(self):
+        self.assertIsNone(next_cursor({"results": [], "_links": {}}))
+        self.assertIsNone(next_cursor({"results": []}))
+
+class TestSetOutput(unittest.TestCase):
+    def test_set_output(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output_path = os.path.join(directory, "output")
+            with patch.dict(os.environ, {"GITHUB_OUTPUT": output_path}):
+                set_output("status", "updated")
+                set_output("results", "[]")
+            with open(output_path) as f:
+                self.assertEqual(f.read(), "status=updated\nresults=[]\n")
+    @patch.dict(os.environ, {}, clear=True)
+    def test_no_github_output(self):
+        set_output("status", "updated")
+
+class TestWriteStepSummary(unittest.TestCase):
+    def test_write_step_summary(self):
+        with tempfile.TemporaryDirectory() as directory:
+            summary_path = os.path.join(directory, "summary")
+            with patch.dict(os.environ, {"GITHUB_STEP_SUMMARY": summary_path}):
+                write_step_summary("# one\n")
+                write_step_summary("# two\n")
+            with open(summary_path) as f:
+                self.assertEqual(f.read(), "# one\n# two\n")
+    @patch.dict(os.environ, {}, clear=True)
+    def test_no_github_step_summary(self):
+        write_step_summary("# one\n")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import threading
+import unittest
+from src.watch import *
+from src.state import SyncRecord
+from src.utils import git_blob_id
+from unittest.mock import patch, MagicMock
+
+url = "https://domain/wiki/spaces/aSpace/pages/1234567890/Page"
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.readme = self.path("README.md")
+        self.changelog = self.path("CHANGELOG.md")
+        self.other = self.path("OTHER.md")
+        for path in (self.readme, self.changelog, self.other):
+            self.write(path, "# hi")
+        self.mappings = [
+            SyncMapping(self.readme, url, "<p>a</p>", "<p>/a</p>"),
+            SyncMapping(self.changelog, url, "<p>b</p>", "<p>/b</p>"),
+            SyncMapping(self.other, url.replace("1234567890", "1"), "<p>c</p>", "<p>/c</p>")
+        ]
+        self.watcher = Watcher(MagicMock(), self.mappings, debounce=2.0)
+    def tearDown(self):
+        self.directory.cleanup()
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+    def write(self, path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+    def test_poll(self):
+        self.assertEqual(self.watcher.poll(), set(), "Files should not count as changed when the watcher starts")
+        self.write(self.readme, "# changed")
+        os.remove(self.other)
+        self.assertEqual(self.watcher.poll(), {self.readme, self.other}, "Modified and deleted files should count as changed")
+        self.assertEqual(self.watcher.poll(), set())
+    @patch('src.watch.run_batch', return_value=[])
+    def test_debounce(self, mock_run_batch):
+        self.write(self.readme, "# changed")
+        self.assertIsNone(self.watcher.step(10.0))
+        self.write(self.readme, "# changed again")
+        self.assertIsNone(self.watcher.step(11.0))
+        self.assertIsNone(self.watcher.step(12.5), "Sync should wait until the files did not change for the debounce time")
+        self.assertEqual(self.watcher.step(13.0), [])
+        mock_run_batch.assert_called_once()
+        self.assertEqual(mock_run_batch.call_args.args[1], self.mappings[:1], "Only the changed mapping should be synced")
+        self.assertIsNone(self.watcher.step(20.0), "Nothing should be synced without new changes")
+    @patch('src.watch.run_batch', return_value=[])
+    def test_coalesce(self, mock_run_batch):
+        self.write(self.readme, "# changed")
+        self.write(self.changelog, "# changed")
+        self.watcher.step(10.0)
+        self.watcher.step(12.0)
+        mock_run_batch.assert_called_once()
+        self.assertEqual(mock_run_batch.call_args.args[1], self.mappings[:2], "Changes to the same page should be synced together")
+    @patch('src.watch.run_batch', return_value=[])
+    def test_images(self, mock_run_batch):
+        image = self.path("diagram.png")
+        self.write(image, "png")
+        self.watcher.state.set(self.mappings[2].key, SyncRecord("1", 1, "source", "rendered", {self.other: git_blob_id(b"# hi"), image: git_blob_id(b"png")}))
+        self.watcher.sync([])
+        self.write(image, "new png")
+        self.watcher.step(10.0)
+        self.watcher.step(12.0)
+        self.assertEqual(mock_run_batch.call_args.args[1], self.mappings[2:], "A changed image should sync the mappings that reference it")
+    @patch('src.watch.run_batch', return_value=[])
+    def test_run(self, mock_run_batch):
+        stop = threading.Event()
+        stop.set()
+        self.watcher.run(stop)
+        self.assertEqual(mock_run_batch.call_args.args[1], self.mappings, "Every mapping should be synced when watching starts")
+        self.assertIs(mock_run_batch.call_args.args[4], self.watcher.converter, "The converter should be kept between syncs")
+
+if __name__ == '__main__':
+    unittest.main()